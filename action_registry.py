@@ -0,0 +1,170 @@
+"""action_registry.py - Rejestr akcji przycisków Gmina-AI z cache statycznych odpowiedzi"""
+import threading
+from collections import OrderedDict
+
+
+class _Action:
+    """Zarejestrowana akcja - funkcja budująca odpowiedź i informacja czy jest statyczna"""
+    __slots__ = ('name', 'handler', 'static', 'prepare')
+
+    def __init__(self, name, handler, static, prepare=None):
+        self.name = name
+        self.handler = handler
+        self.static = static
+        self.prepare = prepare
+
+
+class _Rendered:
+    """Wpis cache: odpowiedź (dict) i jej gotowe ciało JSON (bajty, liczone przy pierwszym render)"""
+    __slots__ = ('reply', 'body')
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.body = None
+
+
+class ActionRegistry:
+    """
+    Rejestr akcji przycisków: nazwa akcji -> funkcja zwracająca odpowiedź bota.
+
+    Zastępuje łańcuchy `elif action == ...` - wyszukanie akcji to jeden odczyt
+    ze słownika. Odpowiedzi akcji statycznych (zależnych tylko od gminy
+    i wersji jej danych) budowane są raz i trzymane w cache LRU kluczowanym
+    (akcja, gmina, wersja); po przeładowaniu katalogu klucz się zmienia.
+    Obok odpowiedzi cache trzyma jej zserializowane ciało JSON - render()
+    zwraca gotowe bajty bez budowania dict i ponownego kodowania.
+
+    Akcja statyczna może mieć skutki uboczne w sesji (np. włączenie trybu
+    wyszukiwania) - funkcja prepare wykonywana jest przy każdym trafieniu
+    w cache, handler tylko przy budowaniu odpowiedzi.
+
+    Wtyczki rejestrują własne akcje bez zmian w GminaBot:
+        bot.actions.register('waste_schedule', build_schedule, static=True)
+
+        @bot.actions.register('pszok_locations')
+        def pszok_locations():
+            ...
+    """
+
+    def __init__(self, fallback=None, max_cached=4096):
+        self.fallback = fallback
+        self.max_cached = max_cached
+        self._actions = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def register(self, action, handler=None, static=False, prepare=None):
+        """
+        Rejestruje (lub nadpisuje) akcję. Bez handlera działa jako dekorator.
+
+        Args:
+            action (str): nazwa akcji wysyłana przez przycisk
+            handler (callable): funkcja bez argumentów zwracająca odpowiedź (dict)
+            static (bool): odpowiedź zależy tylko od gminy i wersji danych - może być cache'owana
+            prepare (callable): skutki uboczne akcji statycznej powtarzane przy trafieniu w cache
+        """
+        if handler is None:
+            def decorator(function):
+                self.register(action, function, static, prepare)
+                return function
+            return decorator
+
+        with self._lock:
+            self._actions[action] = _Action(action, handler, static, prepare)
+            # Nowy handler - stare odpowiedzi tej akcji nie mogą zostać w cache
+            for key in [key for key in self._cache if key[0] == action]:
+                del self._cache[key]
+        return handler
+
+    def unregister(self, action):
+        with self._lock:
+            self._actions.pop(action, None)
+            for key in [key for key in self._cache if key[0] == action]:
+                del self._cache[key]
+
+    def __contains__(self, action):
+        return action in self._actions
+
+    def actions(self):
+        """Nazwy zarejestrowanych akcji"""
+        return list(self._actions)
+
+    def is_static(self, action):
+        entry = self._actions.get(action)
+        return entry is not None and entry.static
+
+    def dispatch(self, action, gmina=None, version=None):
+        """
+        Zwraca odpowiedź dla akcji (fallback dla nieznanych akcji).
+
+        Odpowiedź statyczna jest zwracana jako płytka kopia wpisu z cache -
+        zagnieżdżonych list (przyciski) nie wolno modyfikować.
+        """
+        entry = self._actions.get(action)
+        if entry is None:
+            return self.fallback(action) if self.fallback else None
+        if not entry.static:
+            return entry.handler()
+        return dict(self._rendered(entry, (action, gmina, version)).reply)
+
+    def render(self, action, gmina, version, serialize):
+        """
+        Gotowe ciało odpowiedzi (bajty) dla akcji statycznej.
+
+        Args:
+            serialize (callable): odpowiedź (dict) -> bajty, wywoływana raz na wpis cache
+
+        Returns:
+            bytes lub None, gdy akcja nie jest statyczna (pełna ścieżka przez dispatch)
+        """
+        entry = self._actions.get(action)
+        if entry is None or not entry.static:
+            return None
+        rendered = self._rendered(entry, (action, gmina, version))
+        body = rendered.body
+        if body is None:
+            # Wyścig dwóch wątków kończy się tymi samymi bajtami - bez blokady
+            body = rendered.body = serialize(rendered.reply)
+        return body
+
+    def _rendered(self, entry, key):
+        """Wpis cache akcji statycznej - budowany przy pierwszym użyciu"""
+        with self._lock:
+            rendered = self._cache.get(key)
+            if rendered is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if rendered is not None:
+            if entry.prepare is not None:
+                entry.prepare()
+            return rendered
+
+        rendered = _Rendered(entry.handler())
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = rendered
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+        return rendered
+
+    def invalidate(self):
+        """Czyści cache odpowiedzi statycznych"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Liczniki rejestru do monitoringu"""
+        with self._lock:
+            return {
+                'actions': len(self._actions),
+                'cached_replies': len(self._cache),
+                'max_cached': self.max_cached,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -1,8 +1,23 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session
 from datetime import timedelta
-from gmina_bot import GminaBot
+import logging
+from gmina_bot import GminaBot, MAX_BULK_PROBLEMS
+from schemas import (BotResponse, SearchResponse, StartRequest, SendRequest, SearchRequest,
+                     CustomInputRequest, NoResultsRequest, JSONResponse, NDJSON_MIMETYPE, decode_bulk,
+                     decode_request, encode_lines, encode_reply)
+from session_store import make_session_interface
+from metrics import CONTENT_TYPE, REGISTRY, WSGIMetrics
+from exports import (DATASETS, FORMATS, GZIP_MIMETYPE, MIMETYPES, admin_authorized, export_filename,
+                     export_stream, parse_time)
 import os
 
+# Logowanie poziomami: GMINA_LOG_LEVEL=DEBUG włącza szczegóły żądań (domyślnie INFO - bez kosztu formatowania)
+logging.basicConfig(
+    level=os.getenv('GMINA_LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s [%(name)s] %(message)s'
+)
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'gmina_ai_enterprise_key_2024')
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
@@ -13,9 +28,22 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_PERMANENT'] = False
 
+# Sesje po stronie serwera: 'sqlite' (współdzielone przez workery), 'memory' lub 'cookie'
+app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'sqlite')
+app.config['SESSION_SQLITE_PATH'] = os.getenv('SESSION_SQLITE_PATH')
+session_interface = make_session_interface(app, app.config['SESSION_BACKEND'])
+if session_interface is not None:
+    app.session_interface = session_interface
+
 # Inicjalizacja bota jako zmienna globalna
 bot = GminaBot()
 
+
+def cached_reply(body):
+    """Odpowiedź HTTP z gotowego, zserializowanego ciała JSON"""
+    return JSONResponse(body)
+
+
 @app.route('/')
 def index():
     """Strona główna z interfejsem bota Gmina-AI Enterprise"""
@@ -27,42 +55,41 @@ def gmina_bot_start():
     ENDPOINT 1: Inicjalizuje sesję bota dla wybranej gminy
     """
     try:
-        data = request.get_json()
-        print(f"[DEBUG] Otrzymane dane: {data}")
+        data = decode_request(request.get_data(), StartRequest)
+        logger.debug("Otrzymane dane: %s", data)
 
         if not data:
-            print("[ERROR] Brak danych JSON")
+            logger.error("Brak danych JSON")
             return jsonify({'error': 'Brak danych JSON'}), 400
 
-        gmina_name = data.get('gmina')
-        print(f"[DEBUG] Nazwa gminy: {gmina_name}")
+        gmina_name = data.gmina
+        logger.debug("Nazwa gminy: %s", gmina_name)
 
         if not gmina_name:
-            print("[ERROR] Brak nazwy gminy")
+            logger.error("Brak nazwy gminy")
             return jsonify({'error': 'Brak nazwy gminy'}), 400
 
         # Ustawienie kontekstu gminy
         session.permanent = True
         context = {'gmina': gmina_name}
-        bot.set_gmina_context(context)
+        if not bot.set_gmina_context(context):
+            return jsonify({'error': 'Nieprawidłowa nazwa gminy'}), 400
 
         # Sprawdzenie czy kontekst został zapisany
         if 'gmina_context' not in session:
-            print("[ERROR] Kontekst nie został zapisany w sesji")
+            logger.error("Kontekst nie został zapisany w sesji")
             return jsonify({'error': 'Błąd zapisu kontekstu'}), 500
 
-        print(f"[DEBUG] Kontekst zapisany: {session.get('gmina_context')}")
+        logger.debug("Kontekst zapisany: %s", session.get('gmina_context'))
 
-        # Zwrócenie wiadomości powitalnej
-        initial_response = bot.get_initial_greeting()
-        print(f"[DEBUG] Odpowiedź bota: {initial_response}")
+        # Zwrócenie wiadomości powitalnej (gotowe ciało z cache odpowiedzi statycznych)
+        body = bot.actions.render('main_menu', gmina_name, bot.catalog_for(gmina_name).version, encode_reply)
+        logger.debug("Odpowiedź bota: powitanie (%d B)", len(body))
 
-        return jsonify({'reply': initial_response})
+        return cached_reply(body)
 
     except Exception as e:
-        print(f"[BŁĄD KRYTYCZNY w gmina_bot_start]: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Błąd krytyczny w gmina_bot_start: %s", e)
         return jsonify({
             'reply': {
                 'text_message': f'Wystąpił błąd podczas inicjalizacji: {str(e)}',
@@ -80,7 +107,7 @@ def gmina_bot_send():
     try:
         # Sprawdzenie kontekstu
         if 'gmina_context' not in session:
-            print("[ERROR] Brak kontekstu gminy w sesji")
+            logger.error("Brak kontekstu gminy w sesji")
             return jsonify({
                 'reply': {
                     'text_message': 'Sesja wygasła. Proszę wybrać gminę ponownie.',
@@ -90,18 +117,23 @@ def gmina_bot_send():
                 }
             }), 400
 
-        data = request.get_json()
-        user_message = data.get('message', '')
-        button_action = data.get('button_action', '')
-        selection_data = data.get('selection_data', None)
+        data = decode_request(request.get_data(), SendRequest)
+        if data is None:
+            return jsonify({'error': 'Brak wiadomości lub akcji'}), 400
+        user_message = data.message
+        button_action = data.button_action
+        selection_data = data.selection_data
 
-        print(f"[DEBUG] Wiadomość: {user_message}, Akcja: {button_action}, Selection: {selection_data}")
+        logger.debug("Wiadomość: %s, Akcja: %s, Selection: %s", user_message, button_action, selection_data)
 
         # Obsługa wyboru z listy sugestii
         if selection_data:
             reply = bot.process_search_selection(selection_data)
-        # Obsługa akcji przycisków
+        # Obsługa akcji przycisków - statyczne odpowiedzi prosto z cache jako bajty
         elif button_action:
+            body = bot.render_button_action(button_action, encode_reply)
+            if body is not None:
+                return cached_reply(body)
             reply = bot.handle_button_action(button_action)
         # Obsługa wiadomości tekstowych
         elif user_message:
@@ -109,12 +141,10 @@ def gmina_bot_send():
         else:
             return jsonify({'error': 'Brak wiadomości lub akcji'}), 400
 
-        return jsonify({'reply': reply})
+        return JSONResponse.of(BotResponse(reply))
 
     except Exception as e:
-        print(f"[BŁĄD KRYTYCZNY w gmina_bot_send]: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Błąd krytyczny w gmina_bot_send: %s", e)
         return jsonify({
             'reply': {
                 'text_message': 'Wystąpił błąd podczas przetwarzania zapytania. Spróbuj ponownie.',
@@ -131,25 +161,26 @@ def gmina_bot_search():
     """
     try:
         if 'gmina_context' not in session:
-            return jsonify({'suggestions': []}), 200
+            return JSONResponse.of(SearchResponse([]))
 
-        data = request.get_json()
-        query = data.get('query', '')
-        context = data.get('context', '')
+        data = decode_request(request.get_data(), SearchRequest) or SearchRequest()
+        query = data.query
+        context = data.context
 
-        print(f"[DEBUG] Search query: {query}, context: {context}")
+        logger.debug("Search query: %s, context: %s", query, context)
 
         if not query or len(query) < 2:
-            return jsonify({'suggestions': []})
+            return JSONResponse.of(SearchResponse([]))
 
-        # Pobierz sugestie z bota
-        suggestions = bot.search_suggestions(query, context)
+        # Pobierz sugestie z bota (przez cache LRU/TTL)
+        gmina_name = session['gmina_context'].get('gmina')
+        suggestions = bot.cached_search_suggestions(query, context, gmina_name)
         
-        return jsonify({'suggestions': suggestions})
+        return JSONResponse.of(SearchResponse(suggestions))
 
     except Exception as e:
-        print(f"[ERROR] Błąd podczas wyszukiwania: {e}")
-        return jsonify({'suggestions': []}), 200
+        logger.error("Błąd podczas wyszukiwania: %s", e)
+        return JSONResponse.of(SearchResponse([]))
 
 @app.route('/gmina-bot/process-custom', methods=['POST'])
 def gmina_bot_process_custom():
@@ -160,21 +191,23 @@ def gmina_bot_process_custom():
         if 'gmina_context' not in session:
             return jsonify({'error': 'Brak sesji'}), 400
 
-        data = request.get_json()
-        custom_input = data.get('custom_input', '')
-        input_type = data.get('type', 'problem')
+        data = decode_request(request.get_data(), CustomInputRequest)
+        if data is None:
+            return jsonify({'error': 'Brak danych JSON'}), 400
+        custom_input = data.custom_input
+        input_type = data.type
 
-        print(f"[DEBUG] Custom input: {custom_input}, type: {input_type}")
+        logger.debug("Custom input: %s, type: %s", custom_input, input_type)
 
         if input_type == 'problem':
             reply = bot.process_custom_problem(custom_input)
         else:
             reply = bot.get_bot_response(custom_input)
 
-        return jsonify({'reply': reply})
+        return JSONResponse.of(BotResponse(reply))
 
     except Exception as e:
-        print(f"[ERROR] Błąd podczas przetwarzania custom input: {e}")
+        logger.error("Błąd podczas przetwarzania custom input: %s", e)
         return jsonify({
             'reply': {
                 'text_message': 'Nie udało się przetworzyć zgłoszenia.',
@@ -182,10 +215,37 @@ def gmina_bot_process_custom():
             }
         }), 500
 
+@app.route('/gmina-bot/process-custom-batch', methods=['POST'])
+def gmina_bot_process_custom_batch():
+    """
+    ENDPOINT 4b: Hurtowe przyjmowanie zgłoszeń (call center, bramka SMS)
+
+    Ciało: tablica JSON albo NDJSON - opis zgłoszenia jako napis lub obiekt
+    {"description": ..., "ref": ...}. Odpowiedź: strumień NDJSON, jeden
+    wiersz na zgłoszenie (numer i kategoria albo kod błędu).
+    """
+    try:
+        if 'gmina_context' not in session:
+            return jsonify({'error': 'Brak sesji'}), 400
+
+        problems = decode_bulk(request.get_data())
+        if problems is None:
+            return jsonify({'error': 'Brak danych JSON'}), 400
+        if len(problems) > MAX_BULK_PROBLEMS:
+            return jsonify({'error': f'Za dużo zgłoszeń w paczce (maks. {MAX_BULK_PROBLEMS})'}), 413
+
+        results = bot.process_bulk_problems(problems)
+        return Response(encode_lines(results), mimetype=NDJSON_MIMETYPE)
+
+    except Exception as e:
+        logger.exception("Błąd podczas przyjmowania paczki zgłoszeń: %s", e)
+        return jsonify({'error': 'Nie udało się przetworzyć paczki zgłoszeń'}), 500
+
 @app.route('/gmina-bot/track-no-results', methods=['POST'])
 def gmina_track_no_results():
     """
-    ENDPOINT 5: Wysyła event pustych wyników do GA4 Measurement Protocol
+    ENDPOINT 5: Zlicza frazę bez wyników lokalnie (top fraz per gmina, /admin/no-results)
+    i przekazuje próbkę eventów do GA4 Measurement Protocol (GA4_NO_RESULTS_SAMPLE_RATE)
     RODO-COMPLIANT: Przetwarza tylko anonimowe frazy tekstowe
     
     Zgodność z RODO:
@@ -195,9 +255,9 @@ def gmina_track_no_results():
     - Używa anonimowych identyfikatorów sesji
     """
     try:
-        data = request.get_json()
-        query = data.get('query', '')
-        search_type = data.get('search_type', 'general')
+        data = decode_request(request.get_data(), NoResultsRequest) or NoResultsRequest()
+        query = data.query
+        search_type = data.search_type
         
         # RODO Protection: tylko frazy > 2 znaków
         if len(query.strip()) <= 2:
@@ -213,17 +273,18 @@ def gmina_track_no_results():
                 'reason': 'no active session'
             }), 200
         
-        # Wywołaj metodę GA4 z bota
-        ga4_success = bot.send_ga4_no_results_event(query, search_type)
+        # Agregacja lokalna + próbka do GA4
+        aggregated, ga4_success = bot.track_no_results(query, search_type)
         
         # Logowanie zgodne z RODO
         if ga4_success:
-            print(f"[GA4 RODO] ✅ Tracked anonymous search: length={len(query)}, type={search_type}")
-        else:
-            print(f"[GA4 RODO] ❌ Failed to track search")
+            logger.info("[GA4 RODO] ✅ Queued anonymous search: length=%d, type=%s", len(query), search_type)
+        elif not aggregated:
+            logger.warning("[GA4 RODO] ❌ Failed to record search")
         
         return jsonify({
-            'status': 'success' if ga4_success else 'partial_success',
+            'status': 'success' if aggregated or ga4_success else 'partial_success',
+            'aggregated': aggregated,
             'ga4_sent': ga4_success,
             'query_length': len(query),  # Tylko długość, nie sama fraza
             'search_type': search_type,
@@ -231,9 +292,7 @@ def gmina_track_no_results():
         })
     
     except Exception as e:
-        print(f"[ERROR] Track no results error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Track no results error: %s", e)
         return jsonify({
             'status': 'error',
             'error': 'internal_error',  # Nie ujawniaj szczegółów błędu
@@ -250,26 +309,101 @@ def health_check():
         'features': [
             'predictive_search', 
             'custom_problems', 
+            'bulk_problems',
             'intelligent_routing', 
             'ga4_tracking',
             'rodo_compliant'
         ],
-        'session_active': 'gmina_context' in session
+        'session_active': 'gmina_context' in session,
+        'search_cache': bot.search_cache.stats(),
+        'ga4_dispatcher': bot.ga4_dispatcher.stats(),
+        'tickets': bot.tickets.stats(),
+        'no_results_log': bot.no_results.stats(),
+        'no_results_top': bot.no_results_top.stats(),
+        'catalogs': bot.catalogs.stats(),
+        'actions': bot.actions.stats(),
+        'scoring_shards': bot.shard_pool.stats() if bot.shard_pool is not None else None,
+        'gmina_registry': bot.gmina_data.stats(),
+        'teryt': bot.teryt.stats()
     })
 
+@app.route('/metrics')
+def metrics():
+    """Histogramy opóźnień (endpointy, scoring, sesje, GA4) w formacie Prometheus"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/admin/export')
+def admin_export():
+    """
+    Eksport dla operatorów: ?dataset=tickets|no_results&format=ndjson|csv&gzip=1&since=&until=
+
+    Wymaga nagłówka Authorization: Bearer <GMINA_ADMIN_TOKEN>. Wiersze
+    płyną strumieniem prosto z kursora SQLite - duże eksporty lepiej
+    pobierać przez tryb ASGI albo CLI (python exports.py), bo w trybie
+    WSGI eksport zajmuje worker do końca transferu.
+    """
+    if not admin_authorized(request.headers.get('Authorization')):
+        return jsonify({'error': 'Brak uprawnień'}), 403
+
+    dataset = request.args.get('dataset', 'tickets')
+    fmt = request.args.get('format', 'ndjson')
+    compress = request.args.get('gzip', '') in ('1', 'true')
+    if dataset not in DATASETS or fmt not in FORMATS:
+        return jsonify({'error': 'Nieznany zbiór lub format'}), 400
+    try:
+        since, until = parse_time(request.args.get('since')), parse_time(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Nieprawidłowa data (oczekiwano RRRR-MM-DD)'}), 400
+
+    try:
+        chunks = export_stream(dataset, fmt, compress, since, until)
+    except FileNotFoundError:
+        return jsonify({'error': 'Brak danych do eksportu'}), 404
+    except Exception as e:
+        logger.exception("Błąd eksportu %s: %s", dataset, e)
+        return jsonify({'error': 'Eksport nie powiódł się'}), 500
+
+    return Response(
+        chunks,
+        content_type=GZIP_MIMETYPE if compress else MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(dataset, fmt, compress, since)}"'}
+    )
+
+@app.route('/admin/no-results')
+def admin_no_results():
+    """
+    Najczęstsze frazy bez wyników per (gmina, typ): ?gmina=&search_type=&limit=
+
+    Scalone snapshoty wszystkich workerów - podpowiedź, czym uzupełnić
+    katalog. Wymaga Authorization: Bearer <GMINA_ADMIN_TOKEN>.
+    """
+    if not admin_authorized(request.headers.get('Authorization')):
+        return jsonify({'error': 'Brak uprawnień'}), 403
+    try:
+        limit = int(request.args.get('limit') or 0) or None
+    except ValueError:
+        return jsonify({'error': 'Nieprawidłowy limit'}), 400
+    report = bot.no_results_top.report(request.args.get('gmina'), request.args.get('search_type'), limit)
+    return JSONResponse.of(report)
+
 @app.route('/debug/session')
 def debug_session():
     """Endpoint do debugowania sesji (tylko dla developmentu)"""
     if app.debug:
         return jsonify({
             'session_data': dict(session),
-            'session_id': session.get('_id', 'BRAK'),
+            'session_id': getattr(session, 'sid', session.get('_id', 'BRAK')),
             'gmina_context': session.get('gmina_context', 'BRAK'),
             'search_context': session.get('search_context', 'BRAK'),
             'search_mode': session.get('search_mode', False)
         })
     return jsonify({'error': 'Dostępne tylko w trybie debug'}), 403
 
+# Czas każdego żądania (łącznie z zapisem sesji) do histogramu gmina_http_request_seconds
+app.wsgi_app = WSGIMetrics(app.wsgi_app, {
+    rule.rule: rule.endpoint for rule in app.url_map.iter_rules() if not rule.arguments
+})
+
 if __name__ == '__main__':
     with app.app_context():
         # Inicjalizacja danych bota
@@ -0,0 +1,522 @@
+"""asgi.py - Asynchroniczny tryb serwowania endpointów Gmina-AI (ASGI)
+
+Alternatywa dla app.py (Flask/gunicorn) dla dużej liczby równoczesnych
+połączeń: endpointy /gmina-bot/*, /health i /metrics obsługiwane przez pętlę
+zdarzeń w jednym procesie. Pętla zajmuje się tylko HTTP (odczyt ciała,
+ciasteczka, wysyłka) - praca bota (fuzzy scoring, sesja w SQLite) trafia
+do ograniczonej puli wątków, więc tysiące otwartych połączeń czekających
+na kolejny znak nie blokują się nawzajem. Eventy GA4 wysyła w tle
+GA4Dispatcher (kolejka), handler nie czeka na sieć.
+
+Sesje są zgodne z app.py (ten sam magazyn i cookie), więc oba tryby mogą
+działać równolegle na jednym pliku SQLite. Strona główna i pliki
+statyczne zostają po stronie Flaska / reverse proxy.
+
+Uruchomienie:
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --no-access-log
+
+Konfiguracja (zmienne środowiskowe):
+    SESSION_BACKEND          sqlite (domyślnie) lub memory
+    SESSION_SQLITE_PATH      plik sesji (domyślnie instance/sessions.sqlite3)
+    GMINA_ASGI_THREADS       wątki puli bota (domyślnie 4)
+    GMINA_ASGI_MAX_PENDING   limit żądań czekających na pulę - powyżej 503 (domyślnie 4096)
+    GMINA_TICKETS_PATH       plik rejestru zgłoszeń (domyślnie instance/tickets.sqlite3)
+    GMINA_ANALYTICS_PATH     plik zapytań bez wyników (domyślnie instance/analytics.sqlite3)
+    GMINA_ADMIN_TOKEN        token /admin/export i /admin/no-results (bez niego wyłączone)
+    GMINA_NO_RESULTS_SNAPSHOT_DIR  katalog snapshotów top fraz bez wyników
+    GA4_NO_RESULTS_SAMPLE_RATE     ułamek zapytań bez wyników wysyłanych do GA4 (domyślnie 1)
+    GMINA_TERYT_PATH         wykaz TERC GUS (domyślnie data/teryt_terc.csv)
+    GMINA_LOG_LEVEL          poziom logowania (domyślnie INFO, DEBUG - szczegóły żądań)
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
+
+from werkzeug.http import dump_cookie, parse_cookie
+
+from exports import (DATASETS, FORMATS, GZIP_MIMETYPE, MIMETYPES, admin_authorized, export_filename,
+                     export_stream, parse_time)
+from gmina_bot import GminaBot, MAX_BULK_PROBLEMS
+from metrics import CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, http_method
+from schemas import (SearchResponse, StartRequest, SendRequest, SearchRequest, CustomInputRequest,
+                     NoResultsRequest, NDJSON_MIMETYPE, decode_bulk, decode_request, encode, encode_lines,
+                     encode_reply)
+from session_store import (MemorySessionStore, SQLiteSessionStore, ServerSideSessionInterface,
+                           bound_session, session)
+
+logging.basicConfig(
+    level=os.getenv('GMINA_LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s [%(name)s] %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Ustawienia sesji jak w app.py
+SESSION_COOKIE_NAME = 'session'
+SESSION_LIFETIME = timedelta(hours=24)
+MAX_BODY_BYTES = 1024 * 1024
+# Paczka zgłoszeń (MAX_BULK_PROBLEMS opisów) - większy limit tylko dla tego endpointu
+MAX_BULK_BODY_BYTES = 16 * 1024 * 1024
+
+_JSON_HEADERS = [(b'content-type', b'application/json')]
+_NDJSON_HEADERS = [(b'content-type', NDJSON_MIMETYPE.encode('latin-1'))]
+_METRICS_HEADERS = [(b'content-type', CONTENT_TYPE.encode('latin-1'))]
+
+# Gotowe ciała odpowiedzi błędów protokołu
+_NOT_FOUND = encode({'error': 'Nie znaleziono'})
+_METHOD_NOT_ALLOWED = encode({'error': 'Niedozwolona metoda'})
+_TOO_LARGE = encode({'error': 'Za duże zapytanie'})
+_OVERLOADED = encode({'error': 'Serwer przeciążony, spróbuj ponownie'})
+_FORBIDDEN = encode({'error': 'Brak uprawnień'})
+_BAD_EXPORT = encode({'error': 'Nieznany zbiór lub format'})
+_BAD_DATE = encode({'error': 'Nieprawidłowa data (oczekiwano RRRR-MM-DD)'})
+_EXPORT_FAILED = encode({'error': 'Eksport nie powiódł się'})
+_EXPORT_NO_DATA = encode({'error': 'Brak danych do eksportu'})
+_BAD_LIMIT = encode({'error': 'Nieprawidłowy limit'})
+
+# Ścieżki obsługiwane poza pulą bota -> etykieta endpointu w metrykach
+_LOOP_ENDPOINTS = {'/metrics': 'metrics', '/admin/export': 'admin_export', '/admin/no-results': 'admin_no_results'}
+
+
+def make_session_store(backend=None, path=None):
+    """Magazyn sesji współdzielony z app.py ('cookie' wymaga Flaska - nieobsługiwany)"""
+    backend = backend or os.getenv('SESSION_BACKEND', 'sqlite')
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'sqlite':
+        path = path or os.getenv('SESSION_SQLITE_PATH') or os.path.join(ROOT_DIR, 'instance', 'sessions.sqlite3')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return SQLiteSessionStore(path)
+    raise ValueError(f'Backend sesji {backend} nie jest obsługiwany w trybie ASGI')
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class _Route:
+    """Endpoint: handler synchroniczny (wykonywany w puli) i odpowiedź przy wyjątku"""
+    __slots__ = ('name', 'method', 'handler', 'error_status', 'error_payload', 'max_body')
+
+    def __init__(self, name, method, handler, error_status, error_payload, max_body=MAX_BODY_BYTES):
+        self.name = name
+        self.method = method
+        self.handler = handler
+        self.error_status = error_status
+        self.error_payload = error_payload
+        self.max_body = max_body
+
+
+class _Stream:
+    """Odpowiedź NDJSON wysyłana kawałkami (kodowanymi w puli, wysyłanymi przez pętlę)"""
+    __slots__ = ('chunks',)
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+
+class GminaASGI:
+    """
+    Aplikacja ASGI z endpointami bota.
+
+    Każde żądanie to jedno zadanie w puli wątków: odczyt sesji, handler
+    (ten sam GminaBot co w app.py, sesja przypięta przez bound_session),
+    zapis sesji i kodowanie JSON. Liczba zadań w puli jest ograniczona;
+    żądania ponad limit czekają w pętli, a po przekroczeniu max_pending
+    dostają 503 zamiast nieograniczenie rosnącej kolejki.
+    """
+
+    def __init__(self, bot=None, store=None, threads=None, max_pending=None, export_threads=2):
+        self.bot = bot or GminaBot()
+        self.sessions = ServerSideSessionInterface(store or make_session_store())
+        self.threads = threads or int(os.getenv('GMINA_ASGI_THREADS', '4'))
+        self.max_pending = max_pending or int(os.getenv('GMINA_ASGI_MAX_PENDING', '4096'))
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='gmina-asgi')
+        # Eksporty czytają bazę we własnej puli - długi eksport nie zajmuje wątków bota
+        self.export_executor = ThreadPoolExecutor(max_workers=export_threads, thread_name_prefix='gmina-export')
+        self._slots = None
+        self.pending = 0
+        self.rejected = 0
+        self.routes = {
+            '/gmina-bot/start': _Route('gmina_bot_start', 'POST', self._start, 500, {
+                'reply': {
+                    'text_message': 'Wystąpił błąd podczas inicjalizacji.',
+                    'buttons': [{'text': 'Spróbuj ponownie', 'action': 'restart'}]
+                }
+            }),
+            '/gmina-bot/send': _Route('gmina_bot_send', 'POST', self._send, 500, {
+                'reply': {
+                    'text_message': 'Wystąpił błąd podczas przetwarzania zapytania. Spróbuj ponownie.',
+                    'buttons': [{'text': 'Powrót do menu', 'action': 'main_menu'}]
+                }
+            }),
+            '/gmina-bot/search': _Route('gmina_bot_search', 'POST', self._search, 200, {'suggestions': []}),
+            '/gmina-bot/process-custom': _Route('gmina_bot_process_custom', 'POST', self._process_custom, 500, {
+                'reply': {
+                    'text_message': 'Nie udało się przetworzyć zgłoszenia.',
+                    'buttons': [{'text': 'Spróbuj ponownie', 'action': 'zglos_problem'}]
+                }
+            }),
+            '/gmina-bot/process-custom-batch': _Route(
+                'gmina_bot_process_custom_batch', 'POST', self._process_custom_batch, 500,
+                {'error': 'Nie udało się przetworzyć paczki zgłoszeń'}, max_body=MAX_BULK_BODY_BYTES
+            ),
+            '/gmina-bot/track-no-results': _Route('gmina_track_no_results', 'POST', self._track_no_results, 500, {
+                'status': 'error', 'error': 'internal_error', 'rodo_compliant': True
+            }),
+            '/health': _Route('health_check', 'GET', self._health, 500, {'status': 'ERROR'}),
+        }
+
+    # --- Handlery (wątek puli, sesja przypięta) ---
+
+    def _start(self, body):
+        data = decode_request(body, StartRequest)
+        if not data:
+            return 400, {'error': 'Brak danych JSON'}
+        gmina_name = data.gmina
+        if not gmina_name:
+            return 400, {'error': 'Brak nazwy gminy'}
+
+        session.permanent = True
+        if not self.bot.set_gmina_context({'gmina': gmina_name}):
+            return 400, {'error': 'Nieprawidłowa nazwa gminy'}
+        return 200, self.bot.actions.render('main_menu', gmina_name, self.bot.catalog_for(gmina_name).version,
+                                            encode_reply)
+
+    def _send(self, body):
+        if 'gmina_context' not in session:
+            return 400, {
+                'reply': {
+                    'text_message': 'Sesja wygasła. Proszę wybrać gminę ponownie.',
+                    'buttons': [{'text': 'Powrót do wyboru gminy', 'action': 'restart'}]
+                }
+            }
+        data = decode_request(body, SendRequest)
+        if data is None:
+            return 400, {'error': 'Brak wiadomości lub akcji'}
+
+        if data.selection_data:
+            reply = self.bot.process_search_selection(data.selection_data)
+        elif data.button_action:
+            cached = self.bot.render_button_action(data.button_action, encode_reply)
+            if cached is not None:
+                return 200, cached
+            reply = self.bot.handle_button_action(data.button_action)
+        elif data.message:
+            reply = self.bot.get_bot_response(data.message)
+        else:
+            return 400, {'error': 'Brak wiadomości lub akcji'}
+        return 200, encode_reply(reply)
+
+    def _search(self, body):
+        if 'gmina_context' not in session:
+            return 200, SearchResponse([])
+        data = decode_request(body, SearchRequest) or SearchRequest()
+        if not data.query or len(data.query) < 2:
+            return 200, SearchResponse([])
+        gmina_name = session['gmina_context'].get('gmina')
+        return 200, SearchResponse(self.bot.cached_search_suggestions(data.query, data.context, gmina_name))
+
+    def _process_custom(self, body):
+        if 'gmina_context' not in session:
+            return 400, {'error': 'Brak sesji'}
+        data = decode_request(body, CustomInputRequest)
+        if data is None:
+            return 400, {'error': 'Brak danych JSON'}
+        if data.type == 'problem':
+            reply = self.bot.process_custom_problem(data.custom_input)
+        else:
+            reply = self.bot.get_bot_response(data.custom_input)
+        return 200, encode_reply(reply)
+
+    def _process_custom_batch(self, body):
+        if 'gmina_context' not in session:
+            return 400, {'error': 'Brak sesji'}
+        problems = decode_bulk(body)
+        if problems is None:
+            return 400, {'error': 'Brak danych JSON'}
+        if len(problems) > MAX_BULK_PROBLEMS:
+            return 413, {'error': f'Za dużo zgłoszeń w paczce (maks. {MAX_BULK_PROBLEMS})'}
+        return 200, _Stream(list(encode_lines(self.bot.process_bulk_problems(problems))))
+
+    def _track_no_results(self, body):
+        data = decode_request(body, NoResultsRequest) or NoResultsRequest()
+        query = data.query
+        # RODO Protection: tylko frazy > 2 znaków
+        if len(query.strip()) <= 2:
+            return 200, {'status': 'skipped', 'reason': 'query too short (RODO protection)'}
+        if 'gmina_context' not in session:
+            return 200, {'status': 'skipped', 'reason': 'no active session'}
+
+        # Agregacja lokalna i tylko kolejkowanie próbki - wysyłkę do GA4 wykonuje wątek GA4Dispatcher
+        aggregated, ga4_success = self.bot.track_no_results(query, data.search_type)
+        return 200, {
+            'status': 'success' if aggregated or ga4_success else 'partial_success',
+            'aggregated': aggregated,
+            'ga4_sent': ga4_success,
+            'query_length': len(query),
+            'search_type': data.search_type,
+            'rodo_compliant': True
+        }
+
+    def _health(self, body):
+        return 200, {
+            'status': 'OK',
+            'service': 'Gmina-AI Bot Enterprise',
+            'version': '3.0',
+            'mode': 'asgi',
+            'session_active': 'gmina_context' in session,
+            'search_cache': self.bot.search_cache.stats(),
+            'ga4_dispatcher': self.bot.ga4_dispatcher.stats(),
+            'tickets': self.bot.tickets.stats(),
+            'no_results_log': self.bot.no_results.stats(),
+            'no_results_top': self.bot.no_results_top.stats(),
+            'catalogs': self.bot.catalogs.stats(),
+            'actions': self.bot.actions.stats(),
+            'scoring_shards': self.bot.shard_pool.stats() if self.bot.shard_pool is not None else None,
+            'gmina_registry': self.bot.gmina_data.stats(),
+            'teryt': self.bot.teryt.stats(),
+            'executor': self.stats()
+        }
+
+    def stats(self):
+        return {
+            'threads': self.threads,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected
+        }
+
+    # --- Zadanie w puli: sesja + handler + serializacja ---
+
+    def _run(self, route, body, sid):
+        current = self.sessions.load(sid)
+        with bound_session(current):
+            try:
+                status, payload = route.handler(body)
+            except Exception as e:
+                logger.exception("Błąd krytyczny w %s: %s", route.name, e)
+                status, payload = route.error_status, route.error_payload
+            if isinstance(payload, _Stream):
+                headers, content = list(_NDJSON_HEADERS), payload
+            else:
+                headers, content = list(_JSON_HEADERS), payload if isinstance(payload, bytes) else encode(payload)
+
+        outcome = self.sessions.persist(current, SESSION_LIFETIME.total_seconds())
+        if outcome == 'delete':
+            headers.append((b'set-cookie', dump_cookie(SESSION_COOKIE_NAME, '', max_age=0, expires=0,
+                                                       httponly=True, samesite='Lax').encode('latin-1')))
+        elif outcome == 'keep' and (current.new or current.modified or current.permanent):
+            expires = datetime.now(timezone.utc) + SESSION_LIFETIME if current.permanent else None
+            headers.append((b'set-cookie', dump_cookie(SESSION_COOKIE_NAME, current.sid, expires=expires,
+                                                       httponly=True, samesite='Lax').encode('latin-1')))
+        return status, headers, content
+
+    # --- ASGI ---
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        started = time.perf_counter()
+        route = self.routes.get(scope['path'])
+        status = await self._handle(route, scope, receive, send)
+        if status is not None:
+            endpoint = route.name if route is not None else _LOOP_ENDPOINTS.get(scope['path'], 'other')
+            REQUEST_SECONDS.labels(endpoint, http_method(scope['method']), str(status)).observe(
+                time.perf_counter() - started
+            )
+
+    async def _handle(self, route, scope, receive, send):
+        """Obsługa żądania HTTP - zwraca status odpowiedzi (None, gdy klient się rozłączył)"""
+        if route is None:
+            if scope['path'] == '/metrics' and scope['method'] == 'GET':
+                return await self._respond(send, 200, _METRICS_HEADERS, REGISTRY.render().encode('utf-8'))
+            if scope['path'] == '/admin/export' and scope['method'] == 'GET':
+                return await self._export(scope, receive, send)
+            if scope['path'] == '/admin/no-results' and scope['method'] == 'GET':
+                return await self._no_results_report(scope, send)
+            return await self._respond(send, 404, _JSON_HEADERS, _NOT_FOUND)
+        if scope['method'] != route.method:
+            return await self._respond(send, 405, _JSON_HEADERS, _METHOD_NOT_ALLOWED)
+
+        try:
+            body = await self._read_body(receive, route.max_body)
+        except _BodyTooLarge:
+            return await self._respond(send, 413, _JSON_HEADERS, _TOO_LARGE)
+        if body is None:  # Klient rozłączył się przed wysłaniem całego ciała
+            return None
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return await self._respond(send, 503, _JSON_HEADERS + [(b'retry-after', b'1')], _OVERLOADED)
+
+        sid = None
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                sid = parse_cookie(value.decode('latin-1')).get(SESSION_COOKIE_NAME)
+                break
+
+        if self._slots is None:
+            # Semafor tworzony w pętli, która obsługuje żądania
+            self._slots = asyncio.Semaphore(self.threads * 2)
+        self.pending += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                status, headers, content = await loop.run_in_executor(self.executor, self._run, route, body, sid)
+        finally:
+            self.pending -= 1
+        return await self._respond(send, status, headers, content)
+
+    @staticmethod
+    def _admin_params(scope):
+        """Parametry zapytania endpointu administracyjnego (None bez poprawnego tokenu)"""
+        authorization = None
+        for name, value in scope['headers']:
+            if name == b'authorization':
+                authorization = value.decode('latin-1')
+                break
+        if not admin_authorized(authorization):
+            return None
+        return {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+
+    async def _no_results_report(self, scope, send):
+        """Top fraz bez wyników (/admin/no-results) - odczyt snapshotów w puli eksportów"""
+        params = self._admin_params(scope)
+        if params is None:
+            return await self._respond(send, 403, _JSON_HEADERS, _FORBIDDEN)
+        try:
+            limit = int(params.get('limit') or 0) or None
+        except ValueError:
+            return await self._respond(send, 400, _JSON_HEADERS, _BAD_LIMIT)
+        report = await asyncio.get_running_loop().run_in_executor(
+            self.export_executor, self.bot.no_results_top.report, params.get('gmina'), params.get('search_type'), limit
+        )
+        return await self._respond(send, 200, _JSON_HEADERS, encode(report))
+
+    async def _export(self, scope, receive, send):
+        """
+        Eksport /admin/export strumieniem (parametry jak w app.py).
+
+        Każdy kawałek (odczyt kursora, kodowanie, gzip) liczony jest w puli
+        eksportów, pętla tylko go wysyła - wysyłka czeka na klienta, więc
+        wolny odbiorca nie powoduje gromadzenia danych w pamięci, a po
+        rozłączeniu klienta eksport jest przerywany.
+        """
+        params = self._admin_params(scope)
+        if params is None:
+            return await self._respond(send, 403, _JSON_HEADERS, _FORBIDDEN)
+        dataset = params.get('dataset', 'tickets')
+        fmt = params.get('format', 'ndjson')
+        compress = params.get('gzip', '') in ('1', 'true')
+        if dataset not in DATASETS or fmt not in FORMATS:
+            return await self._respond(send, 400, _JSON_HEADERS, _BAD_EXPORT)
+        try:
+            since, until = parse_time(params.get('since')), parse_time(params.get('until'))
+        except ValueError:
+            return await self._respond(send, 400, _JSON_HEADERS, _BAD_DATE)
+
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        try:
+            chunks = await loop.run_in_executor(
+                self.export_executor, export_stream, dataset, fmt, compress, since, until
+            )
+        except FileNotFoundError:
+            return await self._respond(send, 404, _JSON_HEADERS, _EXPORT_NO_DATA)
+        except Exception as e:
+            logger.exception("Błąd eksportu %s: %s", dataset, e)
+            return await self._respond(send, 500, _JSON_HEADERS, _EXPORT_FAILED)
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            # Pierwszy kawałek przed nagłówkami - błąd bazy to jeszcze zwykłe 500
+            try:
+                chunk = await loop.run_in_executor(self.export_executor, next, chunks, None)
+            except Exception as e:
+                logger.exception("Błąd eksportu %s: %s", dataset, e)
+                return await self._respond(send, 500, _JSON_HEADERS, _EXPORT_FAILED)
+
+            filename = export_filename(dataset, fmt, compress, since)
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', (GZIP_MIMETYPE if compress else MIMETYPES[fmt]).encode('latin-1')),
+                (b'content-disposition', f'attachment; filename="{filename}"'.encode('latin-1')),
+            ]})
+            while chunk is not None:
+                if disconnected.is_set():
+                    logger.info("Eksport %s przerwany - klient rozłączył się", dataset)
+                    return None
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.export_executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+            return 200
+        finally:
+            watcher.cancel()
+            # Przerwany transfer zamyka kursor i połączenie eksportu
+            await loop.run_in_executor(self.export_executor, chunks.close)
+
+    @staticmethod
+    async def _read_body(receive, max_body=MAX_BODY_BYTES):
+        """Ciało żądania (None po rozłączeniu klienta)"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > max_body:
+                raise _BodyTooLarge()
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    @staticmethod
+    async def _respond(send, status, headers, content):
+        if isinstance(content, _Stream):
+            # Bez content-length - serwer wysyła odpowiedź w trybie chunked
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            for chunk in content.chunks:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+            return status
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers + [(b'content-length', str(len(content)).encode())]})
+        await send({'type': 'http.response.body', 'body': content})
+        return status
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Dosłanie zakolejkowanych eventów GA4 i zapytań bez wyników, zamknięcie pul i workerów shardów
+                await asyncio.get_running_loop().run_in_executor(None, self.bot.ga4_dispatcher.close, 5)
+                await asyncio.get_running_loop().run_in_executor(None, self.bot.no_results.close, 5)
+                await asyncio.get_running_loop().run_in_executor(None, self.bot.no_results_top.flush)
+                if self.bot.shard_pool is not None:
+                    self.bot.shard_pool.close()
+                self.executor.shutdown(wait=False)
+                self.export_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = GminaASGI()
@@ -0,0 +1 @@
+"""benchmarks - Benchmarki wydajności Gmina-AI (nie są częścią aplikacji)"""
@@ -0,0 +1,263 @@
+"""concurrency.py - Benchmark tysięcy równoczesnych połączeń wyszukiwania predykcyjnego
+
+Każde połączenie to mieszkaniec z otwartym czatem: /gmina-bot/start,
+a potem wpisywanie fraz znak po znaku (odstępy log-normalne, mediana
+~150 ms) i /gmina-bot/search po każdym znaku. Połączenia są keep-alive
+i żyją przez cały przebieg - mierzymy, jak serwer znosi dużą liczbę
+jednocześnie otwartych, w większości bezczynnych połączeń.
+
+Klient to jeden proces asyncio (bez wątku na połączenie). Porównywane
+tryby serwera:
+    asgi     - asgi.py pod uvicornem, jeden proces
+    gunicorn - app.py pod gunicornem (--workers x --threads, gthread)
+
+Użycie:
+    python -m benchmarks.concurrency
+    python -m benchmarks.concurrency --connections 100 1000 2000 --duration 20
+    python -m benchmarks.concurrency --modes asgi --size 10000 --workers 1 --threads 8
+
+Raport JSON (domyślnie benchmarks/results/concurrency.json): per tryb
+i liczba połączeń - ile połączeń udało się otworzyć, przepustowość,
+p50/p95/p99 opóźnień /search, błędy i timeouty, RSS serwera.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.load_test import (  # noqa: E402
+    GMINY, RESULTS_DIR, _benchmark_env, percentile, process_tree_rss, running_server
+)
+from benchmarks.synthetic import keystroke_stream, search_phrases, synthetic_catalog, write_catalog_dir  # noqa: E402
+from ga4_dispatcher import StubCollector  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, 'concurrency.json')
+
+
+class HttpConnection:
+    """Minimalny klient HTTP/1.1 keep-alive na strumieniach asyncio (jedno połączenie)"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.cookie = None
+        self.reconnects = 0
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def post(self, path, payload):
+        body = json.dumps(payload).encode('utf-8')
+        try:
+            return await self._exchange(path, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Serwer zamknął bezczynne połączenie (keep-alive timeout) - jedno ponowienie
+            self.close()
+            self.reconnects += 1
+            await self.open()
+            return await self._exchange(path, body)
+
+    async def _exchange(self, path, body):
+        if self.writer is None:
+            await self.open()
+        head = [
+            f'POST {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+            'Content-Type: application/json', f'Content-Length: {len(body)}'
+        ]
+        if self.cookie:
+            head.append(f'Cookie: {self.cookie}')
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        raw = await self.reader.readuntil(b'\r\n\r\n')
+        lines = raw.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        length = 0
+        keep_alive = True
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'set-cookie':
+                self.cookie = value.split(';', 1)[0]
+            elif name == 'connection' and value.lower() == 'close':
+                keep_alive = False
+        content = await self.reader.readexactly(length) if length else b''
+        if not keep_alive:
+            self.close()
+        return status, content
+
+
+class Stats:
+    """Wyniki przebiegu (wszystkie połączenia w jednej pętli - bez blokad)"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.timeouts = 0
+        self.connected = 0
+        self.failed_connections = 0
+        self.reconnects = 0
+
+
+async def resident(host, port, stats, rng, phrases, measure_from, deadline, ramp_delay, timeout):
+    """Jedno połączenie: start sesji i wpisywanie fraz do końca przebiegu (liczone po rozruchu)"""
+    await asyncio.sleep(ramp_delay)
+    connection = HttpConnection(host, port)
+    try:
+        await asyncio.wait_for(connection.open(), timeout)
+        status, _ = await asyncio.wait_for(connection.post('/gmina-bot/start', {'gmina': rng.choice(GMINY)}), timeout)
+        if status != 200:
+            raise ConnectionError(status)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+        stats.failed_connections += 1
+        connection.close()
+        return
+    stats.connected += 1
+
+    try:
+        while time.monotonic() < deadline:
+            context, phrase = rng.choice(phrases)
+            for prefix in keystroke_stream(phrase):
+                await asyncio.sleep(rng.lognormvariate(-1.9, 0.6))
+                if time.monotonic() >= deadline:
+                    return
+                measured = time.monotonic() >= measure_from
+                started = time.perf_counter()
+                try:
+                    status, _ = await asyncio.wait_for(
+                        connection.post('/gmina-bot/search', {'query': prefix, 'context': context}), timeout
+                    )
+                except asyncio.TimeoutError:
+                    stats.timeouts += measured
+                    connection.close()
+                    continue
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    stats.errors += measured
+                    connection.close()
+                    continue
+                if not measured:
+                    continue
+                if status == 200:
+                    stats.latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    stats.errors += 1
+    finally:
+        stats.reconnects += connection.reconnects
+        connection.close()
+
+
+async def run_clients(base_url, connections, phrases, options, seed):
+    url = urlsplit(base_url)
+    stats = Stats()
+    measure_from = time.monotonic() + options.ramp
+    deadline = measure_from + options.duration
+    rng = random.Random(seed)
+    tasks = [
+        resident(url.hostname, url.port, stats, random.Random(rng.random()), phrases, measure_from, deadline,
+                 options.ramp * number / connections, options.timeout)
+        for number in range(connections)
+    ]
+    await asyncio.gather(*tasks)
+    return stats, options.duration
+
+
+def result_entry(mode, connections, stats, elapsed, rss):
+    latencies = sorted(stats.latencies)
+    return {
+        'mode': mode,
+        'connections': connections,
+        'connected': stats.connected,
+        'failed_connections': stats.failed_connections,
+        'requests': len(latencies),
+        'errors': stats.errors,
+        'timeouts': stats.timeouts,
+        'reconnects': stats.reconnects,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+        'rss_bytes': rss
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark wielu równoczesnych połączeń /gmina-bot/search')
+    parser.add_argument('--modes', nargs='+', choices=('asgi', 'gunicorn'), default=['asgi', 'gunicorn'])
+    parser.add_argument('--connections', nargs='+', type=int, default=[100, 1000, 2000])
+    parser.add_argument('--size', type=int, default=100, help='rozmiar syntetycznego katalogu')
+    parser.add_argument('--duration', type=float, default=20, help='czas pomiaru [s] (po rozruchu)')
+    parser.add_argument('--ramp', type=float, default=5, help='czas otwierania połączeń [s]')
+    parser.add_argument('--timeout', type=float, default=30, help='timeout pojedynczego żądania [s]')
+    parser.add_argument('--phrases', type=int, default=200, help='liczba różnych fraz wyszukiwania')
+    parser.add_argument('--workers', type=int, default=2, help='workery gunicorna')
+    parser.add_argument('--threads', type=int, default=4, help='wątki na workera gunicorna')
+    parser.add_argument('--session-backend', default='sqlite', choices=('sqlite', 'memory'))
+    parser.add_argument('--startup-timeout', type=float, default=600)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': {key: value for key, value in vars(options).items() if key != 'output'}
+        },
+        'results': {}
+    }
+
+    catalog = synthetic_catalog(options.size)
+    phrases = search_phrases(catalog, options.phrases)
+    with StubCollector() as collector, tempfile.TemporaryDirectory(prefix='gmina-conc-') as work_dir:
+        catalog_dir = write_catalog_dir(os.path.join(work_dir, 'catalog'), options.size)
+        for mode in options.modes:
+            for connections in options.connections:
+                run_dir = tempfile.mkdtemp(prefix=f'{mode}-{connections}-', dir=work_dir)
+                env = _benchmark_env(catalog_dir, run_dir, collector.url, options)
+                print(f"[BENCH] {mode} / {connections} połączeń / {options.duration} s ...", flush=True)
+                with running_server(mode, options.size, env, options, run_dir) as (base_url, pid, _):
+                    stats, elapsed = asyncio.run(run_clients(base_url, connections, phrases, options, connections))
+                    result = result_entry(mode, connections, stats, elapsed, process_tree_rss(pid))
+                key = f'{mode}/{connections}'
+                report['results'][key] = result
+                print(f"   połączone {result['connected']}/{connections}, {result['throughput_rps']} req/s, "
+                      f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, "
+                      f"błędy {result['errors']}, timeouty {result['timeouts']}, "
+                      f"RSS {(result['rss_bytes'] or 0) / 1024 / 1024:.1f} MB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n[BENCH] Raport zapisany: {options.output}")
+
+
+if __name__ == '__main__':
+    with contextlib.suppress(KeyboardInterrupt):
+        main()
@@ -0,0 +1,526 @@
+"""load_test.py - Test obciążeniowy i benchmark opóźnień endpointów /gmina-bot
+
+Każdy wirtualny mieszkaniec przechodzi pełną ścieżkę z frontendu:
+/start -> /send (przycisk) -> strumień /search podczas wpisywania ->
+/send (wybór sugestii) albo /track-no-results -> /process-custom ->
+/send (wiadomość tekstowa), a co kilka sesji także /health.
+
+Scenariusz uruchamiany jest na syntetycznych katalogach (domyślnie 100,
+10 000 i 100 000 wpisów) w trybach:
+    flask    - test client Flaska w osobnym procesie (czysty pomiar RSS)
+    gunicorn - prawdziwy gunicorn na localhost (--preload) i klient HTTP
+    asgi     - asgi.py pod uvicornem (jeden proces), klient HTTP
+
+Użycie:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --modes flask --sizes 100 10000 --users 50
+    python -m benchmarks.load_test --modes gunicorn asgi --sizes 10000
+    python -m benchmarks.load_test --workload debounced --concurrency 16
+    python -m benchmarks.load_test --save-baseline
+    python -m benchmarks.load_test --allow-missing-baseline
+    python -m benchmarks.load_test --baseline benchmarks/results/baseline.json --tolerance 0.25
+
+Raport JSON (domyślnie benchmarks/results/latest.json) zawiera p50/p95/p99
+i średnią per endpoint, przepustowość oraz RSS. Wyniki są porównywane
+z baseline, a regresje (wolniejsze p95/p99, niższa przepustowość, wyższy
+RSS ponad tolerancję) kończą program kodem 1. Baseline nie jest
+w repozytorium (zależy od maszyny) - trzeba go zapisać przez
+--save-baseline na maszynie referencyjnej; bez niego program kończy się
+kodem 2, chyba że podano --allow-missing-baseline.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic import (  # noqa: E402
+    CATALOG_SIZES, debounced_stream, keystroke_stream, search_phrases, synthetic_catalog, write_catalog_dir
+)
+from ga4_dispatcher import StubCollector  # noqa: E402
+
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, 'latest.json')
+
+ENDPOINTS = ('start', 'send', 'search', 'process-custom', 'track-no-results', 'health')
+
+GMINY = ['Przykładowa Gmina', 'Demo Gmina'] + [f'Gmina Testowa {i}' for i in range(48)]
+BUTTON_ACTIONS = [
+    'znajdz_kontakt', 'pobierz_formularz', 'zglos_problem', 'main_menu', 'sprawdz_gmine',
+    'quick_sekretariat', 'quick_finanse', 'quick_budownictwo', 'quick_form_odpady',
+    'quick_form_budownictwo', 'quick_form_srodowisko', 'quick_problem_drogi', 'quick_problem_oswietlenie'
+]
+MESSAGES = [
+    'gdzie złożyć wniosek o dowód osobisty', 'numer do sekretariatu', 'status zgłoszenia',
+    'podatek od nieruchomości termin', 'nie odebrali śmieci', 'godziny otwarcia urzędu',
+    'jak zgłosić dziurę w drodze', 'Przykładowa Gmina'
+]
+CUSTOM_PROBLEMS = [
+    'Na ulicy Polnej od tygodnia nie świeci latarnia',
+    'Dziura w asfalcie przy szkole, niebezpieczne dla rowerzystów',
+    'Nie odebrano odpadów segregowanych w tym miesiącu',
+    'Przewrócone drzewo blokuje chodnik przy parku',
+    'Hałas z budowy w nocy przy ul. Leśnej'
+]
+
+# Co która sesja odpytuje /health (monitoring, load balancer)
+HEALTH_EVERY = 5
+
+
+def percentile(sorted_values, fraction):
+    """Percentyl metodą nearest-rank na posortowanej liście"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def rss_bytes(pid=None):
+    """Bieżący RSS procesu (Linux /proc), None gdy niedostępny"""
+    path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def process_tree_rss(root_pid):
+    """Suma RSS procesu i jego potomków (master gunicorna + workery)"""
+    children = {}
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else ():
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, pending = 0, [root_pid]
+    while pending:
+        pid = pending.pop()
+        total += rss_bytes(pid) or 0
+        pending.extend(children.get(pid, ()))
+    return total or None
+
+
+class Recorder:
+    """Zbiera czasy odpowiedzi per endpoint (jeden recorder na wątek, scalane na końcu)"""
+
+    def __init__(self):
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+
+    def timed(self, endpoint, call, *args):
+        start = time.perf_counter()
+        status, body = call(*args)
+        self.samples[endpoint].append(time.perf_counter() - start)
+        if status >= 500:
+            self.errors[endpoint] += 1
+        return body or {}
+
+    def merge(self, other):
+        for endpoint in ENDPOINTS:
+            self.samples[endpoint].extend(other.samples[endpoint])
+            self.errors[endpoint] += other.errors[endpoint]
+
+    def summary(self):
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            values = sorted(self.samples[endpoint])
+            if not values:
+                continue
+            endpoints[endpoint] = {
+                'count': len(values),
+                'errors': self.errors[endpoint],
+                'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+                'mean_ms': round(sum(values) / len(values) * 1000, 3),
+                'max_ms': round(values[-1] * 1000, 3)
+            }
+        return endpoints
+
+    @property
+    def requests(self):
+        return sum(len(values) for values in self.samples.values())
+
+
+class FlaskTransport:
+    """Klient na app.test_client() - jeden na wirtualnego mieszkańca (własne ciasteczko sesji)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, path, payload):
+        response = self.client.post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """Klient HTTP do prawdziwego serwera (keep-alive, własne ciasteczka)"""
+
+    def __init__(self, base_url, timeout=60):
+        import requests
+        self.base_url = base_url
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.exceptions = requests.exceptions
+
+    def _call(self, method, path, payload=None):
+        try:
+            response = self.http.request(method, self.base_url + path, json=payload, timeout=self.timeout)
+        except self.exceptions.RequestException:
+            return 599, None
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    def post(self, path, payload):
+        return self._call('POST', path, payload)
+
+    def get(self, path):
+        return self._call('GET', path)
+
+
+def run_user(transport, recorder, rng, phrases, workload, user_number):
+    """Jedna sesja mieszkańca - kolejność i warunki jak w static/script.js"""
+    post = transport.post
+    recorder.timed('start', post, '/gmina-bot/start', {'gmina': rng.choice(GMINY)})
+    recorder.timed('send', post, '/gmina-bot/send', {'button_action': rng.choice(BUTTON_ACTIONS)})
+
+    context, phrase = rng.choice(phrases)
+    if workload == 'keystroke':
+        stream = keystroke_stream(phrase)
+    else:
+        stream = debounced_stream(phrase, rng)
+
+    suggestions = []
+    for prefix in stream:
+        body = recorder.timed('search', post, '/gmina-bot/search', {'query': prefix, 'context': context})
+        suggestions = body.get('suggestions') or []
+        if not suggestions and len(prefix) > 2:
+            recorder.timed('track-no-results', post, '/gmina-bot/track-no-results',
+                           {'query': prefix, 'search_type': context})
+
+    if suggestions:
+        recorder.timed('send', post, '/gmina-bot/send', {'selection_data': {'id': suggestions[0]['id']}})
+    recorder.timed('process-custom', post, '/gmina-bot/process-custom',
+                   {'custom_input': rng.choice(CUSTOM_PROBLEMS), 'type': 'problem'})
+    recorder.timed('send', post, '/gmina-bot/send', {'message': rng.choice(MESSAGES)})
+
+    if user_number % HEALTH_EVERY == 0:
+        recorder.timed('health', transport.get, '/health')
+
+
+def drive(make_transport, phrases, options, seed):
+    """Uruchamia options.users sesji na options.concurrency wątkach, zwraca (recorder, czas)"""
+    counter = iter(range(options.users))
+    counter_lock = threading.Lock()
+    recorders = []
+
+    def worker(worker_number):
+        rng = random.Random(seed * 1000 + worker_number)
+        recorder = Recorder()
+        recorders.append(recorder)
+        while True:
+            with counter_lock:
+                user_number = next(counter, None)
+            if user_number is None:
+                return
+            run_user(make_transport(), recorder, rng, phrases, options.workload, user_number)
+
+    # Rozgrzewka: import leniwych modułów, pierwsze połączenia, zapełnienie cache
+    warmup = Recorder()
+    rng = random.Random(seed)
+    for user_number in range(options.warmup):
+        run_user(make_transport(), warmup, rng, phrases, options.workload, user_number + 1)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(options.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = Recorder()
+    for recorder in recorders:
+        merged.merge(recorder)
+    return merged, elapsed
+
+
+def result_entry(mode, size, recorder, elapsed, startup_seconds, rss_idle, rss_loaded, peak_rss=None):
+    return {
+        'mode': mode,
+        'catalog_size': size,
+        'startup_seconds': round(startup_seconds, 3),
+        'requests': recorder.requests,
+        'errors': sum(recorder.errors.values()),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(recorder.requests / elapsed, 2) if elapsed else None,
+        'rss_idle_bytes': rss_idle,
+        'rss_bytes': rss_loaded,
+        'peak_rss_bytes': peak_rss,
+        'endpoints': recorder.summary()
+    }
+
+
+def _benchmark_env(catalog_dir, work_dir, collector_url, options):
+    """Zmienne środowiskowe aplikacji pod benchmark (katalog, sesje, zgłoszenia, stub GA4)"""
+    env = {
+        'GMINA_CATALOG_DIR': catalog_dir,
+        'SESSION_BACKEND': options.session_backend,
+        'SESSION_SQLITE_PATH': os.path.join(work_dir, 'sessions.sqlite3'),
+        'GMINA_TICKETS_PATH': os.path.join(work_dir, 'tickets.sqlite3'),
+    }
+    if collector_url:
+        env.update({'GA4_MEASUREMENT_ID': 'G-BENCHMARK', 'GA4_API_SECRET': 'benchmark', 'GA4_ENDPOINT': collector_url})
+    return env
+
+
+def _flask_run(size, env, phrases, options):
+    """Tryb flask - wykonywany w świeżym procesie, żeby RSS dotyczył tylko tego katalogu"""
+    os.environ.update(env)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        import app as app_module
+        startup_seconds = time.perf_counter() - started
+        rss_idle = rss_bytes()
+
+        recorder, elapsed = drive(lambda: FlaskTransport(app_module.app), phrases, options, seed=size)
+        app_module.bot.ga4_dispatcher.flush()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024  # Linux podaje ru_maxrss w KB
+    return result_entry('flask', size, recorder, elapsed, startup_seconds, rss_idle, rss_bytes(), peak_rss)
+
+
+def run_flask(size, env, phrases, options):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(_flask_run, (size, env, phrases, options))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode, port, options):
+    """Polecenie serwera HTTP: gunicorn (Flask, --preload) albo uvicorn (asgi.py, jeden proces)"""
+    if mode == 'gunicorn':
+        return [
+            sys.executable, '-m', 'gunicorn', '--preload',
+            '--workers', str(options.workers), '--threads', str(options.threads),
+            '--bind', f'127.0.0.1:{port}', '--timeout', '300', 'app:app'
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+        '--log-level', 'warning', '--no-access-log', '--timeout-keep-alive', '60'
+    ]
+
+
+@contextlib.contextmanager
+def running_server(mode, size, env, options, work_dir):
+    """
+    Uruchamia serwer na wolnym porcie i czeka na /health.
+
+    Yields:
+        (base_url, pid, startup_seconds)
+    """
+    import requests
+
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    log_path = os.path.join(work_dir, f'{mode}-{size}.log')
+    with open(log_path, 'w') as log:
+        started = time.perf_counter()
+        server = subprocess.Popen(server_command(mode, port, options), cwd=REPO_ROOT,
+                                  env={**os.environ, **env}, stdout=log, stderr=log)
+    try:
+        deadline = started + options.startup_timeout
+        while True:
+            if server.poll() is not None:
+                with open(log_path) as log:
+                    tail = log.read()[-2000:]
+                raise RuntimeError(f'{mode} zakończył się kodem {server.returncode}:\n{tail}')
+            try:
+                if requests.get(base_url + '/health', timeout=5).status_code == 200:
+                    break
+            except requests.exceptions.RequestException:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f'{mode} nie wystartował w {options.startup_timeout} s')
+            time.sleep(0.2)
+        yield base_url, server.pid, time.perf_counter() - started
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def run_server(mode, size, env, phrases, options, work_dir):
+    """Tryby gunicorn i asgi - prawdziwy serwer na localhost i klient HTTP"""
+    with running_server(mode, size, env, options, work_dir) as (base_url, pid, startup_seconds):
+        rss_idle = process_tree_rss(pid)
+        recorder, elapsed = drive(lambda: HttpTransport(base_url), phrases, options, seed=size)
+        return result_entry(mode, size, recorder, elapsed, startup_seconds, rss_idle, process_tree_rss(pid))
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Porównuje raport z baseline; zwraca listę opisów regresji"""
+    regressions = []
+    for key, result in report['results'].items():
+        base = baseline.get('results', {}).get(key)
+        if base is None:
+            continue
+        for endpoint, stats in result['endpoints'].items():
+            base_stats = base['endpoints'].get(endpoint)
+            if base_stats is None:
+                continue
+            for metric in ('p95_ms', 'p99_ms'):
+                current, previous = stats[metric], base_stats[metric]
+                if current > previous * (1 + tolerance) and current - previous > min_delta_ms:
+                    regressions.append(f'{key} {endpoint} {metric}: {previous} -> {current}')
+        if base.get('throughput_rps') and result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{key} throughput_rps: {base['throughput_rps']} -> {result['throughput_rps']}")
+        if base.get('rss_bytes') and result['rss_bytes'] and result['rss_bytes'] > base['rss_bytes'] * (1 + tolerance):
+            regressions.append(f"{key} rss_bytes: {base['rss_bytes']} -> {result['rss_bytes']}")
+    return regressions
+
+
+def print_result(key, result):
+    mb = (result['rss_bytes'] or 0) / 1024 / 1024
+    print(f"\n== {key}: {result['requests']} req, {result['throughput_rps']} req/s, "
+          f"RSS {mb:.1f} MB, start {result['startup_seconds']} s, błędy {result['errors']}")
+    print(f"   {'endpoint':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in result['endpoints'].items():
+        print(f"   {endpoint:<18}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark opóźnień endpointów /gmina-bot')
+    parser.add_argument('--modes', nargs='+', choices=('flask', 'gunicorn', 'asgi'), default=['flask', 'gunicorn'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(CATALOG_SIZES))
+    parser.add_argument('--users', type=int, default=100, help='liczba sesji mieszkańców na przebieg')
+    parser.add_argument('--warmup', type=int, default=5, help='sesje rozgrzewkowe (nie liczone)')
+    parser.add_argument('--concurrency', type=int, default=4, help='równoległe sesje (wątki klienta)')
+    parser.add_argument('--workload', choices=('keystroke', 'debounced'), default='keystroke',
+                        help='keystroke: zapytanie po każdym znaku; debounced: jak frontend (300 ms)')
+    parser.add_argument('--phrases', type=int, default=200, help='liczba różnych fraz wyszukiwania')
+    parser.add_argument('--workers', type=int, default=2, help='workery gunicorna')
+    parser.add_argument('--threads', type=int, default=4, help='wątki na workera gunicorna')
+    parser.add_argument('--session-backend', default='sqlite', choices=('sqlite', 'memory', 'cookie'))
+    parser.add_argument('--no-ga4-stub', action='store_true', help='nie uruchamiaj lokalnego kolektora GA4')
+    parser.add_argument('--startup-timeout', type=float, default=600)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='zapisz wynik jako nowy baseline')
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help='brak baseline nie kończy programu błędem (tylko ostrzeżenie)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='dopuszczalne pogorszenie (0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='ignoruj różnice opóźnień mniejsze niż ta wartość')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': {key: value for key, value in vars(options).items()
+                        if key not in ('output', 'baseline', 'save_baseline', 'allow_missing_baseline')}
+        },
+        'results': {}
+    }
+
+    collector = contextlib.nullcontext() if options.no_ga4_stub else StubCollector()
+    with collector, tempfile.TemporaryDirectory(prefix='gmina-bench-') as work_dir:
+        collector_url = None if options.no_ga4_stub else collector.url
+        for size in options.sizes:
+            catalog = synthetic_catalog(size)
+            catalog_dir = write_catalog_dir(os.path.join(work_dir, f'catalog-{size}'), size)
+            phrases = search_phrases(catalog, options.phrases)
+            for mode in options.modes:
+                run_dir = tempfile.mkdtemp(prefix=f'{mode}-{size}-', dir=work_dir)
+                env = _benchmark_env(catalog_dir, run_dir, collector_url, options)
+                print(f"[BENCH] {mode} / {size} wpisów / {options.users} sesji ...", flush=True)
+                if mode == 'flask':
+                    result = run_flask(size, env, phrases, options)
+                else:
+                    result = run_server(mode, size, env, phrases, options, run_dir)
+                key = f'{mode}/{size}'
+                report['results'][key] = result
+                print_result(key, result)
+        if collector_url:
+            report['meta']['ga4_events_received'] = len(collector.events)
+
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n[BENCH] Raport zapisany: {options.output}")
+
+    if options.save_baseline:
+        with open(options.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] Zapisano baseline: {options.baseline}")
+        return 0
+
+    if not os.path.exists(options.baseline):
+        # Bez baseline nie ma z czym porównać - to nie jest "brak regresji"
+        if options.allow_missing_baseline:
+            print(f"[BENCH] ⚠️ Brak baseline ({options.baseline}) - porównanie NIE zostało wykonane")
+            return 0
+        print(f"[BENCH] ❌ Brak baseline ({options.baseline}) - nie można sprawdzić regresji; "
+              f"zapisz go przez --save-baseline na maszynie referencyjnej")
+        return 2
+
+    with open(options.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, options.tolerance, options.min_delta_ms)
+    if regressions:
+        print(f"[BENCH] ❌ Regresje względem {options.baseline} (tolerancja {options.tolerance:.0%}):")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    print(f"[BENCH] ✅ Brak regresji względem {options.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,477 @@
+"""match_scoring.py - Mikrobenchmark rdzenia fuzzy matchingu Gmina-AI
+
+Porównuje backendy scoringu dla GminaBot.calculate_match_score i mierzy
+search_suggestions. Wymiary: długość zapytania, rozmiar korpusu, polskie
+znaki (zapytanie oryginalne vs. złożone do ASCII) i każdy z czterech
+scorerów osobno.
+
+Backendy:
+    fuzzywuzzy-difflib      fuzzywuzzy na czystym difflib.SequenceMatcher
+    fuzzywuzzy-levenshtein  fuzzywuzzy z python-Levenshtein (produkcja, wynik referencyjny)
+    python-levenshtein      te same algorytmy bezpośrednio na Levenshtein.ratio/opcodes
+    rapidfuzz               rapidfuzz.fuzz para po parze
+    rapidfuzz-cdist         rapidfuzz.process.cdist na całym korpusie (scoring.BatchScorer)
+
+Backendy parowe liczą wszystko z surowych napisów; rapidfuzz-cdist korzysta
+z posortowanych tokenów korpusu policzonych raz, jak indeks wyszukiwania.
+Dla każdego backendu raport podaje zgodność wartości scorerów z referencją
+oraz to, czy rankingi top-8 (próg > 40, kolejność stabilna) są identyczne.
+
+Użycie:
+    python -m benchmarks.match_scoring
+    python -m benchmarks.match_scoring --sizes 100 1000 --backends fuzzywuzzy-levenshtein rapidfuzz-cdist
+    python -m benchmarks.match_scoring --json > wynik.json
+"""
+import argparse
+import contextlib
+import difflib
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from fuzzywuzzy import fuzz, utils  # noqa: E402
+
+from benchmarks.synthetic import synthetic_catalog  # noqa: E402
+from scoring import WEIGHTS, BatchScorer, sorted_tokens  # noqa: E402
+from search_index import MATCH_THRESHOLD, searchable_text  # noqa: E402
+
+try:
+    import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+try:
+    import numpy as np
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:
+    np = None
+    rf_fuzz = rf_process = None
+
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, 'match_scoring.json')
+
+SCORERS = ('ratio', 'partial_ratio', 'token_sort', 'token_set')
+BACKENDS = ('fuzzywuzzy-difflib', 'fuzzywuzzy-levenshtein', 'python-levenshtein', 'rapidfuzz', 'rapidfuzz-cdist')
+REFERENCE_BACKEND = 'fuzzywuzzy-levenshtein'
+QUERY_LENGTHS = (2, 4, 8, 16, 32)
+CORPUS_SIZES = (100, 1000, 10000)
+TOP_K = 8
+
+POLISH_FOLDING = str.maketrans('ąćęłńóśźż', 'acelnoszz')
+POLISH_CHARS = frozenset('ąćęłńóśźż')
+
+SEARCH_CONTEXTS = {'persons': 'contacts', 'departments': 'contacts', 'forms': 'forms', 'problems': 'problems'}
+
+
+# --- python-Levenshtein: algorytmy fuzzywuzzy bez warstwy dekoratorów ---
+
+def _lev_ratio(s1, s2):
+    if s1 == s2:
+        return 100
+    if not s1 or not s2:
+        return 0
+    return utils.intr(100 * Levenshtein.ratio(s1, s2))
+
+
+def _lev_partial_ratio(s1, s2):
+    if s1 == s2:
+        return 100
+    if not s1 or not s2:
+        return 0
+    shorter, longer = (s1, s2) if len(s1) <= len(s2) else (s2, s1)
+    best = 0.0
+    for short_start, long_start, _ in Levenshtein.matching_blocks(
+            Levenshtein.opcodes(shorter, longer), shorter, longer):
+        start = max(long_start - short_start, 0)
+        score = Levenshtein.ratio(shorter, longer[start:start + len(shorter)])
+        if score > .995:
+            return 100
+        best = max(best, score)
+    return utils.intr(100 * best)
+
+
+def _lev_token_sort(s1, s2):
+    return _lev_ratio(sorted_tokens(s1), sorted_tokens(s2))
+
+
+def _lev_token_set(s1, s2):
+    tokens1 = set(utils.full_process(s1, force_ascii=True).split())
+    tokens2 = set(utils.full_process(s2, force_ascii=True).split())
+    if not tokens1 or not tokens2:
+        return 0
+    sorted_sect = ' '.join(sorted(tokens1 & tokens2))
+    combined_1to2 = (sorted_sect + ' ' + ' '.join(sorted(tokens1 - tokens2))).strip()
+    combined_2to1 = (sorted_sect + ' ' + ' '.join(sorted(tokens2 - tokens1))).strip()
+    return max(
+        _lev_ratio(sorted_sect, combined_1to2),
+        _lev_ratio(sorted_sect, combined_2to1),
+        _lev_ratio(combined_1to2, combined_2to1)
+    )
+
+
+# --- RapidFuzz para po parze, z preprocessingiem jak fuzzywuzzy ---
+
+def _rf_token_sort(s1, s2):
+    return utils.intr(rf_fuzz.ratio(sorted_tokens(s1), sorted_tokens(s2)))
+
+
+def _rf_token_set(s1, s2):
+    return utils.intr(rf_fuzz.token_set_ratio(sorted_tokens(s1), sorted_tokens(s2)))
+
+
+@contextlib.contextmanager
+def difflib_matcher():
+    """Przełącza fuzzywuzzy na czysty difflib (tak działa bez python-Levenshtein)"""
+    original = fuzz.SequenceMatcher
+    fuzz.SequenceMatcher = difflib.SequenceMatcher
+    try:
+        yield
+    finally:
+        fuzz.SequenceMatcher = original
+
+
+def pair_scorers(backend):
+    """Scorery (query_lower, text_lower) -> int dla backendów liczonych para po parze"""
+    if backend in ('fuzzywuzzy-difflib', 'fuzzywuzzy-levenshtein'):
+        return {
+            'ratio': fuzz.ratio,
+            'partial_ratio': fuzz.partial_ratio,
+            'token_sort': fuzz.token_sort_ratio,
+            'token_set': fuzz.token_set_ratio
+        }
+    if backend == 'python-levenshtein':
+        return {
+            'ratio': _lev_ratio,
+            'partial_ratio': _lev_partial_ratio,
+            'token_sort': _lev_token_sort,
+            'token_set': _lev_token_set
+        }
+    if backend == 'rapidfuzz':
+        return {
+            'ratio': lambda s1, s2: utils.intr(rf_fuzz.ratio(s1, s2)),
+            'partial_ratio': lambda s1, s2: utils.intr(rf_fuzz.partial_ratio(s1, s2)),
+            'token_sort': _rf_token_sort,
+            'token_set': _rf_token_set
+        }
+    raise ValueError(backend)
+
+
+def backend_available(backend):
+    if backend == 'python-levenshtein':
+        return Levenshtein is not None
+    if backend in ('rapidfuzz', 'rapidfuzz-cdist'):
+        return rf_process is not None
+    if backend == 'fuzzywuzzy-levenshtein':
+        return fuzz.SequenceMatcher is not difflib.SequenceMatcher
+    return True
+
+
+def backend_context(backend):
+    return difflib_matcher() if backend == 'fuzzywuzzy-difflib' else contextlib.nullcontext()
+
+
+class Scorer:
+    """Wyniki pojedynczych scorerów i wyniku łącznego dla jednego backendu"""
+
+    def __init__(self, backend, bot):
+        self.backend = backend
+        self.bot = bot
+        self.batch = BatchScorer() if backend == 'rapidfuzz-cdist' else None
+        self.pairs = None if self.batch else pair_scorers(backend)
+
+    def scorer_matrix(self, scorer, queries, texts, sorted_texts):
+        """Macierz wyników jednego scorera (lista list)"""
+        queries = [query.lower().strip() for query in queries]
+        texts_lower = [text.lower() for text in texts]
+        if self.batch is None:
+            function = self.pairs[scorer]
+            return [[function(query, text) for text in texts_lower] for query in queries]
+
+        if scorer in ('ratio', 'partial_ratio'):
+            function, exact = (rf_fuzz.ratio, fuzz.ratio) if scorer == 'ratio' else (rf_fuzz.partial_ratio, None)
+            query_side, text_side = queries, texts_lower
+        else:
+            function = rf_fuzz.ratio if scorer == 'token_sort' else rf_fuzz.token_set_ratio
+            exact = fuzz.ratio if scorer == 'token_sort' else fuzz.token_set_ratio
+            query_side, text_side = [sorted_tokens(query) for query in queries], sorted_texts
+        if exact is None:
+            raw = rf_process.cdist(query_side, text_side, scorer=function, dtype=np.float64)
+            return np.rint(raw).astype(int).tolist()
+        return self.batch._cdist(query_side, text_side, function, exact).astype(int).tolist()
+
+    def combined_matrix(self, queries, texts, sorted_texts):
+        """Macierz wyników calculate_match_score (bez progu - pełne wartości)"""
+        if self.batch is not None:
+            return self.batch.score_matrix(queries, texts, sorted_texts).tolist()
+        if self.backend in ('fuzzywuzzy-difflib', 'fuzzywuzzy-levenshtein'):
+            score = self.bot.calculate_match_score
+            return [[score(query, text) for text in texts] for query in queries]
+
+        pairs = self.pairs
+        matrix = []
+        for query in queries:
+            query_lower = query.lower().strip()
+            row = []
+            for text in texts:
+                text_lower = text.lower()
+                row.append(int(sum(WEIGHTS[name] * pairs[name](query_lower, text_lower) for name in SCORERS)))
+            matrix.append(row)
+        return matrix
+
+
+def ranking(scores, limit=TOP_K):
+    """Top-k indeksów jak w search_suggestions: próg > 40, sortowanie stabilne malejąco"""
+    matches = [(score, position) for position, score in enumerate(scores) if score > MATCH_THRESHOLD]
+    matches.sort(key=lambda match: -match[0])
+    return [position for _, position in matches[:limit]]
+
+
+def corpus_texts(size, seed=42):
+    """Teksty przeszukiwane (searchable_text) z syntetycznego katalogu o `size` wpisach"""
+    catalog = synthetic_catalog(size, seed)
+    texts = []
+    for section, records in (('persons', catalog['contacts']['persons']),
+                             ('departments', catalog['contacts']['departments']),
+                             ('forms', catalog['forms']),
+                             ('problems', catalog['problems'])):
+        texts.extend(searchable_text(section, record) for record in records)
+    return catalog, texts
+
+
+def make_queries(texts, length, count, rng, diacritics):
+    """
+    Fragmenty tekstów korpusu o zadanej długości, zaczynające się od początku słowa.
+
+    diacritics='polish' wybiera fragmenty zawierające polskie znaki,
+    diacritics='folded' - te same fragmenty złożone do ASCII.
+    """
+    queries = []
+    attempts = 0
+    while len(queries) < count and attempts < count * 200:
+        attempts += 1
+        text = rng.choice(texts).lower()
+        starts = [0] + [i + 1 for i, char in enumerate(text) if char == ' ']
+        start = rng.choice(starts)
+        query = text[start:start + length].strip()
+        if len(query) < length or (attempts < count * 100 and not POLISH_CHARS.intersection(query)):
+            continue
+        queries.append(query.translate(POLISH_FOLDING) if diacritics == 'folded' else query)
+    return queries
+
+
+def best_time(function, repeat):
+    """Najlepszy czas z `repeat` uruchomień (sekundy) i wynik ostatniego"""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def agreement(matrix, reference):
+    """Odsetek par z wartością identyczną jak w referencji"""
+    total = same = 0
+    for row, reference_row in zip(matrix, reference):
+        for value, expected in zip(row, reference_row):
+            total += 1
+            same += value == expected
+    return same / total if total else 1.0
+
+
+def bench_scorers(backends, bot, options):
+    """Czas na parę dla każdego scorera osobno: długość zapytania x polskie znaki"""
+    rows = []
+    rng = random.Random(1)
+    _, texts = corpus_texts(options.pair_corpus)
+    sorted_texts = [sorted_tokens(text.lower()) for text in texts]
+
+    for length in QUERY_LENGTHS:
+        for diacritics in ('polish', 'folded'):
+            queries = make_queries(texts, length, options.queries, random.Random(rng.random()), diacritics)
+            reference = {}
+            group = []
+            for backend in backends:
+                scorer = Scorer(backend, bot)
+                with backend_context(backend):
+                    for name in SCORERS:
+                        elapsed, matrix = best_time(
+                            lambda: scorer.scorer_matrix(name, queries, texts, sorted_texts), options.repeat
+                        )
+                        if backend == REFERENCE_BACKEND:
+                            reference[name] = matrix
+                        group.append({
+                            'backend': backend,
+                            'scorer': name,
+                            'query_length': length,
+                            'diacritics': diacritics,
+                            'corpus_size': len(texts),
+                            'pairs': len(queries) * len(texts),
+                            'ns_per_pair': round(elapsed / (len(queries) * len(texts)) * 1e9, 1),
+                            '_matrix': matrix
+                        })
+            for row in group:
+                matrix = row.pop('_matrix')
+                row['agreement'] = round(agreement(matrix, reference[row['scorer']]), 6) if reference else None
+            rows.extend(group)
+    return rows
+
+
+def bench_combined(backends, bot, options):
+    """calculate_match_score na całym korpusie: czas na zapytanie i identyczność rankingów"""
+    rows = []
+    for size in options.sizes:
+        _, texts = corpus_texts(size)
+        sorted_texts = [sorted_tokens(text.lower()) for text in texts]
+        rng = random.Random(size)
+        queries = []
+        for length in QUERY_LENGTHS[1:4]:
+            for diacritics in ('polish', 'folded'):
+                queries.extend(make_queries(texts, length, max(1, options.queries // 6), rng, diacritics))
+
+        reference_rankings = None
+        results = {}
+        for backend in backends:
+            scorer = Scorer(backend, bot)
+            with backend_context(backend):
+                elapsed, matrix = best_time(lambda: scorer.combined_matrix(queries, texts, sorted_texts), 1)
+            results[backend] = (elapsed, [ranking(row) for row in matrix], matrix)
+            if backend == REFERENCE_BACKEND:
+                reference_rankings, reference_matrix = results[backend][1], matrix
+
+        for backend, (elapsed, rankings, matrix) in results.items():
+            row = {
+                'backend': backend,
+                'corpus_size': len(texts),
+                'queries': len(queries),
+                'ms_per_query': round(elapsed / len(queries) * 1000, 3),
+                'us_per_pair': round(elapsed / (len(queries) * len(texts)) * 1e6, 3)
+            }
+            if reference_rankings is not None:
+                row['identical_rankings'] = sum(a == b for a, b in zip(rankings, reference_rankings))
+                row['score_agreement'] = round(agreement(matrix, reference_matrix), 6)
+            rows.append(row)
+    return rows
+
+
+def bench_search_suggestions(bot, options):
+    """GminaBot.search_suggestions (indeks + scoring wsadowy) bez cache"""
+    rows = []
+    for size in options.sizes:
+        catalog, _ = corpus_texts(size)
+        bot.search_database = catalog
+        index = bot.search_index
+        rng = random.Random(size)
+        for length in QUERY_LENGTHS:
+            for diacritics in ('polish', 'folded'):
+                timings = []
+                for section, context in SEARCH_CONTEXTS.items():
+                    texts = [entry.text for entry in index.sections[section]['entries']]
+                    for query in make_queries(texts, length, max(1, options.queries // 4), rng, diacritics):
+                        elapsed, _ = best_time(lambda: bot.search_suggestions(query, context), options.repeat)
+                        timings.append(elapsed)
+                if not timings:
+                    continue
+                timings.sort()
+                rows.append({
+                    'corpus_size': size,
+                    'query_length': length,
+                    'diacritics': diacritics,
+                    'queries': len(timings),
+                    'p50_ms': round(timings[len(timings) // 2] * 1000, 3),
+                    'max_ms': round(timings[-1] * 1000, 3),
+                    'mean_ms': round(sum(timings) / len(timings) * 1000, 3)
+                })
+    return rows
+
+
+def cheapest_identical(combined_rows, backends):
+    """Najtańszy backend z rankingami identycznymi z referencją dla wszystkich rozmiarów"""
+    totals = {}
+    for backend in backends:
+        rows = [row for row in combined_rows if row['backend'] == backend]
+        if rows and all(row.get('identical_rankings') == row['queries'] for row in rows):
+            totals[backend] = sum(row['ms_per_query'] for row in rows)
+    return min(totals, key=totals.get) if totals else None
+
+
+def print_tables(report):
+    print(f"\n{'backend':<24}{'scorer':<15}{'len':>5}{'diacr.':>8}{'ns/pair':>11}{'agree':>9}")
+    for row in report['scorers']:
+        print(f"{row['backend']:<24}{row['scorer']:<15}{row['query_length']:>5}{row['diacritics']:>8}"
+              f"{row['ns_per_pair']:>11}{row.get('agreement', ''):>9}")
+    print(f"\n{'backend':<24}{'corpus':>8}{'ms/query':>11}{'us/pair':>10}{'rankings':>10}{'agree':>9}")
+    for row in report['combined']:
+        rankings = f"{row.get('identical_rankings', '-')}/{row['queries']}"
+        print(f"{row['backend']:<24}{row['corpus_size']:>8}{row['ms_per_query']:>11}{row['us_per_pair']:>10}"
+              f"{rankings:>10}{row.get('score_agreement', ''):>9}")
+    print(f"\n{'search_suggestions':<24}{'corpus':>8}{'len':>5}{'diacr.':>8}{'p50 ms':>10}{'max ms':>10}")
+    for row in report['search_suggestions']:
+        print(f"{'':<24}{row['corpus_size']:>8}{row['query_length']:>5}{row['diacritics']:>8}"
+              f"{row['p50_ms']:>10}{row['max_ms']:>10}")
+    print(f"\nNajtańszy backend z identycznymi rankingami: {report['summary']['cheapest_identical_backend']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Mikrobenchmark calculate_match_score i search_suggestions')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(CORPUS_SIZES),
+                        help='rozmiary korpusu dla wyniku łącznego i search_suggestions')
+    parser.add_argument('--pair-corpus', type=int, default=300, help='rozmiar korpusu dla pomiaru scorerów')
+    parser.add_argument('--queries', type=int, default=12, help='zapytania na wariant')
+    parser.add_argument('--repeat', type=int, default=3, help='powtórzenia (liczy się najlepszy czas)')
+    parser.add_argument('--skip-search', action='store_true', help='pomiń pomiar search_suggestions')
+    parser.add_argument('--json', action='store_true', help='wypisz raport JSON na stdout zamiast tabel')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    backends = [backend for backend in options.backends if backend_available(backend)]
+    if REFERENCE_BACKEND not in backends and backend_available(REFERENCE_BACKEND):
+        backends.insert(0, REFERENCE_BACKEND)  # referencja potrzebna do porównania rankingów
+    else:
+        backends.sort(key=lambda backend: backend != REFERENCE_BACKEND)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from gmina_bot import GminaBot
+        bot = GminaBot()
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'reference_backend': REFERENCE_BACKEND,
+                'skipped_backends': sorted(set(options.backends) - set(backends)),
+                'options': {key: value for key, value in vars(options).items() if key not in ('json', 'output')}
+            },
+            'scorers': bench_scorers(backends, bot, options),
+            'combined': bench_combined(backends, bot, options),
+            'search_suggestions': [] if options.skip_search else bench_search_suggestions(bot, options)
+        }
+    report['summary'] = {'cheapest_identical_backend': cheapest_identical(report['combined'], backends)}
+
+    if options.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        return 0
+
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_tables(report)
+    print(f"\n[BENCH] Raport zapisany: {options.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""shard_scoring.py - Benchmark scoringu w shardach (ShardPool) vs. jeden proces
+
+Mierzy opóźnienie pojedynczego search_suggestions (bez cache) dla
+rosnących katalogów: w procesie żądania oraz przez ShardPool z różną
+liczbą shardów. Zapytania to prefiksy fraz wpisywanych przez mieszkańców
+(jak w load_test), w kontekstach contacts/forms/problems.
+
+Raport podaje p50/p95 per (rozmiar, liczba shardów), zgodność rankingów
+z jednym procesem oraz punkt przecięcia: najmniejszy zmierzony katalog,
+od którego p50 w shardach jest niższe niż w jednym procesie (także dla
+wszystkich większych). Poniżej tego rozmiaru przeważa stały narzut IPC;
+położenie punktu zależy od liczby wolnych rdzeni - próg ShardPool
+(GMINA_SHARD_MIN_ENTRIES) warto ustawić według wyniku na docelowej maszynie.
+
+Użycie:
+    python -m benchmarks.shard_scoring
+    python -m benchmarks.shard_scoring --sizes 10000 50000 100000 --shards 2 4
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.load_test import percentile  # noqa: E402
+from benchmarks.synthetic import keystroke_stream, search_phrases, synthetic_catalog  # noqa: E402
+
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, 'shard_scoring.json')
+
+
+def make_queries(catalog, count):
+    """Prefiksy fraz (co drugi znak od 3.) - (kontekst, zapytanie)"""
+    queries = []
+    for context, phrase in search_phrases(catalog, count):
+        queries.extend((context, prefix) for prefix in keystroke_stream(phrase, min_length=3)[::2])
+    return queries
+
+
+def wait_ready(pool, index, timeout):
+    """Instaluje shardy katalogu i czeka, aż workery je zbudują"""
+    deadline = time.monotonic() + timeout
+    started = time.perf_counter()
+    while pool.top_matches(index, 'start', ('forms',), 1) is None:
+        if time.monotonic() > deadline:
+            raise TimeoutError('shardy nie zostały zainstalowane')
+        time.sleep(0.05)
+    return time.perf_counter() - started
+
+
+def measure(bot, queries, repeat):
+    """Czasy search_suggestions [ms] i wyniki (do porównania rankingów)"""
+    latencies = []
+    results = []
+    for _ in range(repeat):
+        results = []
+        for context, query in queries:
+            started = time.perf_counter()
+            suggestions = bot.search_suggestions(query, context)
+            latencies.append((time.perf_counter() - started) * 1000)
+            results.append([(suggestion.id, suggestion.score) for suggestion in suggestions])
+    latencies.sort()
+    return latencies, results
+
+
+def bench_size(bot, size, options):
+    from gmina_bot import ShardSearcher
+    from shard_pool import ShardPool
+
+    catalog = synthetic_catalog(size)
+    bot.search_database = catalog
+    queries = make_queries(catalog, options.phrases)
+
+    bot.shard_pool = None
+    latencies, reference = measure(bot, queries, options.repeat)
+    rows = [{
+        'size': size, 'shards': 1, 'queries': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'install_s': None, 'identical_rankings': True
+    }]
+
+    for shards in options.shards:
+        pool = ShardPool(ShardSearcher, shards=shards, min_entries=0, timeout=options.timeout)
+        try:
+            install = wait_ready(pool, bot.search_index, options.timeout * 10)
+            bot.shard_pool = pool
+            latencies, results = measure(bot, queries, options.repeat)
+        finally:
+            bot.shard_pool = None
+            pool.close()
+        rows.append({
+            'size': size, 'shards': shards, 'queries': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'install_s': round(install, 3), 'identical_rankings': results == reference
+        })
+    return rows
+
+
+def crossover(rows):
+    """Liczba shardów -> najmniejszy rozmiar katalogu, od którego p50 shardów < p50 jednego procesu"""
+    single = {row['size']: row['p50_ms'] for row in rows if row['shards'] == 1}
+    points = {}
+    for shards in sorted({row['shards'] for row in rows} - {1}):
+        faster = sorted(
+            row['size'] for row in rows
+            if row['shards'] == shards and row['p50_ms'] < single[row['size']]
+        )
+        # Przecięcie tylko, jeśli shardy wygrywają też dla wszystkich większych katalogów
+        sizes = sorted(single)
+        point = None
+        for size in reversed(sizes):
+            if size not in faster:
+                break
+            point = size
+        points[str(shards)] = point
+    return points
+
+
+def print_table(report):
+    print(f"{'rozmiar':>9} {'shardy':>6} {'p50 ms':>9} {'p95 ms':>9} {'instalacja s':>12} {'ranking':>8}")
+    for row in report['results']:
+        install = '-' if row['install_s'] is None else f"{row['install_s']:.2f}"
+        print(f"{row['size']:>9} {row['shards']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+              f"{install:>12} {'OK' if row['identical_rankings'] else 'RÓŻNY':>8}")
+    print(f"\nPunkt przecięcia (rozmiar katalogu): {report['crossover']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark scoringu w shardach (ShardPool) vs. jeden proces')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 50000, 100000])
+    parser.add_argument('--shards', nargs='+', type=int, default=[2, 4], help='liczby shardów (>= 2)')
+    parser.add_argument('--phrases', type=int, default=20, help='liczba fraz (zapytania to ich prefiksy)')
+    parser.add_argument('--repeat', type=int, default=2, help='powtórzenia zestawu zapytań')
+    parser.add_argument('--timeout', type=float, default=30, help='timeout odpowiedzi shardu [s]')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    rows = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from gmina_bot import GminaBot
+        bot = GminaBot()
+    for size in options.sizes:
+        print(f"[BENCH] katalog {size} wpisów ...", flush=True)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            rows.extend(bench_size(bot, size, options))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': {key: value for key, value in vars(options).items() if key != 'output'}
+        },
+        'results': rows,
+        'crossover': crossover(rows)
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_table(report)
+    print(f"\n[BENCH] Raport zapisany: {options.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""synthetic.py - Syntetyczne katalogi gmin i strumienie wpisywania do benchmarków"""
+import json
+import os
+import random
+
+FIRST_NAMES = [
+    'Jan', 'Anna', 'Piotr', 'Maria', 'Tomasz', 'Ewa', 'Krzysztof', 'Magdalena', 'Robert', 'Agnieszka',
+    'Paweł', 'Joanna', 'Stanisław', 'Katarzyna', 'Marek', 'Beata', 'Andrzej', 'Alicja', 'Rafał', 'Dorota',
+    'Łukasz', 'Małgorzata', 'Grzegorz', 'Zofia', 'Michał', 'Jadwiga', 'Wojciech', 'Bożena', 'Józef', 'Halina'
+]
+LAST_NAMES = [
+    'Kowalski', 'Nowak', 'Wiśniewski', 'Zielińska', 'Kamiński', 'Lewandowska', 'Wójcik', 'Kozłowska',
+    'Jankowski', 'Mazur', 'Krawczyk', 'Piotrowska', 'Dąbrowski', 'Szymańska', 'Pawłowski', 'Michalska',
+    'Nowakowski', 'Wróblewska', 'Kaczmarek', 'Grabowska', 'Żak', 'Sikora', 'Baran', 'Ostrowska', 'Ślusarczyk'
+]
+POSITIONS = [
+    'Inspektor ds. Budownictwa', 'Kierownik Referatu Podatkowego', 'Podinspektor ds. Ochrony Środowiska',
+    'Specjalista ds. Funduszy UE', 'Inspektor ds. Zamówień Publicznych', 'Kierownik USC', 'Radca Prawny',
+    'Inspektor ds. Gospodarki Komunalnej', 'Geodeta Gminny', 'Informatyk', 'Sekretarz Gminy', 'Skarbnik Gminy'
+]
+DEPARTMENTS = [
+    'Sekretariat', 'Finanse', 'Architektura', 'Ochrona Środowiska', 'Gospodarka Komunalna', 'Pomoc Społeczna',
+    'Rozwój i Inwestycje', 'Obsługa Prawna', 'Oświata', 'Ewidencja Ludności', 'Geodezja', 'Straż Gminna'
+]
+FORM_VERBS = ['Wniosek o', 'Zgłoszenie', 'Deklaracja', 'Informacja o', 'Skarga na', 'Wniosek o wydanie']
+FORM_OBJECTS = [
+    'pozwolenie na budowę', 'wycinkę drzew', 'dodatek mieszkaniowy', 'zajęcie pasa drogowego',
+    'podatek od nieruchomości', 'gospodarowanie odpadami', 'zaświadczenie o niezaleganiu', 'dowód osobisty',
+    'zasiłek rodzinny', 'Kartę Dużej Rodziny', 'wymianę pieca', 'imprezę masową', 'informację publiczną',
+    'wpis do ewidencji działalności', 'akt małżeństwa', 'numer porządkowy', 'wypis z planu miejscowego'
+]
+CATEGORIES = ['odpady', 'budownictwo', 'srodowisko', 'podatki', 'dzialalnosc', 'drogi', 'usc', 'pomoc', 'inne']
+PROBLEM_KINDS = [
+    'Dziura w drodze', 'Nieodebrane śmieci', 'Awaria oświetlenia', 'Przepełniony kontener',
+    'Uszkodzony chodnik', 'Nielegalne wysypisko', 'Hałas z budowy', 'Wyciek wody', 'Niebezpieczne drzewo',
+    'Zapchana studzienka', 'Graffiti', 'Uszkodzona wiata przystankowa', 'Bezpańskie zwierzęta'
+]
+STREETS = ['Głównej', 'Polnej', 'Leśnej', 'Słonecznej', 'Krótkiej', 'Szkolnej', 'Ogrodowej', 'Łąkowej']
+
+# Rozmiary katalogów używane domyślnie przez benchmarki
+CATALOG_SIZES = (100, 10000, 100000)
+
+
+def synthetic_catalog(size, seed=42):
+    """
+    Buduje katalog w formacie data/catalogs/default.json z `size` wpisami łącznie.
+
+    Proporcje sekcji odpowiadają katalogowi domyślnemu: ~30% osób,
+    ~10% wydziałów, ~35% formularzy i ~25% problemów.
+    """
+    rng = random.Random(seed)
+    persons_count = max(1, size * 30 // 100)
+    departments_count = max(1, size * 10 // 100)
+    forms_count = max(1, size * 35 // 100)
+    problems_count = max(1, size - persons_count - departments_count - forms_count)
+
+    persons = []
+    for i in range(persons_count):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        persons.append({
+            'name': name,
+            'position': rng.choice(POSITIONS),
+            'phone': f'+48 123 {i // 1000:03d} {i % 1000:03d}',
+            'email': f'osoba{i}@gmina.pl',
+            'department': rng.choice(DEPARTMENTS)
+        })
+
+    departments = [{
+        'name': f'Referat {rng.choice(DEPARTMENTS)} {i}',
+        'phone': f'+48 124 {i // 1000:03d} {i % 1000:03d}',
+        'email': f'wydzial{i}@gmina.pl',
+        'hours': 'Pon-Pt: 8:00-16:00'
+    } for i in range(departments_count)]
+
+    forms = [{
+        'name': f'{rng.choice(FORM_VERBS)} {rng.choice(FORM_OBJECTS)}',
+        'category': rng.choice(CATEGORIES),
+        'code': f'F{i}-1',
+        'online': rng.random() < 0.6
+    } for i in range(forms_count)]
+
+    problems = [
+        f'{rng.choice(PROBLEM_KINDS)} przy ul. {rng.choice(STREETS)} {i}'
+        for i in range(problems_count)
+    ]
+
+    return {
+        'version': 1,
+        'contacts': {'persons': persons, 'departments': departments},
+        'forms': forms,
+        'problems': problems
+    }
+
+
+def write_catalog_dir(directory, size, seed=42):
+    """Zapisuje syntetyczny katalog domyślny do katalogu (dla GMINA_CATALOG_DIR)"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'default.json'), 'w', encoding='utf-8') as f:
+        json.dump(synthetic_catalog(size, seed), f, ensure_ascii=False)
+    return directory
+
+
+def keystroke_stream(phrase, min_length=2):
+    """Kolejne prefiksy wysyłane przez wyszukiwanie predykcyjne: 'po', 'pod', 'pode', ..."""
+    return [phrase[:length] for length in range(min_length, len(phrase) + 1)]
+
+
+def debounced_stream(phrase, rng, debounce=0.3, min_length=2):
+    """
+    Prefiksy, które faktycznie wysyła frontend (static/script.js, debounce 300 ms).
+
+    Odstępy między klawiszami losowane są z rozkładu log-normalnego (mediana
+    ~150 ms); zapytanie idzie tylko po pauzie dłuższej niż debounce oraz po
+    ostatnim znaku.
+    """
+    stream = []
+    for length in range(min_length, len(phrase) + 1):
+        pause = rng.lognormvariate(-1.9, 0.6)
+        if length == len(phrase) or pause >= debounce:
+            stream.append(phrase[:length])
+    return stream
+
+
+def search_phrases(catalog, count, seed=7):
+    """
+    Frazy wpisywane przez mieszkańców: fragmenty nazw z katalogu (z i bez
+    polskich znaków) oraz frazy spoza katalogu, które kończą się pustym wynikiem.
+    """
+    rng = random.Random(seed)
+    sources = {
+        'contacts': [person['name'] for person in catalog['contacts']['persons']] +
+                    [department['name'] for department in catalog['contacts']['departments']],
+        'forms': [form['name'] for form in catalog['forms']],
+        'problems': list(catalog['problems'])
+    }
+    folding = str.maketrans('ąćęłńóśźżĄĆĘŁŃÓŚŹŻ', 'acelnoszzACELNOSZZ')
+    misses = ['xqzw', 'asdfgh', 'qwerty uiop', 'zzzz yyy']
+
+    phrases = []
+    for _ in range(count):
+        context = rng.choice(tuple(sources))
+        roll = rng.random()
+        if roll < 0.1:
+            phrases.append((context, rng.choice(misses)))
+            continue
+        words = rng.choice(sources[context]).split()
+        phrase = ' '.join(words[:rng.randint(1, min(3, len(words)))])
+        if roll < 0.4:
+            phrase = phrase.translate(folding)
+        phrases.append((context, phrase.lower()))
+    return phrases
@@ -0,0 +1,138 @@
+"""teryt_lookup.py - Mikrobenchmark wyszukiwania gmin w rejestrze TERYT
+
+Mierzy czas budowy indeksów i TerytRegistry.search dla zapytań typu
+typeahead (prefiksy nazw), pełnych nazw oraz nazw z jedną i dwiema
+literówkami - osobno dla backendu RapidFuzz i czystego Pythona (trie + DP),
+wraz ze zgodnością wyników obu backendów.
+
+Bez --path rejestr ma rozmiar krajowy (--synthetic, domyślnie 2477 gmin)
+z syntetycznych nazw; pełny wykaz urzędowy można podać plikiem TERC.
+
+Użycie:
+    python -m benchmarks.teryt_lookup
+    python -m benchmarks.teryt_lookup --path TERC_Urzedowy_2024-01-01.csv
+    python -m benchmarks.teryt_lookup --json > wynik.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import teryt_registry  # noqa: E402
+from teryt_registry import Municipality, TerytRegistry  # noqa: E402
+
+SYLLABLES = ['ko', 'wa', 'sz', 'rz', 'na', 'ki', 'po', 'le', 'mi', 'ow', 'ice', 'ów', 'dz', 'ba', 'ra',
+             'go', 'ny', 'ta', 'la', 'sk', 'ch', 'ło', 'źr', 'dę', 'bi']
+SUFFIXES = ['Wielki', 'Mały', 'Górny', 'Dolny', 'Wielkopolski', 'Śląski', 'Kościelny', 'Lubelski']
+PREFIX_LENGTHS = (2, 3, 4, 6, 9)
+
+
+def synthetic_registry(count, seed):
+    """Rejestr `count` gmin o nazwach podobnych do polskich (część z drugim członem)"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))).capitalize()
+        if rng.random() < 0.2:
+            name += ' ' + rng.choice(SUFFIXES)
+        names.add(name)
+    return TerytRegistry(
+        Municipality(f'{index:07d}', name, 'gmina wiejska', 'mazowieckie', 'powiat', None)
+        for index, name in enumerate(sorted(names))
+    )
+
+
+def _typo(rng, key):
+    position = rng.randrange(1, len(key))
+    return key[:position] + 'q' + key[position + 1:]
+
+
+def query_sets(registry, sample, seed):
+    rng = random.Random(seed)
+    entries = rng.sample(registry.entries, min(sample, len(registry.entries)))
+    keys = [entry.key for entry in entries]
+    return {
+        'prefix': [key[:length] for key in keys for length in PREFIX_LENGTHS if len(key) > length],
+        'exact': [entry.name for entry in entries],
+        'typo1': [_typo(rng, key) for key in keys if len(key) >= 4],
+        'typo2': [_typo(rng, _typo(rng, key)) for key in keys if len(key) >= 8],
+    }
+
+
+def measure(registry, queries, limit):
+    timings = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        matches = registry.search(query, limit)
+        timings.append(time.perf_counter() - started)
+        results.append([(entry.teryt, match_class, distance) for entry, match_class, distance in matches])
+    timings.sort()
+    return {
+        'queries': len(queries),
+        'p50_us': round(timings[len(timings) // 2] * 1e6, 1),
+        'p99_us': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6, 1),
+        'max_us': round(timings[-1] * 1e6, 1),
+        'found': sum(1 for matches in results if matches),
+    }, results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark wyszukiwania gmin w rejestrze TERYT')
+    parser.add_argument('--path', help='plik TERC (domyślnie rejestr syntetyczny)')
+    parser.add_argument('--synthetic', type=int, default=2477, help='liczba gmin rejestru syntetycznego')
+    parser.add_argument('--sample', type=int, default=500, help='liczba gmin, z których budowane są zapytania')
+    parser.add_argument('--limit', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    started = time.perf_counter()
+    if options.path:
+        registry = TerytRegistry.from_file(options.path)
+    else:
+        registry = synthetic_registry(options.synthetic, options.seed)
+    report = {
+        'gminas': len(registry),
+        'build_ms': round((time.perf_counter() - started) * 1e3, 1),
+        'backends': {}
+    }
+
+    queries = query_sets(registry, options.sample, options.seed)
+    rapidfuzz = teryt_registry.rf_process
+    results = {}
+    for backend in ('rapidfuzz', 'python'):
+        if backend == 'rapidfuzz' and rapidfuzz is None:
+            continue
+        teryt_registry.rf_process = rapidfuzz if backend == 'rapidfuzz' else None
+        report['backends'][backend] = {}
+        for name, batch in queries.items():
+            report['backends'][backend][name], results[backend, name] = measure(registry, batch, options.limit)
+    teryt_registry.rf_process = rapidfuzz
+    if len(report['backends']) == 2:
+        report['backends_agree'] = all(results['rapidfuzz', name] == results['python', name] for name in queries)
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"Rejestr: {report['gminas']} gmin, budowa indeksów {report['build_ms']} ms")
+    for backend, rows in report['backends'].items():
+        for name, row in rows.items():
+            print(f"{backend:10} {name:7} n={row['queries']:5} p50={row['p50_us']:8.1f} µs "
+                  f"p99={row['p99_us']:8.1f} µs max={row['max_us']:8.1f} µs znalezione={row['found']}")
+    if 'backends_agree' in report:
+        print(f"Wyniki backendów zgodne: {report['backends_agree']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
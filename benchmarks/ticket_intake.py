@@ -0,0 +1,147 @@
+"""ticket_intake.py - Benchmark przyjmowania zgłoszeń w nawale (TicketStore)
+
+Symuluje nawał zgłoszeń (np. szkody po burzy): kilka procesów (jak workery
+gunicorna) po kilka wątków, każdy wątek rejestruje zgłoszenia jedno po
+drugim do wspólnego pliku SQLite. Porównuje group commit (domyślny
+max_batch) z zatwierdzaniem każdego zgłoszenia osobno (max_batch=1).
+
+Raport: przepustowość, p50/p95/p99 czasu create(), liczba paczek
+i unikalność numerów zgłoszeń we wszystkich procesach.
+
+Użycie:
+    python -m benchmarks.ticket_intake
+    python -m benchmarks.ticket_intake --processes 4 --threads 16 --tickets 200
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.load_test import percentile  # noqa: E402
+from ticket_store import TicketStore  # noqa: E402
+
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, 'ticket_intake.json')
+
+DESCRIPTIONS = (
+    'Drzewo przewróciło się na drogę', 'Zerwana linia energetyczna', 'Zalana piwnica po ulewie',
+    'Uszkodzony dach szkoły', 'Nieprzejezdna droga gminna', 'Połamane gałęzie na chodniku',
+)
+
+
+def worker(path, max_batch, threads, tickets, start_at, results):
+    """Proces: `threads` wątków rejestruje po `tickets` zgłoszeń"""
+    store = TicketStore(path, max_batch=max_batch)
+    latencies = []
+    ids = []
+    lock = threading.Lock()
+
+    def resident(number):
+        own_latencies = []
+        own_ids = []
+        for index in range(tickets):
+            started = time.perf_counter()
+            ticket = store.create(DESCRIPTIONS[(number + index) % len(DESCRIPTIONS)], 'Drogi', gmina='Testowo')
+            own_latencies.append((time.perf_counter() - started) * 1000)
+            own_ids.append(ticket['id'])
+        with lock:
+            latencies.extend(own_latencies)
+            ids.extend(own_ids)
+
+    # Wszystkie procesy startują jednocześnie - nawał, nie rozruch
+    time.sleep(max(0.0, start_at - time.time()))
+    pool = [threading.Thread(target=resident, args=(number,)) for number in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put({'latencies': latencies, 'ids': ids, 'batches': store.batches})
+
+
+def run(path, max_batch, options):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start_at = time.time() + 2.0
+    processes = [
+        context.Process(target=worker, args=(path, max_batch, options.threads, options.tickets, start_at, results))
+        for _ in range(options.processes)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    elapsed = time.time() - start_at
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for result in collected for latency in result['latencies'])
+    ids = [ticket_id for result in collected for ticket_id in result['ids']]
+    with sqlite3.connect(path) as connection:
+        stored = connection.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]
+    batches = sum(result['batches'] for result in collected)
+    return {
+        'max_batch': max_batch,
+        'tickets': len(ids),
+        'stored': stored,
+        'unique_ids': len(set(ids)) == len(ids),
+        'throughput_tps': round(len(ids) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'batches': batches,
+        'avg_batch': round(len(ids) / batches, 2) if batches else None
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark przyjmowania zgłoszeń w nawale (TicketStore)')
+    parser.add_argument('--processes', type=int, default=2, help='procesy (jak workery gunicorna)')
+    parser.add_argument('--threads', type=int, default=8, help='wątki na proces')
+    parser.add_argument('--tickets', type=int, default=100, help='zgłoszenia na wątek')
+    parser.add_argument('--max-batch', nargs='+', type=int, default=[500, 1],
+                        help='rozmiary paczki group commit (1 = commit na zgłoszenie)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': {key: value for key, value in vars(options).items() if key != 'output'}
+        },
+        'results': []
+    }
+    with tempfile.TemporaryDirectory(prefix='gmina-tickets-') as work_dir:
+        for max_batch in options.max_batch:
+            print(f"[BENCH] max_batch={max_batch}: {options.processes} procesy x {options.threads} wątków "
+                  f"x {options.tickets} zgłoszeń ...", flush=True)
+            result = run(os.path.join(work_dir, f'tickets-{max_batch}.sqlite3'), max_batch, options)
+            report['results'].append(result)
+            print(f"   {result['throughput_tps']} zgł./s, p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                  f"p99 {result['p99_ms']} ms, paczki {result['batches']} (śr. {result['avg_batch']}), "
+                  f"zapisane {result['stored']}/{result['tickets']}, numery unikalne: {result['unique_ids']}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n[BENCH] Raport zapisany: {options.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""catalog.py - Zewnętrzny katalog danych gmin z leniwym ładowaniem i hot-reloadem"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from types import MappingProxyType
+
+from search_index import SearchIndex
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'catalogs')
+
+# Nazwa pliku z katalogiem wspólnym dla gmin bez własnych danych
+DEFAULT_CATALOG = 'default'
+
+# Sekcje search_database, które gmina może nadpisać własnym plikiem
+SEARCH_SECTIONS = ('contacts', 'forms', 'problems')
+
+
+def catalog_slug(gmina_name):
+    """
+    Nazwa pliku katalogu dla gminy: 'Przykładowa Gmina' -> 'przykladowa-gmina'.
+
+    None dla nazw bez własnego katalogu - pustych po normalizacji i takich,
+    które wskazywałyby katalog wspólny ('Default' -> default.json).
+    """
+    text = unicodedata.normalize('NFKD', gmina_name.replace('ł', 'l').replace('Ł', 'L'))
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    slug = re.sub(r'[^a-z0-9]+', '-', text).strip('-')
+    if not slug or slug == DEFAULT_CATALOG:
+        return None
+    return slug
+
+
+def approx_size(obj, _seen=None):
+    """Przybliżony rozmiar obiektu w bajtach (rekurencyjnie po kontenerach)"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (dict, MappingProxyType)):
+        size += sum(approx_size(key, _seen) + approx_size(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, _seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(approx_size(getattr(obj, slot), _seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    elif hasattr(obj, '__dict__'):
+        size += approx_size(vars(obj), _seen)
+    return size
+
+
+class Catalog:
+    """Niezmienny po zbudowaniu katalog jednej gminy: dane, indeks wyszukiwania i metadane wersji"""
+
+    def __init__(self, name, data, base=None, path=None, mtime=None):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.data_version = data.get('version')
+        self.basic_info = data.get('basic_info')
+        self.shared_basic_info = MappingProxyType(self.basic_info) if self.basic_info else None
+        self.base_version = base.index.version if base else None
+
+        if base is not None and not any(section in data for section in SEARCH_SECTIONS):
+            # Gmina bez własnych danych wyszukiwania współdzieli bazę i indeks katalogu domyślnego
+            self.search_database = base.search_database
+            self.index = base.index
+            self.shared_tables = base.shared_tables
+            self.approx_bytes = approx_size(data)
+            return
+
+        self.search_database = {
+            section: data[section] if section in data else base.search_database[section]
+            for section in SEARCH_SECTIONS
+        }
+        self.index = SearchIndex(self.search_database)
+        # Niemutowalne tabele wydziałów i formularzy współdzielone przez rejestr gmin
+        self.shared_tables = (
+            tuple(MappingProxyType(department) for department in self.search_database['contacts']['departments']),
+            tuple(MappingProxyType(form) for form in self.search_database['forms'])
+        )
+        self.approx_bytes = approx_size(self.search_database) + approx_size(self.index.sections)
+
+    @property
+    def version(self):
+        """Wersja danych i indeksu - zmienia się przy każdym przeładowaniu"""
+        return self.index.version
+
+
+class CatalogStore:
+    """
+    Leniwie ładowany, ograniczony pamięciowo cache katalogów gmin.
+
+    Katalog gminy ładowany jest z pliku <slug>.json lub <slug>.msgpack przy
+    pierwszym użyciu; gminy bez pliku korzystają z katalogu domyślnego.
+    Wpisy wypadają w kolejności LRU po przekroczeniu max_catalogs lub
+    max_bytes. Co check_interval sekund sprawdzany jest mtime pliku - nowy
+    katalog (dane + indeks) budowany jest w całości poza blokadą przez
+    jeden wątek, a pozostałe do czasu podmiany referencji dostają poprzednią
+    wersję; w razie błędu w pliku zostaje poprzednia wersja.
+    """
+
+    def __init__(self, directory=None, max_catalogs=64, max_bytes=256 * 1024 * 1024, check_interval=2.0):
+        self.directory = directory or os.getenv('GMINA_CATALOG_DIR', DEFAULT_CATALOG_DIR)
+        self.max_catalogs = max_catalogs
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self._catalogs = OrderedDict()
+        self._checked_at = {}
+        # Ograniczona pamięć gmin bez własnego pliku (bez stat() przy każdym żądaniu)
+        self._missing = OrderedDict()
+        self.max_missing = max_catalogs * 16
+        self._default = None
+        self._lock = threading.RLock()
+        # Katalogi budowane w tej chwili (klucz -> Event) - jeden wątek na katalog
+        self._loading = {}
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _find_file(self, slug):
+        for extension in ('.json', '.msgpack'):
+            path = os.path.join(self.directory, slug + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _read(path):
+        if path.endswith('.msgpack'):
+            if msgpack is None:
+                raise ImportError('msgpack nie jest zainstalowany')
+            with open(path, 'rb') as f:
+                return msgpack.unpackb(f.read(), raw=False)
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _load(self, name, path, base):
+        mtime = os.path.getmtime(path)
+        return Catalog(name, self._read(path), base=base, path=path, mtime=mtime)
+
+    def _is_stale(self, key, catalog, now):
+        """Sprawdza (nie częściej niż co check_interval) czy plik katalogu się zmienił"""
+        if catalog.path is None:
+            # Katalog z install() - nie ma pliku do obserwowania
+            return False
+        if self._checked_at.get(key, 0) + self.check_interval > now:
+            return False
+        self._checked_at[key] = now
+        try:
+            return os.path.getmtime(catalog.path) != catalog.mtime
+        except OSError:
+            return False
+
+    def _claim_load(self, key):
+        """
+        Pod blokadą: None, gdy wątek ma budować katalog `key` sam, albo
+        Event wątku, który już go buduje.
+        """
+        pending = self._loading.get(key)
+        if pending is None:
+            self._loading[key] = threading.Event()
+        return pending
+
+    def _finish_load(self, key):
+        with self._lock:
+            self._loading.pop(key).set()
+
+    def default(self):
+        """Katalog domyślny (ładowany przy pierwszym użyciu, przeładowywany po zmianie pliku)"""
+        now = time.monotonic()
+        catalog = self._default
+        if catalog is not None and not self._is_stale(DEFAULT_CATALOG, catalog, now):
+            return catalog
+
+        while True:
+            with self._lock:
+                pending = self._claim_load(DEFAULT_CATALOG)
+            if pending is None:
+                break
+            # Inny wątek buduje nową wersję - do czasu podmiany obowiązuje bieżąca
+            if catalog is not None:
+                return catalog
+            pending.wait()
+            if self._default is not None:
+                return self._default
+
+        try:
+            path = self._find_file(DEFAULT_CATALOG)
+            if path is None:
+                raise FileNotFoundError(f'Brak katalogu domyślnego w {self.directory}')
+            # Odczyt pliku i budowa indeksu poza blokadą - inne gminy są obsługiwane bez czekania
+            try:
+                loaded = self._load(DEFAULT_CATALOG, path, None)
+            except Exception as e:
+                if catalog is None:
+                    raise
+                with self._lock:
+                    self.errors += 1
+                logger.error("[CATALOG] ❌ Błąd przeładowania %s: %s", path, e)
+                return self._default
+
+            with self._lock:
+                self.loads += 1
+                # install() w trakcie budowy ma pierwszeństwo przed wersją z pliku
+                if self._default is catalog:
+                    self._default = loaded
+                    if catalog is not None:
+                        self.reloads += 1
+                return self._default
+        finally:
+            self._finish_load(DEFAULT_CATALOG)
+
+    def get(self, gmina_name=None):
+        """Zwraca katalog gminy (lub domyślny, jeśli gmina nie ma własnego pliku)"""
+        base = self.default()
+        if not gmina_name:
+            return base
+
+        key = catalog_slug(gmina_name)
+        if key is None:
+            return base
+        now = time.monotonic()
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            if catalog is not None:
+                inherited_changed = (catalog.path is not None and catalog.base_version is not None
+                                     and catalog.base_version != base.index.version)
+                if not inherited_changed and not self._is_stale(key, catalog, now):
+                    self._catalogs.move_to_end(key)
+                    return catalog
+                path = catalog.path
+            else:
+                checked_at = self._missing.get(key)
+                if checked_at is not None and checked_at + self.check_interval > now:
+                    return base
+                path = self._find_file(key)
+                if path is None:
+                    self._missing[key] = now
+                    self._missing.move_to_end(key)
+                    while len(self._missing) > self.max_missing:
+                        self._missing.popitem(last=False)
+                    return base
+                self._missing.pop(key, None)
+            pending = self._claim_load(key)
+
+        if pending is not None:
+            # Katalog buduje inny wątek - bieżąca wersja, a przy pierwszym ładowaniu czekamy na tę gminę
+            if catalog is not None:
+                return catalog
+            pending.wait()
+            with self._lock:
+                return self._catalogs.get(key) or base
+
+        try:
+            # Odczyt pliku i budowa indeksu poza blokadą - podmiana referencji pod blokadą
+            try:
+                loaded = self._load(gmina_name, path, base)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.error("[CATALOG] ❌ Błąd ładowania %s: %s", path, e)
+                return catalog or base
+
+            with self._lock:
+                self.loads += 1
+                current = self._catalogs.get(key)
+                # install() w trakcie budowy ma pierwszeństwo przed wersją z pliku
+                if current is None or current is catalog:
+                    if catalog is not None:
+                        self.reloads += 1
+                    self._catalogs[key] = current = loaded
+                    self._catalogs.move_to_end(key)
+                    self._checked_at[key] = now
+                    self._evict()
+                return current
+        finally:
+            self._finish_load(key)
+
+    def install(self, gmina_name, data):
+        """Instaluje katalog z pamięci (bez pliku) - np. po podmianie search_database"""
+        with self._lock:
+            if not gmina_name:
+                self._default = Catalog(DEFAULT_CATALOG, data)
+                return self._default
+            key = catalog_slug(gmina_name)
+            if key is None:
+                raise ValueError(f'Nazwa gminy {gmina_name!r} nie może mieć własnego katalogu')
+            catalog = Catalog(gmina_name, data, base=self.default())
+            self._catalogs[key] = catalog
+            self._evict()
+            return catalog
+
+    def _evict(self):
+        total = sum(catalog.approx_bytes for catalog in self._catalogs.values())
+        while self._catalogs and (len(self._catalogs) > self.max_catalogs or total > self.max_bytes):
+            key, catalog = self._catalogs.popitem(last=False)
+            self._checked_at.pop(key, None)
+            total -= catalog.approx_bytes
+            self.evictions += 1
+
+    def stats(self):
+        """Liczniki i zajętość cache katalogów"""
+        with self._lock:
+            return {
+                'loaded': len(self._catalogs),
+                'max_catalogs': self.max_catalogs,
+                'approx_bytes': sum(catalog.approx_bytes for catalog in self._catalogs.values()),
+                'default_version': self._default.data_version if self._default else None,
+                'loads': self.loads,
+                'reloads': self.reloads,
+                'evictions': self.evictions,
+                'errors': self.errors
+            }
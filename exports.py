@@ -0,0 +1,254 @@
+"""exports.py - Strumieniowy eksport zgłoszeń i zapytań bez wyników (NDJSON/CSV, opcjonalnie gzip)
+
+Wiersze czytane są kursorem SQLite (fetchmany) i od razu kodowane do
+kawałków ~64 KB - pamięć nie zależy od liczby wierszy. Ten sam generator
+obsługuje endpoint /admin/export (app.py, asgi.py) i CLI.
+
+Użycie:
+    python exports.py tickets --since 2026-10-17 --until 2026-10-18 --format csv --gzip -o zgloszenia.csv.gz
+    python exports.py no_results --since 2026-10-17 > bez_wynikow.ndjson
+"""
+import argparse
+import csv
+import hmac
+import io
+import os
+import sqlite3
+import sys
+import zlib
+from datetime import datetime
+from urllib.parse import quote
+
+import msgspec
+
+from ticket_store import DEFAULT_TICKETS_PATH
+from search_analytics import DEFAULT_ANALYTICS_PATH
+
+FORMATS = ('ndjson', 'csv')
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+GZIP_MIMETYPE = 'application/gzip'
+
+# Wiersze pobierane z kursora naraz i docelowy rozmiar kawałka strumienia
+FETCH_ROWS = 1000
+CHUNK_BYTES = 64 * 1024
+
+# Zbiór -> (zapytanie, kolumny, zmienna środowiskowa pliku, plik domyślny).
+# Oba zapytania idą po indeksie created_at - bez sortowania całego wyniku.
+DATASETS = {
+    'tickets': (
+        'SELECT t.id, t.created_at, t.gmina, t.category, '
+        '(SELECT e.status FROM ticket_events e WHERE e.ticket_id = t.id ORDER BY e.id DESC LIMIT 1), '
+        't.source, t.description FROM tickets t '
+        'WHERE t.created_at >= ? AND t.created_at < ? ORDER BY t.created_at',
+        ('id', 'created_at', 'gmina', 'category', 'status', 'source', 'description'),
+        'GMINA_TICKETS_PATH', DEFAULT_TICKETS_PATH
+    ),
+    'no_results': (
+        'SELECT created_at, search_type, query FROM no_results '
+        'WHERE created_at >= ? AND created_at < ? ORDER BY created_at',
+        ('created_at', 'search_type', 'query'),
+        'GMINA_ANALYTICS_PATH', DEFAULT_ANALYTICS_PATH
+    ),
+}
+
+# Początki komórek, które arkusz kalkulacyjny wykonałby jako formułę (CSV injection)
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+_encoder = msgspec.json.Encoder()
+
+
+def dataset_path(dataset):
+    """Plik bazy zbioru (jak w TicketStore / NoResultsLog)"""
+    _, _, env_name, default = DATASETS[dataset]
+    return os.getenv(env_name) or default
+
+
+def parse_time(value):
+    """'2026-10-18' albo '2026-10-18T06:00' (czas lokalny) -> timestamp; None bez zmian"""
+    if value is None or value == '':
+        return None
+    return datetime.fromisoformat(value).timestamp()
+
+
+def admin_authorized(authorization):
+    """
+    Nagłówek Authorization: Bearer <GMINA_ADMIN_TOKEN>.
+
+    Bez ustawionego GMINA_ADMIN_TOKEN endpointy administracyjne są wyłączone
+    (eksport zawiera opisy zgłoszeń mieszkańców).
+    """
+    token = os.getenv('GMINA_ADMIN_TOKEN')
+    if not token or not authorization:
+        return False
+    scheme, _, value = authorization.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(value.strip().encode(), token.encode())
+
+
+def open_export(dataset, path=None):
+    """
+    Połączenie tylko do odczytu z bazą zbioru - własne dla eksportu.
+
+    Otwierane w trybie mode=ro: brak pliku to FileNotFoundError, a nie nowa
+    pusta baza. W trybie WAL nie blokuje zapisu nowych zgłoszeń; może być
+    używane kolejno przez różne wątki (pula ASGI).
+
+    Raises:
+        FileNotFoundError: baza zbioru jeszcze nie istnieje
+        sqlite3.Error: baza nie daje się otworzyć
+    """
+    path = os.path.abspath(path or dataset_path(dataset))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Brak bazy zbioru {dataset}: {path}')
+    connection = sqlite3.connect(f'file:{quote(path)}?mode=ro', uri=True, check_same_thread=False)
+    connection.execute('PRAGMA query_only=ON')
+    return connection
+
+
+def iter_rows(connection, dataset, since=None, until=None):
+    """Wiersze zbioru z zakresu [since, until) kursorem po stronie SQLite; na końcu zamyka połączenie"""
+    query = DATASETS[dataset][0]
+    try:
+        cursor = connection.execute(query, (
+            since if since is not None else float('-inf'),
+            until if until is not None else float('inf')
+        ))
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+    finally:
+        connection.close()
+
+
+def _format_row(row, columns):
+    # Czas zapisywany jest jako timestamp - w eksporcie czytelna data lokalna
+    return tuple(
+        datetime.fromtimestamp(value).isoformat(timespec='seconds') if column == 'created_at' else value
+        for column, value in zip(columns, row)
+    )
+
+
+def _ndjson_lines(rows, columns):
+    for row in rows:
+        yield _encoder.encode(dict(zip(columns, _format_row(row, columns)))) + b'\n'
+
+
+def _csv_cell(value):
+    # Opisy i frazy wpisują mieszkańcy - komórka zaczynająca się od '=' itp. trafia do arkusza jako tekst
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    # Nagłówek także dla pustego zakresu
+    yield line(columns)
+    for row in rows:
+        yield line([_csv_cell(value) for value in _format_row(row, columns)])
+
+
+def export_stream(dataset, fmt='ndjson', compress=False, since=None, until=None, path=None):
+    """
+    Kawałki eksportu (bajty) - stała pamięć niezależnie od liczby wierszy.
+
+    Baza otwierana jest od razu, więc brak pliku czy błąd otwarcia można
+    zamienić na 404/500 przed wysłaniem nagłówków; wiersze czytane są
+    dopiero przy pobieraniu kawałków.
+
+    Args:
+        dataset (str): 'tickets' albo 'no_results'
+        fmt (str): 'ndjson' albo 'csv' (z nagłówkiem)
+        compress (bool): gzip w locie (zlib, format pliku .gz)
+        since, until (float): zakres created_at [since, until) jako timestamp
+
+    Raises:
+        ValueError: nieznany zbiór lub format
+        FileNotFoundError, sqlite3.Error: jak open_export()
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f'Nieznany zbiór: {dataset}')
+    if fmt not in FORMATS:
+        raise ValueError(f'Nieznany format: {fmt}')
+    connection = open_export(dataset, path)
+    return _chunks(iter_rows(connection, dataset, since, until), DATASETS[dataset][1], fmt, compress)
+
+
+def _chunks(rows, columns, fmt, compress):
+    lines = _csv_lines(rows, columns) if fmt == 'csv' else _ndjson_lines(rows, columns)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            chunk = b''.join(pending)
+            pending, size = [], 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+    chunk = b''.join(pending)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export_filename(dataset, fmt, compress, since=None):
+    """Nazwa pliku do Content-Disposition, np. tickets-2026-10-18.csv.gz"""
+    day = datetime.fromtimestamp(since).strftime('%Y-%m-%d') if since is not None else 'all'
+    return f"{dataset}-{day}.{fmt}{'.gz' if compress else ''}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Eksport zgłoszeń i zapytań bez wyników (NDJSON/CSV)')
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--gzip', action='store_true', help='kompresja gzip w locie')
+    parser.add_argument('--since', help='od (włącznie), np. 2026-10-17 - czas lokalny')
+    parser.add_argument('--until', help='do (wyłącznie), np. 2026-10-18')
+    parser.add_argument('--path', help='plik bazy (domyślnie jak w aplikacji)')
+    parser.add_argument('-o', '--output', help='plik wynikowy (domyślnie stdout)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    try:
+        since, until = parse_time(options.since), parse_time(options.until)
+    except ValueError:
+        print('Nieprawidłowa data (oczekiwano RRRR-MM-DD)', file=sys.stderr)
+        return 2
+    try:
+        chunks = export_stream(options.dataset, options.format, options.gzip, since, until, options.path)
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f'Nie można otworzyć bazy: {e}', file=sys.stderr)
+        return 1
+    if options.output:
+        with open(options.output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+    else:
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""ga4_dispatcher.py - Asynchroniczna, wsadowa wysyłka eventów GA4 Measurement Protocol"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+GA4_ENDPOINT = 'https://www.google-analytics.com/mp/collect'
+
+# Measurement Protocol przyjmuje maksymalnie 25 eventów w jednym żądaniu
+MAX_EVENTS_PER_REQUEST = 25
+
+# Czas wysyłki jednej paczki (z ponowieniami) wg wyniku
+DISPATCH_SECONDS = REGISTRY.histogram(
+    'gmina_ga4_dispatch_seconds', 'Czas wysyłki paczki eventów GA4 (z ponowieniami)', ('outcome',)
+)
+
+
+class GA4Dispatcher:
+    """
+    Wysyła eventy GA4 w tle, nie blokując workera obsługującego żądanie.
+
+    submit() wrzuca event do ograniczonej kolejki i od razu wraca. Wątek
+    w tle grupuje eventy po client_id w paczki do 25 eventów na POST,
+    korzysta z jednej sesji HTTP z pulą połączeń i ponawia nieudane
+    wysyłki z wykładniczym backoffem. Gdy kolejka jest pełna, event jest
+    odrzucany i liczony w `dropped`.
+    """
+
+    def __init__(self, measurement_id, api_secret, endpoint=GA4_ENDPOINT, max_queue=10000,
+                 batch_size=MAX_EVENTS_PER_REQUEST, flush_interval=1.0, max_retries=3,
+                 backoff=0.5, timeout=5):
+        self.measurement_id = measurement_id
+        self.api_secret = api_secret
+        self.endpoint = endpoint
+        self.batch_size = min(batch_size, MAX_EVENTS_PER_REQUEST)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._http = None
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent_events = 0
+        self.sent_batches = 0
+        self.failed_batches = 0
+        self.failed_events = 0
+        self.retries = 0
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Tworzy dispatcher z GA4_MEASUREMENT_ID, GA4_API_SECRET i opcjonalnie GA4_ENDPOINT"""
+        dispatcher = cls(
+            os.getenv('GA4_MEASUREMENT_ID'),
+            os.getenv('GA4_API_SECRET'),
+            endpoint=os.getenv('GA4_ENDPOINT', GA4_ENDPOINT),
+            **kwargs
+        )
+        if not dispatcher.enabled:
+            # Raz przy starcie - wyłączony GA4 nie loguje niczego na ścieżce żądania
+            logger.warning("[GA4] ❌ Missing GA4 credentials. Set GA4_MEASUREMENT_ID and GA4_API_SECRET "
+                           "- eventy GA4 wyłączone")
+        return dispatcher
+
+    @property
+    def enabled(self):
+        """Czy są dane dostępowe GA4 i biblioteka requests"""
+        return bool(self.measurement_id and self.api_secret and requests is not None)
+
+    def _ensure_worker(self):
+        # Wątek startuje leniwie w procesie, który wysyła (np. po forku workera gunicorna)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._http = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            self._http.mount('https://', adapter)
+            self._http.mount('http://', adapter)
+            self._thread = threading.Thread(target=self._run, name='ga4-dispatcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, client_id, event):
+        """Dodaje event do kolejki. Zwraca False gdy dispatcher jest wyłączony lub kolejka pełna."""
+        if not self.enabled:
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((client_id, event))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def _next_batch(self):
+        """Czeka na pierwszy event, potem dobiera kolejne do batch_size lub flush_interval"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            # Jedno żądanie Measurement Protocol = jeden client_id
+            grouped = {}
+            for client_id, event in batch:
+                grouped.setdefault(client_id, []).append(event)
+            for client_id, events in grouped.items():
+                started = time.perf_counter()
+                sent = self._send(client_id, events)
+                DISPATCH_SECONDS.labels('sent' if sent else 'failed').observe(time.perf_counter() - started)
+
+            for _ in batch:
+                self._queue.task_done()
+
+    def _send(self, client_id, events):
+        """Wysyła jedną paczkę z ponawianiem (5xx, 429, błędy sieci)"""
+        params = {'measurement_id': self.measurement_id, 'api_secret': self.api_secret}
+        payload = {'client_id': client_id, 'events': events}
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            try:
+                response = self._http.post(self.endpoint, params=params, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                logger.warning("[GA4] 🚫 Network error sending batch: %s", e)
+                continue
+
+            if response.status_code in (200, 204):  # GA4 zwraca 204 przy sukcesie
+                self.sent_batches += 1
+                self.sent_events += len(events)
+                return True
+            if response.status_code != 429 and response.status_code < 500:
+                logger.warning("[GA4] ❌ Batch rejected. Status: %s", response.status_code)
+                break
+
+        self.failed_batches += 1
+        self.failed_events += len(events)
+        return False
+
+    def flush(self, timeout=10):
+        """Czeka aż kolejka zostanie opróżniona (np. w testach lub przy zamykaniu)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout=10):
+        """Wysyła zaległe eventy i zatrzymuje wątek w tle"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Liczniki do monitoringu"""
+        return {
+            'enabled': self.enabled,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'sent_events': self.sent_events,
+            'sent_batches': self.sent_batches,
+            'failed_batches': self.failed_batches,
+            'failed_events': self.failed_events,
+            'retries': self.retries
+        }
+
+
+class StubCollector:
+    """
+    Lokalny kolektor udający endpoint /mp/collect - do testów bez dostępu do sieci.
+
+    Użycie:
+        with StubCollector() as collector:
+            dispatcher = GA4Dispatcher('G-TEST', 'secret', endpoint=collector.url)
+            ...
+            collector.payloads  # odebrane paczki
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, status_code=204):
+        collector = self
+        self.payloads = []
+        self.status_code = status_code
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                collector.payloads.append(json.loads(self.rfile.read(length) or b'{}'))
+                self.send_response(collector.status_code)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/mp/collect'
+
+    @property
+    def events(self):
+        return [event for payload in self.payloads for event in payload.get('events', [])]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
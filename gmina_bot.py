@@ -1,17 +1,194 @@
 """gmina_bot.py - Silnik bota Adept dla Gmina-AI ENTERPRISE v3.0"""
+import hashlib
 import json
+import logging
 import os
 import re
-from flask import session
+import time
+from session_store import session, has_session
 from datetime import datetime
+import heapq
 import random
 from fuzzywuzzy import fuzz
+from search_index import MATCH_THRESHOLD, SearchIndex, fold
+from scoring import BatchScorer, sorted_tokens
+from search_cache import SearchCache
+from ga4_dispatcher import GA4Dispatcher
+from catalog import CatalogStore
+from gmina_registry import GminaRegistry, MAX_GMINA_NAME_LENGTH
+from keyword_classifier import KeywordClassifier
+from action_registry import ActionRegistry
+from schemas import BulkResult, Suggestion
+from shard_pool import ShardPool
+from metrics import REGISTRY
+from ticket_store import TicketStore, normalize_ticket_id
+from search_analytics import NoResultsAggregator, NoResultsLog
+from teryt_registry import EXACT, NATIONAL_GMINAS, TerytRegistry
+
+# Maksymalna liczba sugestii zwracanych przez search_suggestions
+SUGGESTION_LIMIT = 8
+# Liczba kandydatów scorowanych jednym wywołaniem BatchScorer
+SCORING_CHUNK = 64
+# Typy wyszukiwania zliczane dla zapytań bez wyników (inne jako 'general')
+NO_RESULTS_SEARCH_TYPES = ('contacts', 'forms', 'problems', 'general')
+# Limity paczki zgłoszeń (/gmina-bot/process-custom-batch)
+MAX_BULK_PROBLEMS = 5000
+MAX_PROBLEM_LENGTH = 2000
+
+logger = logging.getLogger(__name__)
+
+# Timery gorących ścieżek wyszukiwania (histogramy /metrics)
+SEARCH_SECONDS = REGISTRY.histogram(
+    'gmina_search_suggestions_seconds', 'Czas search_suggestions (bez cache) wg ścieżki scoringu', ('path',)
+)
+SCORING_SECONDS = REGISTRY.histogram(
+    'gmina_match_scoring_seconds', 'Czas scoringu jednej paczki kandydatów (calculate_match_score)', ('backend',)
+)
+SELECTION_SECONDS = REGISTRY.histogram(
+    'gmina_search_selection_seconds', 'Czas process_search_selection'
+)
+
+# Typ sugestii dla sekcji bazy
+SELECTION_TYPES = {'persons': 'person', 'departments': 'department', 'forms': 'form', 'problems': 'problem'}
+
+# Sekcje bazy przeszukiwane w danym kontekście (kolejność = kolejność przy remisach)
+SEARCH_SECTIONS = {
+    'contacts': ('persons', 'departments'),
+    'forms': ('forms',),
+    'problems': ('problems',)
+}
+
+
+class MatchRanking:
+    """
+    Scoring fuzzy i wybór top-k z indeksu wyszukiwania.
+
+    Wspólne dla GminaBot i ShardSearcher (proces roboczy ShardPool). Klasa
+    używająca ustawia batch_scorer (BatchScorer) i search_index (indeks
+    używany, gdy top_matches nie dostaje indeksu) - ścieżka scoringu nie
+    czyta innych atrybutów instancji.
+    """
 
+    def calculate_match_score(self, query, text):
+        """Oblicza wynik dopasowania używając fuzzy matching"""
+        # Konwersja do lowercase dla porównania
+        query_lower = query.lower().strip()
+        text_lower = text.lower()
+        return self.match_score_keys(query_lower, sorted_tokens(query_lower), text_lower, sorted_tokens(text_lower))
+
+    def match_score_keys(self, query, sorted_query, text, sorted_text):
+        """
+        calculate_match_score na gotowych kluczach (lowercase i posortowane tokeny).
+
+        token_sort_ratio i token_set_ratio z fuzzywuzzy same robią full_process
+        i sortowanie - na kluczach z indeksu liczymy je bezpośrednio.
+        """
+        # Różne typy dopasowania z wagami
+        ratio = fuzz.ratio(query, text)  # Podstawowe podobieństwo
+        partial_ratio = fuzz.partial_ratio(query, text)  # Częściowe dopasowanie
+        token_sort = fuzz.ratio(sorted_query, sorted_text)  # Sortowanie tokenów
+        token_set = fuzz.token_set_ratio(sorted_query, sorted_text)  # Zbiór tokenów
+        
+        # Weighted average z preferencją dla partial_ratio (najlepsze dla wyszukiwania)
+        weighted_score = (
+            ratio * 0.2 +
+            partial_ratio * 0.4 +
+            token_sort * 0.2 +
+            token_set * 0.2
+        )
+        
+        return int(weighted_score)
+
+    def _score_entries(self, query, sorted_query, entries, folded=False):
+        """Zwraca wyniki dopasowania dla listy wpisów z indeksu (0 = poniżej progu)"""
+        keys = [entry.keys(folded) for entry in entries]
+        if self.batch_scorer.available:
+            # Jeden wsadowy scoring dla całej paczki kandydatów, na kluczach z indeksu
+            with SCORING_SECONDS.labels('batch').time():
+                return [int(score) for score in self.batch_scorer.score_keys(
+                    [query],
+                    [sorted_query],
+                    [key.text for key in keys],
+                    [key.sorted_string for key in keys],
+                    threshold=MATCH_THRESHOLD
+                )[0]]
+        with SCORING_SECONDS.labels('pairwise').time():
+            return [self.match_score_keys(query, sorted_query, key.text, key.sorted_string) for key in keys]
+
+    def top_matches(self, query, sections, limit=SUGGESTION_LIMIT, states=None, index=None, folded=False):
+        """
+        Wybiera top-k dopasowań z podanych sekcji bazy.
+
+        Kandydaci scorowani są paczkami w kolejności malejącej górnej granicy
+        z indeksu; heap trzyma tylko bieżące najlepsze `limit` wyników, a scoring
+        kończy się, gdy granica kolejnej paczki nie pozwala wejść do top-k.
+        Remisy rozstrzyga kolejność sekcji i rekordów w bazie (jak przy sort()).
+
+        Args:
+            states (dict): opcjonalnie section -> QueryState prefiksu zapytania;
+                po wywołaniu zawiera stany bieżącego zapytania
+            index (SearchIndex): indeks katalogu gminy (domyślnie katalog domyślny)
+            folded (bool): dopasowanie do kluczy bez polskich znaków
+
+        Returns:
+            list: krotki (section, entry, score) posortowane malejąco (entry.record, entry.uid)
+        """
+        index = index or self.search_index
+        # Zapytanie normalizowane raz - wpisy indeksu mają klucze gotowe
+        query = query.lower().strip()
+        if folded:
+            query = fold(query)
+        sorted_query = sorted_tokens(query)
+        ranked = []
+        for order, section in enumerate(sections):
+            state = index.query_state(query, section, base=states.get(section) if states else None, folded=folded)
+            if states is not None:
+                states[section] = state
+            for bound, entry_id, entry in index.ranked_lookup(query, section, state, folded):
+                ranked.append((bound, order, entry_id, section, entry))
+        ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+        heap = []
+        for start in range(0, len(ranked), SCORING_CHUNK):
+            chunk = ranked[start:start + SCORING_CHUNK]
+            # Wynik może być co najwyżej granicą po zaokrągleniu scorerów
+            if len(heap) == limit and int(chunk[0][0] + 0.5) < heap[0][0]:
+                break
 
-class GminaBot:
+            scores = self._score_entries(query, sorted_query, [item[4] for item in chunk], folded)
+            for (_, order, entry_id, section, entry), score in zip(chunk, scores):
+                if score <= MATCH_THRESHOLD:
+                    continue
+                item = (score, -order, -entry_id, section, entry)
+                if len(heap) < limit:
+                    heapq.heappush(heap, item)
+                elif item[:3] > heap[0][:3]:
+                    heapq.heapreplace(heap, item)
+
+        return [(section, entry, score) for score, _, _, section, entry in sorted(heap, reverse=True)]
+
+
+class GminaBot(MatchRanking):
     def __init__(self):
-        self.gmina_data = {}
-        self.search_database = {}
+        self.gmina_data = GminaRegistry()
+        self.catalogs = CatalogStore()
+        self.batch_scorer = BatchScorer()
+        self.search_cache = SearchCache()
+        # Dopasowanie bez polskich znaków: 'auto' (zapytania pisane bez diakrytyków), 'on', 'off'
+        self.search_folding = os.getenv('GMINA_SEARCH_FOLDING', 'auto')
+        self.ga4_dispatcher = GA4Dispatcher.from_env()
+        # Rejestr gmin TERYT (data/teryt_terc.csv albo GMINA_TERYT_PATH) - weryfikacja i sugestie gmina_check
+        self.teryt = TerytRegistry.from_file()
+        # Zgłoszenia mieszkańców (SQLite, GMINA_TICKETS_PATH)
+        self.tickets = TicketStore()
+        # Zapytania bez wyników do eksportów (SQLite, GMINA_ANALYTICS_PATH)
+        self.no_results = NoResultsLog()
+        # Top fraz bez wyników per (gmina, typ) - /admin/no-results
+        self.no_results_top = NoResultsAggregator()
+        # Ułamek zapytań bez wyników przekazywanych do GA4 (0 - wyłączone, domyślnie wszystkie)
+        self.ga4_sample_rate = min(1.0, max(0.0, float(os.getenv('GA4_NO_RESULTS_SAMPLE_RATE', '1'))))
+        # Opcjonalny scoring dużych katalogów w procesach roboczych (GMINA_SCORING_SHARDS >= 2)
+        self.shard_pool = ShardPool.from_env(ShardSearcher)
         self.initialize_search_database()
         
         self.status_colors = {
@@ -21,145 +198,46 @@ class GminaBot:
             'brak_danych': 'grey-dot'
         }
 
-        self.category_map = {
-            'odpady': ['śmieci', 'odpadki', 'deklaracja śmieciowa', 'wywóz śmieci', 'odpady', 'śmieć'],
-            'podatki': ['podatek', 'opłata', 'należność', 'płatność', 'finanse'],
-            'budownictwo': ['budowa', 'remont', 'pozwolenie', 'zgłoszenie budowlane', 'budynek'],
-            'działalność': ['firma', 'biznes', 'rejestracja', 'działalność gospodarcza', 'przedsiębiorstwo'],
-            'drogi': ['dziura', 'uszkodzenie', 'naprawa drogi', 'infrastruktura', 'droga', 'chodnik'],
-            'środowisko': ['drzewo', 'wycinka', 'ochrona środowiska', 'zieleń', 'las', 'park'],
-            'problemy': ['problem', 'skarga', 'zgłoszenie', 'awaria', 'usterka', 'reklamacja']
-        }
+        # Tabele słów kluczowych (kategorie zgłoszeń, intencje, tematy) z data/keywords.json
+        self.keyword_classifier = KeywordClassifier.from_file()
+        self.category_map = self.keyword_classifier.category_keywords('topics')
+
+        # Akcje przycisków: nazwa -> handler, odpowiedzi statyczne cache'owane per (gmina, wersja katalogu)
+        self.actions = ActionRegistry(fallback=self._handle_unknown_action)
+        self._register_actions()
 
     def initialize_search_database(self):
-        """Inicjalizuje rozbudowaną bazę danych dla wyszukiwania predykcyjnego"""
-        self.search_database = {
-            'contacts': {
-                'persons': [
-                    {'name': 'Jan Kowalski', 'position': 'Wójt Gminy', 'phone': '+48 123 456 701', 'email': 'wojt@gmina.pl', 'department': 'Zarząd'},
-                    {'name': 'Anna Nowak', 'position': 'Sekretarz Gminy', 'phone': '+48 123 456 702', 'email': 'sekretarz@gmina.pl', 'department': 'Sekretariat'},
-                    {'name': 'Piotr Wiśniewski', 'position': 'Skarbnik Gminy', 'phone': '+48 123 456 703', 'email': 'skarbnik@gmina.pl', 'department': 'Finanse'},
-                    {'name': 'Maria Zielińska', 'position': 'Kierownik USC', 'phone': '+48 123 456 704', 'email': 'usc@gmina.pl', 'department': 'Urząd Stanu Cywilnego'},
-                    {'name': 'Tomasz Kamiński', 'position': 'Inspektor ds. Budownictwa', 'phone': '+48 123 456 705', 'email': 'budownictwo@gmina.pl', 'department': 'Architektura'},
-                    {'name': 'Ewa Lewandowska', 'position': 'Podinspektor ds. Ochrony Środowiska', 'phone': '+48 123 456 706', 'email': 'srodowisko@gmina.pl', 'department': 'Ochrona Środowiska'},
-                    {'name': 'Krzysztof Wójcik', 'position': 'Kierownik Referatu Podatkowego', 'phone': '+48 123 456 707', 'email': 'podatki@gmina.pl', 'department': 'Finanse'},
-                    {'name': 'Magdalena Kozłowska', 'position': 'Inspektor ds. Gospodarki Komunalnej', 'phone': '+48 123 456 708', 'email': 'komunalna@gmina.pl', 'department': 'Gospodarka Komunalna'},
-                    {'name': 'Robert Jankowski', 'position': 'Kierownik GOPS', 'phone': '+48 123 456 709', 'email': 'gops@gmina.pl', 'department': 'Pomoc Społeczna'},
-                    {'name': 'Agnieszka Mazur', 'position': 'Informatyk', 'phone': '+48 123 456 710', 'email': 'it@gmina.pl', 'department': 'IT'},
-                    {'name': 'Paweł Krawczyk', 'position': 'Inspektor ds. Inwestycji', 'phone': '+48 123 456 711', 'email': 'inwestycje@gmina.pl', 'department': 'Rozwój i Inwestycje'},
-                    {'name': 'Joanna Piotrowska', 'position': 'Radca Prawny', 'phone': '+48 123 456 712', 'email': 'prawnik@gmina.pl', 'department': 'Obsługa Prawna'},
-                    {'name': 'Stanisław Dąbrowski', 'position': 'Inspektor ds. Zamówień Publicznych', 'phone': '+48 123 456 713', 'email': 'zamowienia@gmina.pl', 'department': 'Zamówienia Publiczne'},
-                    {'name': 'Katarzyna Szymańska', 'position': 'Specjalista ds. Funduszy UE', 'phone': '+48 123 456 714', 'email': 'fundusze@gmina.pl', 'department': 'Rozwój i Inwestycje'},
-                    {'name': 'Marek Pawłowski', 'position': 'Kierownik Referatu Oświaty', 'phone': '+48 123 456 715', 'email': 'oswiata@gmina.pl', 'department': 'Oświata'},
-                    {'name': 'Beata Michalska', 'position': 'Inspektor ds. Ewidencji Ludności', 'phone': '+48 123 456 716', 'email': 'ewidencja@gmina.pl', 'department': 'Ewidencja Ludności'},
-                    {'name': 'Andrzej Nowakowski', 'position': 'Geodeta Gminny', 'phone': '+48 123 456 717', 'email': 'geodeta@gmina.pl', 'department': 'Geodezja'},
-                    {'name': 'Alicja Wróblewska', 'position': 'Inspektor ds. Promocji', 'phone': '+48 123 456 718', 'email': 'promocja@gmina.pl', 'department': 'Promocja i Kultura'},
-                    {'name': 'Rafał Kaczmarek', 'position': 'Komendant Straży Gminnej', 'phone': '+48 123 456 719', 'email': 'straz@gmina.pl', 'department': 'Straż Gminna'},
-                    {'name': 'Dorota Grabowska', 'position': 'Kierownik OPS', 'phone': '+48 123 456 720', 'email': 'ops@gmina.pl', 'department': 'Pomoc Społeczna'}
-                ],
-                'departments': [
-                    {'name': 'Sekretariat', 'phone': '+48 123 456 700', 'email': 'sekretariat@gmina.pl', 'hours': 'Pon-Pt: 7:30-15:30'},
-                    {'name': 'Referat Finansowy', 'phone': '+48 123 456 720', 'email': 'finanse@gmina.pl', 'hours': 'Pon-Pt: 8:00-16:00'},
-                    {'name': 'Referat Architektury i Budownictwa', 'phone': '+48 123 456 730', 'email': 'architektura@gmina.pl', 'hours': 'Pon, Śr, Pt: 8:00-15:00'},
-                    {'name': 'Referat Gospodarki Komunalnej', 'phone': '+48 123 456 740', 'email': 'komunalna@gmina.pl', 'hours': 'Pon-Pt: 7:00-15:00'},
-                    {'name': 'Urząd Stanu Cywilnego', 'phone': '+48 123 456 750', 'email': 'usc@gmina.pl', 'hours': 'Pon-Pt: 8:00-16:00, Śr: do 18:00'},
-                    {'name': 'Referat Ochrony Środowiska', 'phone': '+48 123 456 760', 'email': 'srodowisko@gmina.pl', 'hours': 'Pon-Pt: 7:30-15:30'},
-                    {'name': 'Gminny Ośrodek Pomocy Społecznej', 'phone': '+48 123 456 770', 'email': 'gops@gmina.pl', 'hours': 'Pon-Pt: 7:30-15:30'},
-                    {'name': 'Referat Rozwoju i Inwestycji', 'phone': '+48 123 456 780', 'email': 'rozwoj@gmina.pl', 'hours': 'Pon-Pt: 8:00-16:00'},
-                    {'name': 'Referat Oświaty', 'phone': '+48 123 456 790', 'email': 'oswiata@gmina.pl', 'hours': 'Pon-Pt: 8:00-16:00'},
-                    {'name': 'Referat Geodezji', 'phone': '+48 123 456 800', 'email': 'geodezja@gmina.pl', 'hours': 'Pon, Śr: 8:00-16:00'},
-                    {'name': 'Straż Gminna', 'phone': '+48 123 456 810', 'email': 'straz@gmina.pl', 'hours': '24/7 - dyżury'},
-                    {'name': 'Biuro Promocji i Kultury', 'phone': '+48 123 456 820', 'email': 'promocja@gmina.pl', 'hours': 'Pon-Pt: 9:00-17:00'}
-                ]
-            },
-            'forms': [
-                {'name': 'Deklaracja o wysokości opłaty za gospodarowanie odpadami', 'category': 'odpady', 'code': 'DO-1', 'online': True},
-                {'name': 'Wniosek o wydanie pozwolenia na budowę', 'category': 'budownictwo', 'code': 'PB-1', 'online': False},
-                {'name': 'Zgłoszenie robót budowlanych', 'category': 'budownictwo', 'code': 'ZRB-1', 'online': True},
-                {'name': 'Wniosek o wydanie wypisu z miejscowego planu', 'category': 'budownictwo', 'code': 'WMP-1', 'online': True},
-                {'name': 'Wniosek o ustalenie numeru porządkowego', 'category': 'budownictwo', 'code': 'NP-1', 'online': False},
-                {'name': 'Wniosek o wycinkę drzew', 'category': 'srodowisko', 'code': 'WD-1', 'online': True},
-                {'name': 'Zgłoszenie zamiaru usunięcia drzewa', 'category': 'srodowisko', 'code': 'ZUD-1', 'online': True},
-                {'name': 'Wniosek o wydanie zezwolenia na sprzedaż alkoholu', 'category': 'dzialalnosc', 'code': 'ZA-1', 'online': False},
-                {'name': 'Wniosek o wpis do ewidencji działalności gospodarczej', 'category': 'dzialalnosc', 'code': 'EDG-1', 'online': True},
-                {'name': 'Deklaracja podatkowa od nieruchomości', 'category': 'podatki', 'code': 'DN-1', 'online': True},
-                {'name': 'Informacja o nieruchomościach i obiektach budowlanych', 'category': 'podatki', 'code': 'IN-1', 'online': True},
-                {'name': 'Wniosek o zwrot podatku akcyzowego', 'category': 'podatki', 'code': 'PA-1', 'online': False},
-                {'name': 'Wniosek o wydanie zaświadczenia o niezaleganiu', 'category': 'podatki', 'code': 'ZN-1', 'online': True},
-                {'name': 'Zgłoszenie szkody drogowej', 'category': 'drogi', 'code': 'SD-1', 'online': True},
-                {'name': 'Wniosek o zajęcie pasa drogowego', 'category': 'drogi', 'code': 'ZPD-1', 'online': False},
-                {'name': 'Wniosek o wydanie dowodu osobistego', 'category': 'usc', 'code': 'DO-1', 'online': True},
-                {'name': 'Zgłoszenie urodzenia dziecka', 'category': 'usc', 'code': 'UD-1', 'online': False},
-                {'name': 'Wniosek o sporządzenie aktu małżeństwa', 'category': 'usc', 'code': 'AM-1', 'online': False},
-                {'name': 'Wniosek o przyznanie dodatku mieszkaniowego', 'category': 'pomoc', 'code': 'DM-1', 'online': True},
-                {'name': 'Wniosek o przyznanie zasiłku rodzinnego', 'category': 'pomoc', 'code': 'ZR-1', 'online': True},
-                {'name': 'Wniosek o wydanie Karty Dużej Rodziny', 'category': 'pomoc', 'code': 'KDR-1', 'online': True},
-                {'name': 'Wniosek o dotację na wymianę pieca', 'category': 'srodowisko', 'code': 'WP-1', 'online': True},
-                {'name': 'Zgłoszenie imprez masowej', 'category': 'kultura', 'code': 'IM-1', 'online': False},
-                {'name': 'Wniosek o udostępnienie informacji publicznej', 'category': 'inne', 'code': 'IP-1', 'online': True},
-                {'name': 'Skarga na działalność organu gminy', 'category': 'inne', 'code': 'SK-1', 'online': True}
-            ],
-            'problems': [
-                'Dziura w drodze',
-                'Nieodebrane śmieci',
-                'Awaria oświetlenia ulicznego',
-                'Przepełniony kontener na odpady',
-                'Uszkodzony chodnik',
-                'Nielegalne wysypisko śmieci',
-                'Hałas z budowy',
-                'Zanieczyszczenie środowiska',
-                'Problem z kanalizacją',
-                'Uszkodzone oznakowanie drogowe',
-                'Wyciek wody',
-                'Niebezpieczne drzewo',
-                'Dewastacja mienia publicznego',
-                'Bezpańskie zwierzęta',
-                'Zła organizacja ruchu',
-                'Brak koszy na śmieci',
-                'Uszkodzona wiata przystankowa',
-                'Zalane tereny po deszczu',
-                'Graffiti na budynkach',
-                'Niedziałający hydrant',
-                'Zarośnięte pobocze drogi',
-                'Uszkodzone barierki ochronne',
-                'Brak przejścia dla pieszych',
-                'Niebezpieczny plac zabaw',
-                'Zapchana studzienka kanalizacyjna'
-            ]
-        }
+        """Ładuje katalog domyślny (kontakty, formularze, problemy) dla wyszukiwania predykcyjnego"""
+        self.catalogs.default()
+
+    @property
+    def search_database(self):
+        """Baza wyszukiwania katalogu domyślnego (data/catalogs/default.json)"""
+        return self.catalogs.default().search_database
+
+    @search_database.setter
+    def search_database(self, database):
+        """Podmiana bazy przebudowuje indeks (nowa wersja unieważnia cache wyszukiwania)"""
+        self.catalogs.install(None, database)
+
+    @property
+    def search_index(self):
+        return self.catalogs.default().index
+
+    def refresh_search_index(self):
+        """Przebudowuje indeks po zmianach w search_database wprowadzonych w miejscu"""
+        self.search_database = self.search_database
+
+    def catalog_for(self, gmina_name=None):
+        """Katalog gminy - domyślnie gminy z bieżącej sesji"""
+        if gmina_name is None and has_session():
+            gmina_name = session.get('gmina_context', {}).get('gmina')
+        return self.catalogs.get(gmina_name)
 
     def initialize_data(self):
-        """Inicjalizuje dane gminy z rozszerzoną bazą"""
-        self.gmina_data = {
-            'Przykładowa Gmina': {
-                'basic_info': {
-                    'name': 'Urząd Gminy Przykładowa',
-                    'address': 'ul. Główna 1, 00-001 Przykładowa',
-                    'phone': '+48 123 456 789',
-                    'email': 'kontakt@przykladowa.pl',
-                    'nip': '1234567890',
-                    'regon': '123456789',
-                    'bip': 'https://bip.przykladowa.pl',
-                    'epuap': '/ugprzykladowa/skrytka'
-                },
-                'departments': self.search_database['contacts']['departments'],
-                'forms': self.search_database['forms']
-            },
-            'Demo Gmina': {
-                'basic_info': {
-                    'name': 'Urząd Gminy Demo',
-                    'address': 'ul. Testowa 5, 00-002 Demo',
-                    'phone': '+48 987 654 321',
-                    'email': 'kontakt@demo.pl',
-                    'nip': '9876543210',
-                    'regon': '987654321',
-                    'bip': 'https://bip.demo.pl',
-                    'epuap': '/ugdemo/skrytka'
-                },
-                'departments': self.search_database['contacts']['departments'],
-                'forms': self.search_database['forms']
-            }
-        }
+        """Inicjalizuje dane gmin - katalogi gmin ładowane są leniwie przy pierwszym użyciu"""
+        self.gmina_data.clear()
+        self.catalogs.default()
 
     def set_gmina_context(self, context):
         """Ustawia kontekst gminy w sesji"""
@@ -169,22 +247,12 @@ class GminaBot:
             if not gmina_name:
                 return False
 
-            # Tworzenie pełnych danych dla nowej gminy
-            if gmina_name not in self.gmina_data:
-                self.gmina_data[gmina_name] = {
-                    'basic_info': {
-                        'name': f'Urząd Gminy {gmina_name}',
-                        'address': f'ul. Główna 1, {gmina_name}',
-                        'phone': '+48 123 456 789',
-                        'email': f'kontakt@{gmina_name.lower().replace(" ", "")}.pl',
-                        'nip': '1234567890',
-                        'regon': '123456789',
-                        'bip': f'https://bip.{gmina_name.lower().replace(" ", "")}.pl',
-                        'epuap': f'/ug{gmina_name.lower().replace(" ", "")}/skrytka'
-                    },
-                    'departments': self.search_database['contacts']['departments'],
-                    'forms': self.search_database['forms']
-                }
+            if not isinstance(gmina_name, str) or len(gmina_name) > MAX_GMINA_NAME_LENGTH:
+                logger.error("Nieprawidłowa nazwa gminy (typ/długość)")
+                return False
+
+            # Wpis gminy w ograniczonym rejestrze (dane z katalogu, jeśli gmina go ma)
+            self.gmina_data.get_or_create(gmina_name, self.catalogs.get(gmina_name))
 
             session['gmina_context'] = context
             session['chat_history'] = []
@@ -197,7 +265,7 @@ class GminaBot:
             return True
 
         except Exception as e:
-            print(f"[ERROR] Błąd podczas ustawiania kontekstu: {e}")
+            logger.error("Błąd podczas ustawiania kontekstu: %s", e)
             return False
 
     def get_initial_greeting(self):
@@ -236,25 +304,59 @@ Wybierz jedną z opcji lub zacznij pisać, aby skorzystać z inteligentnego wysz
         session['search_mode'] = False
         session.modified = True
 
-        # Główne akcje z aktywacją wyszukiwania
-        if action == 'znajdz_kontakt':
-            return self._handle_znajdz_kontakt_enterprise()
-        elif action == 'pobierz_formularz':
-            return self._handle_pobierz_formularz_enterprise()
-        elif action == 'zglos_problem':
-            return self._handle_zglos_problem_enterprise()
-        elif action == 'sprawdz_gmine':
-            return self._handle_sprawdz_gmine()
-        elif action == 'main_menu':
-            return self.get_initial_greeting()
-        else:
-            return self._handle_default_action(action)
+        return self._handle_default_action(action)
 
-    def _handle_znajdz_kontakt_enterprise(self):
-        """Obsługa kontaktów z wyszukiwaniem predykcyjnym"""
+    def render_button_action(self, action, serialize):
+        """
+        Gotowe ciało JSON odpowiedzi dla akcji statycznej (z cache rejestru akcji).
+
+        Zmiany w sesji są takie same jak w handle_button_action.
+        Zwraca None dla akcji dynamicznych i nieznanych - wtedy odpowiedź
+        budowana jest przez handle_button_action.
+        """
+        if 'gmina_context' not in session or not self.actions.is_static(action):
+            return None
+
+        session['current_path'] = action
+        session['search_mode'] = False
+        session.modified = True
+
+        gmina_name = session['gmina_context']['gmina']
+        return self.actions.render(action, gmina_name, self.catalog_for(gmina_name).version, serialize)
+
+    def _register_actions(self):
+        """Rejestruje wbudowane akcje przycisków (wtyczki dopisują własne przez self.actions.register)"""
+        # Główne akcje z aktywacją wyszukiwania - treść stała, tryb wyszukiwania
+        # w sesji włączany przy każdym wywołaniu (także z cache)
+        self.actions.register('znajdz_kontakt', self._handle_znajdz_kontakt_enterprise,
+                              static=True, prepare=lambda: self._enter_search_mode('contacts'))
+        self.actions.register('pobierz_formularz', self._handle_pobierz_formularz_enterprise,
+                              static=True, prepare=lambda: self._enter_search_mode('forms'))
+        self.actions.register('zglos_problem', self._handle_zglos_problem_enterprise,
+                              static=True, prepare=lambda: self._enter_search_mode('problems'))
+        self.actions.register('sprawdz_gmine', self._handle_sprawdz_gmine,
+                              static=True, prepare=lambda: self._enter_search_mode('gmina_check'))
+        # Numer zgłoszenia wpisany po tej akcji trafia do _process_status_check
+        self.actions.register('status_zgloszenia', self._handle_status_zgloszenia,
+                              static=True, prepare=lambda: self._enter_search_mode('status_check'))
+        self.actions.register('main_menu', self.get_initial_greeting, static=True)
+
+        # Szybkie akcje - odpowiedź zależy tylko od gminy i wersji jej katalogu
+        for action in ('quick_sekretariat', 'quick_finanse', 'quick_budownictwo',
+                       'quick_form_odpady', 'quick_form_budownictwo', 'quick_form_srodowisko',
+                       'quick_form_podatki', 'quick_problem_drogi', 'quick_problem_oswietlenie',
+                       'quick_problem_odpady'):
+            self.actions.register(action, getattr(self, f'_handle_{action}'), static=True)
+
+    def _enter_search_mode(self, context):
+        """Włącza tryb wyszukiwania predykcyjnego w danym kontekście"""
         session['search_mode'] = True
-        session['search_context'] = 'contacts'
+        session['search_context'] = context
         session.modified = True
+
+    def _handle_znajdz_kontakt_enterprise(self):
+        """Obsługa kontaktów z wyszukiwaniem predykcyjnym"""
+        self._enter_search_mode('contacts')
         
         return {
             'text_message': """🔍 **Wyszukiwarka Kontaktów - Tryb Inteligentny**
@@ -279,9 +381,7 @@ System automatycznie podpowie najlepsze wyniki.""",
 
     def _handle_pobierz_formularz_enterprise(self):
         """Obsługa formularzy z wyszukiwaniem predykcyjnym"""
-        session['search_mode'] = True
-        session['search_context'] = 'forms'
-        session.modified = True
+        self._enter_search_mode('forms')
         
         return {
             'text_message': """📋 **Inteligentna Wyszukiwarka Formularzy**
@@ -305,9 +405,7 @@ Wpisz czego szukasz:
 
     def _handle_zglos_problem_enterprise(self):
         """Obsługa zgłoszeń z możliwością wpisania własnego problemu"""
-        session['search_mode'] = True
-        session['search_context'] = 'problems'
-        session.modified = True
+        self._enter_search_mode('problems')
         
         return {
             'text_message': """⚠️ **System Zgłaszania Problemów**
@@ -330,114 +428,166 @@ Przykłady: "dziura na ul. Głównej", "nieodebrane śmieci", "awaria oświetlen
             ]
         }
 
-    def calculate_match_score(self, query, text):
-        """Oblicza wynik dopasowania używając fuzzy matching"""
-        # Konwersja do lowercase dla porównania
-        query_lower = query.lower().strip()
-        text_lower = text.lower()
-        
-        # Różne typy dopasowania z wagami
-        ratio = fuzz.ratio(query_lower, text_lower)  # Podstawowe podobieństwo
-        partial_ratio = fuzz.partial_ratio(query_lower, text_lower)  # Częściowe dopasowanie
-        token_sort = fuzz.token_sort_ratio(query_lower, text_lower)  # Sortowanie tokenów
-        token_set = fuzz.token_set_ratio(query_lower, text_lower)  # Zbiór tokenów
-        
-        # Weighted average z preferencją dla partial_ratio (najlepsze dla wyszukiwania)
-        weighted_score = (
-            ratio * 0.2 +
-            partial_ratio * 0.4 +
-            token_sort * 0.2 +
-            token_set * 0.2
+    def use_folding(self, query):
+        """
+        Czy dopasowywać zapytanie do kluczy bez polskich znaków.
+
+        W trybie 'auto' dotyczy to zapytań wpisanych bez diakrytyków
+        ("smieci" trafia w "Śmieci" od pierwszego znaku); zapytanie
+        z polskimi znakami jest dopasowywane dokładnie.
+        """
+        if self.search_folding == 'on':
+            return True
+        if self.search_folding == 'off':
+            return False
+        query = query.lower()
+        return fold(query) == query
+
+    def _build_suggestion(self, section, record, score, uid):
+        """Buduje sugestię z polami do wyświetlenia (tylko dla zwycięzców top-k)"""
+        if section == 'persons':
+            return Suggestion(
+                id=uid,
+                type='person',
+                icon='👤',
+                title=record['name'],
+                subtitle=f"{record['position']} - {record['department']}",
+                details=f"📞 {record['phone']} | ✉️ {record['email']}",
+                score=score
+            )
+        elif section == 'departments':
+            return Suggestion(
+                id=uid,
+                type='department',
+                icon='🏢',
+                title=record['name'],
+                subtitle=record['hours'],
+                details=f"📞 {record['phone']} | ✉️ {record['email']}",
+                score=score
+            )
+        elif section == 'forms':
+            status_icon = '✅' if record['online'] else '📄'
+            return Suggestion(
+                id=uid,
+                type='form',
+                icon=status_icon,
+                title=record['name'],
+                subtitle=f"Kod: {record['code']} | Kategoria: {record['category']}",
+                details='Dostępny online' if record['online'] else 'Wymaga wizyty w urzędzie',
+                score=score
+            )
+        return Suggestion(
+            id=uid,
+            type='problem',
+            icon='⚠️',
+            title=record,
+            subtitle='Kliknij aby zgłosić',
+            details='Zgłoszenie zostanie automatycznie skategoryzowane',
+            score=score
         )
-        
-        return int(weighted_score)
 
-    def search_suggestions(self, query, context):
+    def search_suggestions(self, query, context, limit=SUGGESTION_LIMIT, states=None, gmina=None, folded=None):
         """Generuje sugestie dla wyszukiwania predykcyjnego z fuzzy matching"""
         query = query.lower().strip()
-        suggestions = []
         
         if not query or len(query) < 2:
             return []
+
+        if context == 'gmina_check':
+            return self.gmina_suggestions(query, limit)
+
+        sections = SEARCH_SECTIONS.get(context)
+        if not sections:
+            return []
+        if folded is None:
+            folded = self.use_folding(query)
         
-        if context == 'contacts':
-            # Szukanie w osobach
-            for person in self.search_database['contacts']['persons']:
-                # Łączymy wszystkie pola do przeszukiwania
-                searchable_text = f"{person['name']} {person['position']} {person['department']}"
-                score = self.calculate_match_score(query, searchable_text)
-                
-                if score > 40:  # Próg minimalnego dopasowania
-                    suggestions.append({
-                        'type': 'person',
-                        'icon': '👤',
-                        'title': person['name'],
-                        'subtitle': f"{person['position']} - {person['department']}",
-                        'details': f"📞 {person['phone']} | ✉️ {person['email']}",
-                        'data': person,
-                        'score': score
-                    })
-            
-            # Szukanie w wydziałach
-            for dept in self.search_database['contacts']['departments']:
-                score = self.calculate_match_score(query, dept['name'])
-                
-                if score > 40:
-                    suggestions.append({
-                        'type': 'department',
-                        'icon': '🏢',
-                        'title': dept['name'],
-                        'subtitle': dept['hours'],
-                        'details': f"📞 {dept['phone']} | ✉️ {dept['email']}",
-                        'data': dept,
-                        'score': score
-                    })
-        
-        elif context == 'forms':
-            # Szukanie w formularzach
-            for form in self.search_database['forms']:
-                searchable_text = f"{form['name']} {form['category']} {form['code']}"
-                score = self.calculate_match_score(query, searchable_text)
-                
-                if score > 40:
-                    status_icon = '✅' if form['online'] else '📄'
-                    suggestions.append({
-                        'type': 'form',
-                        'icon': status_icon,
-                        'title': form['name'],
-                        'subtitle': f"Kod: {form['code']} | Kategoria: {form['category']}",
-                        'details': 'Dostępny online' if form['online'] else 'Wymaga wizyty w urzędzie',
-                        'data': form,
-                        'score': score
-                    })
-        
-        elif context == 'problems':
-            # Szukanie w typowych problemach
-            for problem in self.search_database['problems']:
-                score = self.calculate_match_score(query, problem)
-                
-                if score > 40:
-                    suggestions.append({
-                        'type': 'problem',
-                        'icon': '⚠️',
-                        'title': problem,
-                        'subtitle': 'Kliknij aby zgłosić',
-                        'details': 'Zgłoszenie zostanie automatycznie skategoryzowane',
-                        'data': {'problem': problem},
-                        'score': score
-                    })
-        
-        # KLUCZOWE: Sortowanie według score malejąco (najlepsze dopasowanie na górze)
-        suggestions.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Ograniczenie do 8 sugestii
-        return suggestions[:8]
+        started = time.perf_counter()
+        index = self.catalog_for(gmina).index
+        matches = None
+        path = 'shards'
+        if self.shard_pool is not None:
+            # Duży katalog: ten sam ranking liczony równolegle w shardach
+            matches = self.shard_pool.top_matches(index, query, sections, limit, folded)
+        if matches is None:
+            path = 'local'
+            matches = self.top_matches(query, sections, limit, states, index=index, folded=folded)
+        SEARCH_SECONDS.labels(path).observe(time.perf_counter() - started)
+
+        # KLUCZOWE: top-k według score malejąco (najlepsze dopasowanie na górze),
+        # pełne sugestie budowane tylko dla zwycięzców
+        return [self._build_suggestion(section, entry.record, score, entry.uid) for section, entry, score in matches]
+
+    def gmina_suggestions(self, query, limit=SUGGESTION_LIMIT):
+        """Sugestie gmin z rejestru TERYT (kontekst gmina_check)"""
+        started = time.perf_counter()
+        matches = self.teryt.search(query, limit)
+        SEARCH_SECONDS.labels('teryt').observe(time.perf_counter() - started)
+        return [
+            self._gmina_suggestion(municipality, self.teryt.score(match_class, distance))
+            for municipality, match_class, distance in matches
+        ]
+
+    @staticmethod
+    def _gmina_suggestion(municipality, score):
+        return Suggestion(
+            id=municipality.uid,
+            type='gmina',
+            icon='🏛️',
+            title=municipality.name,
+            subtitle=f"{municipality.kind} | woj. {municipality.voivodeship}",
+            details=f"Kod TERYT: {municipality.teryt}" + (f" | Powiat: {municipality.powiat}" if municipality.powiat else ''),
+            score=score
+        )
+
+    def cached_search_suggestions(self, query, context, gmina=None):
+        """
+        search_suggestions z cache LRU/TTL kluczowanym (gmina, context, zapytanie).
+
+        Przy braku wpisu wykorzystuje stan najdłuższego zbuforowanego prefiksu
+        zapytania, więc kolejne znaki wpisywane przez mieszkańca liczą tylko różnicę.
+        """
+        # Wersja katalogu gminy - po przeładowaniu danych stare wpisy są nieważne
+        version = self.catalog_for(gmina).version
+
+        cached = self.search_cache.get(gmina, context, query, version)
+        if cached is not None:
+            return cached
+
+        # Kopia - stany prefiksu w cache nie mogą być nadpisane
+        states = dict(self.search_cache.prefix_states(gmina, context, query, version) or {})
+        suggestions = self.search_suggestions(query, context, states=states, gmina=gmina)
+        self.search_cache.put(gmina, context, query, suggestions, states, version)
+        return suggestions
 
     def process_search_selection(self, selection_data):
-        """Przetwarza wybór z listy sugestii"""
-        selection_type = selection_data.get('type')
-        data = selection_data.get('data')
-        
+        """
+        Przetwarza wybór z listy sugestii.
+
+        Klient odsyła tylko identyfikator rekordu (Selection.id) - rekord
+        odczytywany jest z indeksu katalogu gminy, nie z danych klienta.
+        """
+        with SELECTION_SECONDS.time():
+            return self._selection_reply(selection_data)
+
+    def _selection_reply(self, selection_data):
+        """Odpowiedź na wybór sugestii (rekord z indeksu katalogu gminy z sesji albo gmina z TERYT)"""
+        municipality = self.teryt.resolve(selection_data.id)
+        if municipality is not None:
+            return self._gmina_verified_reply(municipality)
+
+        found = self.catalog_for().index.resolve(selection_data.id)
+        if found is None:
+            return {
+                'text_message': 'Wybrana pozycja nie jest już dostępna. Wyszukaj ponownie.',
+                'buttons': [{'text': '↩️ Menu główne', 'action': 'main_menu'}]
+            }
+
+        section, data = found
+        selection_type = SELECTION_TYPES[section]
+        if selection_type == 'problem':
+            data = {'problem': data}
+
         if selection_type == 'person':
             return {
                 'text_message': f"""✅ **Znaleziono kontakt:**
@@ -497,13 +647,16 @@ Przykłady: "dziura na ul. Głównej", "nieodebrane śmieci", "awaria oświetlen
             }
         
         elif selection_type == 'problem':
-            problem_id = f"ZGL-{random.randint(10000, 99999)}"
+            ticket = self._register_ticket(data['problem'], source='selection')
+            if ticket is None:
+                return self._ticket_error_reply()
+            problem_id = ticket['id']
             return {
                 'text_message': f"""✅ **Zgłoszenie przyjęte!**
 
 📝 **Problem:** {data['problem']}
 🔖 **Numer zgłoszenia:** {problem_id}
-📅 **Data:** {datetime.now().strftime('%Y-%m-%d %H:%M')}
+📅 **Data:** {datetime.fromtimestamp(ticket['created_at']).strftime('%Y-%m-%d %H:%M')}
 
 ⏱️ **Przewidywany czas realizacji:** 3-5 dni roboczych
 
@@ -524,22 +677,43 @@ Przykłady: "dziura na ul. Głównej", "nieodebrane śmieci", "awaria oświetlen
             'buttons': [{'text': '↩️ Menu główne', 'action': 'main_menu'}]
         }
 
+    def _classify_problem(self, description):
+        """Kategorie zgłoszenia (nazwa, wynik) - jeden przebieg klasyfikatora, pierwsza ma najwyższy priorytet"""
+        return self.keyword_classifier.classify(description, 'problem_categories')
+
+    def _register_ticket(self, description, category=None, source='custom'):
+        """Zapisuje zgłoszenie w rejestrze - None, gdy zapis się nie powiódł"""
+        if category is None:
+            matched = self._classify_problem(description)
+            category = matched[0][0] if matched else "Inne"
+        gmina_name = session.get('gmina_context', {}).get('gmina') if has_session() else None
+        try:
+            return self.tickets.create(description, category, gmina=gmina_name, source=source)
+        except Exception as e:
+            logger.exception("[TICKETS] Nie udało się zapisać zgłoszenia: %s", e)
+            return None
+
+    @staticmethod
+    def _ticket_error_reply():
+        return {
+            'text_message': '⚠️ Nie udało się zarejestrować zgłoszenia. Spróbuj ponownie za chwilę '
+                            'lub zadzwoń: 📞 +48 123 456 799',
+            'buttons': [
+                {'text': '🔄 Spróbuj ponownie', 'action': 'zglos_problem'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
     def process_custom_problem(self, problem_description):
         """Przetwarza niestandardowe zgłoszenie problemu"""
-        problem_id = f"ZGL-{random.randint(10000, 99999)}"
-        
-        # Analiza tekstu do kategoryzacji
-        category = "Inne"
-        if any(word in problem_description.lower() for word in ['droga', 'dziura', 'chodnik', 'asfalt', 'jezdnia']):
-            category = "Infrastruktura drogowa"
-        elif any(word in problem_description.lower() for word in ['śmieci', 'odpady', 'kontener', 'kosz', 'wywóz']):
-            category = "Gospodarka odpadami"
-        elif any(word in problem_description.lower() for word in ['lampa', 'oświetlenie', 'światło', 'latarnia']):
-            category = "Oświetlenie"
-        elif any(word in problem_description.lower() for word in ['woda', 'kanalizacja', 'wyciek', 'rura', 'studzienka']):
-            category = "Wodno-kanalizacyjne"
-        elif any(word in problem_description.lower() for word in ['drzewo', 'gałęzie', 'krzew', 'zieleń', 'trawnik']):
-            category = "Zieleń miejska"
+        # Analiza tekstu do kategoryzacji - kategoria o najwyższym priorytecie
+        matched = self._classify_problem(problem_description)
+        category = matched[0][0] if matched else "Inne"
+
+        ticket = self._register_ticket(problem_description, category)
+        if ticket is None:
+            return self._ticket_error_reply()
+        problem_id = ticket['id']
         
         return {
             'text_message': f"""✅ **Zgłoszenie przyjęte!**
@@ -549,7 +723,7 @@ _{problem_description}_
 
 🏷️ **Automatyczna kategoryzacja:** {category}
 🔖 **Numer zgłoszenia:** {problem_id}
-📅 **Data:** {datetime.now().strftime('%Y-%m-%d %H:%M')}
+📅 **Data:** {datetime.fromtimestamp(ticket['created_at']).strftime('%Y-%m-%d %H:%M')}
 
 ⏱️ **Przewidywany czas realizacji:** 
 • Problemy krytyczne: 24-48h
@@ -571,14 +745,65 @@ _{problem_description}_
                 {'text': '📸 Dodaj zdjęcie', 'action': 'add_photo'},
                 {'text': '↩️ Menu główne', 'action': 'main_menu'}
             ],
+            'categories': [{'category': name, 'score': score} for name, score in matched],
             'enable_search': False  # Ważne - wyłącza tryb wyszukiwania
         }
 
+    def process_bulk_problems(self, problems, source='bulk'):
+        """
+        Przyjmuje paczkę zgłoszeń (call center, bramka SMS) dla gminy z sesji.
+
+        Kategorie jak w process_custom_problem, ale dla całej paczki jednym
+        przebiegiem klasyfikatora; poprawne zgłoszenia zapisywane są jedną
+        transakcją (TicketStore.create_many).
+
+        Args:
+            problems (list): BulkProblem albo None (niepoprawny wiersz NDJSON)
+
+        Returns:
+            list: BulkResult dla każdego zgłoszenia, w kolejności paczki
+        """
+        results = [BulkResult(index, ref=problem.ref if problem is not None else None)
+                   for index, problem in enumerate(problems)]
+        accepted = []
+        for result, problem in zip(results, problems):
+            if problem is None:
+                result.error = 'invalid_json'
+            elif not problem.description.strip():
+                result.error = 'empty_description'
+            elif len(problem.description) > MAX_PROBLEM_LENGTH:
+                result.error = 'description_too_long'
+            else:
+                accepted.append((result, problem.description))
+        if not accepted:
+            return results
+
+        descriptions = [description for _, description in accepted]
+        categories = []
+        for scores in self.keyword_classifier.scores_many(descriptions):
+            matched = self.keyword_classifier.classify(None, 'problem_categories', scores=scores)
+            categories.append(matched[0][0] if matched else "Inne")
+
+        gmina_name = session.get('gmina_context', {}).get('gmina') if has_session() else None
+        try:
+            tickets = self.tickets.create_many(list(zip(descriptions, categories)), gmina=gmina_name, source=source)
+        except Exception as e:
+            logger.exception("[TICKETS] Nie udało się zapisać paczki %d zgłoszeń: %s", len(accepted), e)
+            for result, _ in accepted:
+                result.error = 'storage_error'
+            return results
+
+        for (result, _), ticket in zip(accepted, tickets):
+            result.id = ticket['id']
+            result.category = ticket['category']
+            result.status = ticket['status']
+        logger.info("[TICKETS] Przyjęto paczkę: %d zgłoszeń, %d odrzuconych",
+                    len(accepted), len(results) - len(accepted))
+        return results
+
     def _handle_sprawdz_gmine(self):
         """Sprawdzanie gminy z inteligentnym wyszukiwaniem"""
-        session['search_mode'] = True
-        session['search_context'] = 'gmina_check'
-        session.modified = True
+        self._enter_search_mode('gmina_check')
         
         return {
             'text_message': """🏛️ **Weryfikacja Gminy - System Centralny**
@@ -599,11 +824,21 @@ Możesz wpisać pełną nazwę lub jej fragment.""",
         }
 
     def _handle_default_action(self, action):
-        """Obsługa domyślnych akcji"""
-        # Quick actions dla kontaktów
-        if action == 'quick_sekretariat':
-            return {
-                'text_message': """📞 **Sekretariat Urzędu Gminy**
+        """Obsługa domyślnych akcji - odpowiedź z rejestru akcji"""
+        gmina_name = session['gmina_context']['gmina'] if has_session() and 'gmina_context' in session else None
+        return self.actions.dispatch(action, gmina_name, self.catalog_for(gmina_name).version)
+
+    def _handle_unknown_action(self, action):
+        """Odpowiedź dla akcji bez zarejestrowanego handlera"""
+        return {
+            'text_message': 'Wybrana opcja jest już dostępna. Skorzystaj z wyszukiwania lub wybierz inną opcję.',
+            'buttons': [{'text': '↩️ Menu główne', 'action': 'main_menu'}]
+        }
+
+    def _handle_quick_sekretariat(self):
+        """Szybki kontakt - sekretariat urzędu"""
+        return {
+            'text_message': """📞 **Sekretariat Urzędu Gminy**
 
 🏢 Sekretariat - pierwszy kontakt
 ⏰ Godziny pracy: Pon-Pt: 7:30-15:30
@@ -613,15 +848,16 @@ Możesz wpisać pełną nazwę lub jej fragment.""",
 📠 Fax: +48 123 456 701
 
 💡 Sekretariat pomoże w przekierowaniu do właściwego wydziału.""",
-                'buttons': [
-                    {'text': '🔍 Znajdź inny kontakt', 'action': 'znajdz_kontakt'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        elif action == 'quick_finanse':
-            return {
-                'text_message': """💰 **Referat Finansowy**
+            'buttons': [
+                {'text': '🔍 Znajdź inny kontakt', 'action': 'znajdz_kontakt'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_finanse(self):
+        """Szybki kontakt - referat finansowy"""
+        return {
+            'text_message': """💰 **Referat Finansowy**
 
 Zakres spraw:
 • Podatki lokalne
@@ -634,16 +870,17 @@ Zakres spraw:
 ⏰ Godziny: Pon-Pt: 8:00-16:00
 
 🏦 Kasa urzędu: Pon-Pt: 8:00-14:00""",
-                'buttons': [
-                    {'text': '📋 Formularze podatkowe', 'action': 'quick_form_podatki'},
-                    {'text': '🔍 Znajdź inny kontakt', 'action': 'znajdz_kontakt'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        elif action == 'quick_budownictwo':
-            return {
-                'text_message': """🏗️ **Referat Architektury i Budownictwa**
+            'buttons': [
+                {'text': '📋 Formularze podatkowe', 'action': 'quick_form_podatki'},
+                {'text': '🔍 Znajdź inny kontakt', 'action': 'znajdz_kontakt'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_budownictwo(self):
+        """Szybki kontakt - referat architektury i budownictwa"""
+        return {
+            'text_message': """🏗️ **Referat Architektury i Budownictwa**
 
 📋 **Najczęstsze sprawy:**
 • Pozwolenia na budowę
@@ -656,20 +893,20 @@ Zakres spraw:
 ⏰ Przyjęcia: Pon, Śr, Pt: 8:00-15:00
 
 ⚠️ **UWAGA:** Dokumenty składaj minimum 30 dni przed planowanym rozpoczęciem prac!""",
-                'buttons': [
-                    {'text': '📥 Pobierz wniosek PB-1', 'action': 'download_PB-1'},
-                    {'text': '📋 Wszystkie formularze', 'action': 'pobierz_formularz'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
+            'buttons': [
+                {'text': '📥 Pobierz wniosek PB-1', 'action': 'download_PB-1'},
+                {'text': '📋 Wszystkie formularze', 'action': 'pobierz_formularz'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_form_odpady(self):
+        """Formularze gospodarki odpadami z katalogu gminy"""
+        forms = [f for f in self.catalog_for().search_database['forms'] if f['category'] == 'odpady']
+        form_list = '\n'.join([f"• {f['name']} ({f['code']})" for f in forms])
         
-        # Quick actions dla formularzy
-        elif action == 'quick_form_odpady':
-            forms = [f for f in self.search_database['forms'] if f['category'] == 'odpady']
-            form_list = '\n'.join([f"• {f['name']} ({f['code']})" for f in forms])
-            
-            return {
-                'text_message': f"""🗑️ **Formularze - Gospodarka Odpadami**
+        return {
+            'text_message': f"""🗑️ **Formularze - Gospodarka Odpadami**
 
 Dostępne formularze:
 {form_list}
@@ -677,16 +914,17 @@ Dostępne formularze:
 ✅ Wszystkie formularze z tej kategorii są dostępne online!
 
 💡 Pamiętaj o terminach składania deklaracji.""",
-                'buttons': [
-                    {'text': '📥 Pobierz deklarację DO-1', 'action': 'download_DO-1'},
-                    {'text': '🔍 Szukaj innych formularzy', 'action': 'pobierz_formularz'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        elif action == 'quick_form_budownictwo':
-            return {
-                'text_message': """🏠 **Formularze Budowlane - TOP 3**
+            'buttons': [
+                {'text': '📥 Pobierz deklarację DO-1', 'action': 'download_DO-1'},
+                {'text': '🔍 Szukaj innych formularzy', 'action': 'pobierz_formularz'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_form_budownictwo(self):
+        """Najczęstsze formularze budowlane"""
+        return {
+            'text_message': """🏠 **Formularze Budowlane - TOP 3**
 
 1️⃣ **Pozwolenie na budowę (PB-1)**
    ⚠️ Wymaga wizyty w urzędzie
@@ -699,16 +937,17 @@ Dostępne formularze:
 
 📞 Konsultacje: +48 123 456 730
 💡 **PORADA:** Najpierw sprawdź plan zagospodarowania!""",
-                'buttons': [
-                    {'text': '📥 Pobierz formularze', 'action': 'pobierz_formularz'},
-                    {'text': '☎️ Kontakt do wydziału', 'action': 'quick_budownictwo'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        elif action == 'quick_form_srodowisko':
-            return {
-                'text_message': """🌳 **Formularze Środowiskowe**
+            'buttons': [
+                {'text': '📥 Pobierz formularze', 'action': 'pobierz_formularz'},
+                {'text': '☎️ Kontakt do wydziału', 'action': 'quick_budownictwo'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_form_srodowisko(self):
+        """Formularze ochrony środowiska"""
+        return {
+            'text_message': """🌳 **Formularze Środowiskowe**
 
 🌲 **Wycinka drzew (WD-1)**
 ✅ Online | Termin: 30 dni
@@ -721,17 +960,17 @@ Dostępne formularze:
 
 📞 Ekodoradca: +48 123 456 760
 💚 Dbamy o środowisko razem!""",
-                'buttons': [
-                    {'text': '🌲 Wniosek o wycinkę', 'action': 'download_WD-1'},
-                    {'text': '♻️ Dotacja na piec', 'action': 'download_WP-1'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        # Quick actions dla problemów
-        elif action == 'quick_problem_drogi':
-            return {
-                'text_message': """🚧 **Zgłaszanie Problemów Drogowych**
+            'buttons': [
+                {'text': '🌲 Wniosek o wycinkę', 'action': 'download_WD-1'},
+                {'text': '♻️ Dotacja na piec', 'action': 'download_WP-1'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_problem_drogi(self):
+        """Zgłaszanie problemów drogowych"""
+        return {
+            'text_message': """🚧 **Zgłaszanie Problemów Drogowych**
 
 📱 **SZYBKIE ZGŁOSZENIE:**
 Wyślij SMS na numer: 799-123-456
@@ -747,19 +986,20 @@ drogi@gmina.pl (załącz zdjęcie!)
 • Dziury: 3-5 dni
 • Chodniki: 7-14 dni
 • Oznakowanie: 24-48h""",
-                'enable_search': True,
-                'search_placeholder': 'Opisz problem (np. "dziura na Głównej 15")...',
-                'search_context': 'problems',
-                'buttons': [
-                    {'text': '📸 Wyślij ze zdjęciem', 'action': 'send_with_photo'},
-                    {'text': '🗺️ Pokaż na mapie', 'action': 'show_map'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        elif action == 'quick_problem_oswietlenie':
-            return {
-                'text_message': """💡 **Awarie Oświetlenia - EKSPRESOWA NAPRAWA**
+            'enable_search': True,
+            'search_placeholder': 'Opisz problem (np. "dziura na Głównej 15")...',
+            'search_context': 'problems',
+            'buttons': [
+                {'text': '📸 Wyślij ze zdjęciem', 'action': 'send_with_photo'},
+                {'text': '🗺️ Pokaż na mapie', 'action': 'show_map'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_problem_oswietlenie(self):
+        """Zgłaszanie awarii oświetlenia"""
+        return {
+            'text_message': """💡 **Awarie Oświetlenia - EKSPRESOWA NAPRAWA**
 
 🔴 **ZGŁOŚ AWARIĘ W 30 SEKUND:**
 
@@ -774,19 +1014,20 @@ drogi@gmina.pl (załącz zdjęcie!)
 
 🔧 Ekipa dyżurna 24/7/365
 📞 Dyspozytor: +48 123 456 799""",
-                'enable_search': True,
-                'search_placeholder': 'Podaj lokalizację awarii (ulica, nr słupa)...',
-                'search_context': 'problems',
-                'buttons': [
-                    {'text': '🆘 Zgłoś pilną awarię', 'action': 'urgent_lighting'},
-                    {'text': '📱 Status napraw', 'action': 'repair_status'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        elif action == 'quick_problem_odpady':
-            return {
-                'text_message': """🗑️ **Problemy z Odpadami - SZYBKA INTERWENCJA**
+            'enable_search': True,
+            'search_placeholder': 'Podaj lokalizację awarii (ulica, nr słupa)...',
+            'search_context': 'problems',
+            'buttons': [
+                {'text': '🆘 Zgłoś pilną awarię', 'action': 'urgent_lighting'},
+                {'text': '📱 Status napraw', 'action': 'repair_status'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_problem_odpady(self):
+        """Zgłaszanie problemów z odpadami"""
+        return {
+            'text_message': """🗑️ **Problemy z Odpadami - SZYBKA INTERWENCJA**
 
 📅 **Harmonogram wywozu:**
 • Zmieszane: PONIEDZIAŁKI
@@ -802,20 +1043,22 @@ drogi@gmina.pl (załącz zdjęcie!)
 • Nieodebrane: do 24h
 • Przepełniony kontener: do 48h
 • Dzikie wysypisko: do 72h""",
-                'enable_search': True,
-                'search_placeholder': 'Opisz problem ze śmieciami...',
-                'search_context': 'problems',
-                'buttons': [
-                    {'text': '📅 Harmonogram', 'action': 'waste_schedule'},
-                    {'text': '♻️ Punkty PSZOK', 'action': 'pszok_locations'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        # Status zgłoszenia
-        elif action == 'status_zgloszenia':
-            return {
-                'text_message': """📊 **Sprawdzanie Statusu Zgłoszenia**
+            'enable_search': True,
+            'search_placeholder': 'Opisz problem ze śmieciami...',
+            'search_context': 'problems',
+            'buttons': [
+                {'text': '📅 Harmonogram', 'action': 'waste_schedule'},
+                {'text': '♻️ Punkty PSZOK', 'action': 'pszok_locations'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_status_zgloszenia(self):
+        """Sprawdzanie statusu zgłoszenia"""
+        self._enter_search_mode('status_check')
+
+        return {
+            'text_message': """📊 **Sprawdzanie Statusu Zgłoszenia**
 
 Aby sprawdzić status, potrzebuję numeru zgłoszenia (format: ZGL-XXXXX).
 
@@ -823,19 +1066,19 @@ Możesz również:
 • Zalogować się do ePUAP
 • Zadzwonić: +48 123 456 799
 • Odwiedzić urząd osobiście""",
-                'enable_search': True,
-                'search_placeholder': 'Wpisz numer zgłoszenia (np. ZGL-12345)...',
-                'search_context': 'status_check',
-                'buttons': [
-                    {'text': '➕ Nowe zgłoszenie', 'action': 'zglos_problem'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        # Dodatkowe akcje dla formularzy podatkowych
-        elif action == 'quick_form_podatki':
-            return {
-                'text_message': """💰 **Formularze Podatkowe - E-DEKLARACJE**
+            'enable_search': True,
+            'search_placeholder': 'Wpisz numer zgłoszenia (np. ZGL-12345)...',
+            'search_context': 'status_check',
+            'buttons': [
+                {'text': '➕ Nowe zgłoszenie', 'action': 'zglos_problem'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _handle_quick_form_podatki(self):
+        """Formularze podatkowe"""
+        return {
+            'text_message': """💰 **Formularze Podatkowe - E-DEKLARACJE**
 
 📊 **Najważniejsze terminy 2024:**
 • Do 31.01 - Deklaracja od nieruchomości
@@ -849,16 +1092,11 @@ Możesz również:
 
 📞 Konsultant: +48 123 456 707
 💬 Czat online: pon-pt 8-16""",
-                'buttons': [
-                    {'text': '🧮 Kalkulator podatku', 'action': 'tax_calculator'},
-                    {'text': '📥 Pobierz deklarację', 'action': 'download_DN-1'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
-        
-        return {
-            'text_message': 'Wybrana opcja jest już dostępna. Skorzystaj z wyszukiwania lub wybierz inną opcję.',
-            'buttons': [{'text': '↩️ Menu główne', 'action': 'main_menu'}]
+            'buttons': [
+                {'text': '🧮 Kalkulator podatku', 'action': 'tax_calculator'},
+                {'text': '📥 Pobierz deklarację', 'action': 'download_DN-1'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
         }
 
     def get_bot_response(self, user_message):
@@ -896,48 +1134,46 @@ Możesz również:
         return self._process_smart_intent(user_message)
 
     def _process_gmina_verification(self, gmina_name):
-        """Weryfikacja gminy"""
-        gmina_name = gmina_name.strip()
-        
-        # Symulacja weryfikacji w bazie
-        known_gminas = [
-            {'name': 'Warszawa', 'type': 'miasto stołeczne', 'voivodeship': 'mazowieckie'},
-            {'name': 'Kraków', 'type': 'miasto na prawach powiatu', 'voivodeship': 'małopolskie'},
-            {'name': 'Gdańsk', 'type': 'miasto na prawach powiatu', 'voivodeship': 'pomorskie'},
-            {'name': 'Wrocław', 'type': 'miasto na prawach powiatu', 'voivodeship': 'dolnośląskie'},
-            {'name': 'Poznań', 'type': 'miasto na prawach powiatu', 'voivodeship': 'wielkopolskie'},
-            {'name': 'Gorzów Wielkopolski', 'type': 'miasto na prawach powiatu', 'voivodeship': 'lubuskie'},
-        ]
-        
-        found = None
-        for gmina in known_gminas:
-            if gmina_name.lower() in gmina['name'].lower():
-                found = gmina
-                break
-        
-        if found:
+        """Weryfikacja gminy w rejestrze TERYT"""
+        gmina_name = gmina_name.strip()[:MAX_GMINA_NAME_LENGTH]
+
+        matches = self.teryt.search(gmina_name, SUGGESTION_LIMIT)
+        # Jednoznaczne trafienie: jedyna gmina o tej nazwie albo jedyny wynik
+        exact = [municipality for municipality, match_class, _ in matches if match_class == EXACT]
+        if len(exact) == 1 or len(matches) == 1:
+            return self._gmina_verified_reply(exact[0] if exact else matches[0][0])
+
+        if matches:
+            # Kilka gmin (np. ta sama nazwa w różnych województwach) - wybór z listy
             return {
-                'text_message': f"""✅ **Gmina zweryfikowana pomyślnie!**
+                'text_message': f"""🔍 **Gminy pasujące do "{gmina_name}": {len(matches)}**
 
-🏛️ **{found['name']}**
-📍 Typ: {found['type'].title()}
-🗺️ Województwo: {found['voivodeship'].title()}
+Wybierz właściwą gminę z listy.""",
+                'suggestions': [
+                    self._gmina_suggestion(municipality, self.teryt.score(match_class, distance))
+                    for municipality, match_class, distance in matches
+                ],
+                'enable_search': True,
+                'search_context': 'gmina_check'
+            }
 
-📊 **Dane z Centralnej Ewidencji:**
-• Status: Aktywna
-• Kod TERYT: {random.randint(100000, 999999)}
-• Liczba mieszkańców: {random.randint(10000, 500000):,}
-• Powierzchnia: {random.randint(50, 500)} km²
+        if not self.teryt.complete:
+            # Dołączony wykaz nie obejmuje wszystkich gmin - nie można stwierdzić, że gmina nie istnieje
+            return {
+                'text_message': f"""ℹ️ **Nie można potwierdzić gminy "{gmina_name}"**
+
+Gminy nie ma w dostępnym wykazie TERYT - wykaz jest niepełny ({len(self.teryt)} z {NATIONAL_GMINAS} gmin).
+Sprawdź gminę bezpośrednio w rejestrze TERYT GUS.
 
-🔗 Więcej informacji: https://stat.gov.pl/teryt/""",
+🔗 https://eteryt.stat.gov.pl/""",
                 'buttons': [
                     {'text': '🔍 Sprawdź inną gminę', 'action': 'sprawdz_gmine'},
                     {'text': '↩️ Menu główne', 'action': 'main_menu'}
                 ]
             }
-        else:
-            return {
-                'text_message': f"""⚠️ **Nie znaleziono gminy "{gmina_name}"**
+
+        return {
+            'text_message': f"""⚠️ **Nie znaleziono gminy "{gmina_name}"**
 
 Sprawdź pisownię lub spróbuj:
 • Wpisać pełną nazwę gminy
@@ -945,33 +1181,66 @@ Sprawdź pisownię lub spróbuj:
 • Sprawdzić w bazie TERYT
 
 💡 Możesz też skontaktować się z GUS.""",
-                'buttons': [
-                    {'text': '🔍 Spróbuj ponownie', 'action': 'sprawdz_gmine'},
-                    {'text': '↩️ Menu główne', 'action': 'main_menu'}
-                ]
-            }
+            'buttons': [
+                {'text': '🔍 Spróbuj ponownie', 'action': 'sprawdz_gmine'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
+
+    def _gmina_verified_reply(self, municipality):
+        """Dane gminy z rejestru TERYT"""
+        # Dołączony wykaz ma nazwy tylko powiatów grodzkich
+        powiat = f"\n🏙️ Powiat: {municipality.powiat}" if municipality.powiat else ''
+        return {
+            'text_message': f"""✅ **Gmina zweryfikowana pomyślnie!**
+
+🏛️ **{municipality.name}**
+📍 Typ: {municipality.kind.title()}
+🗺️ Województwo: {municipality.voivodeship.title()}{powiat}
+
+📊 **Dane z rejestru TERYT (TERC):**
+• Status: Aktywna
+• Kod TERYT: {municipality.teryt}
+• Stan na: {municipality.updated or 'brak danych'}
+
+🔗 Więcej informacji: https://eteryt.stat.gov.pl/""",
+            'buttons': [
+                {'text': '🔍 Sprawdź inną gminę', 'action': 'sprawdz_gmine'},
+                {'text': '↩️ Menu główne', 'action': 'main_menu'}
+            ]
+        }
 
     def _process_status_check(self, ticket_number):
-        """Sprawdzanie statusu zgłoszenia"""
-        if ticket_number.upper().startswith('ZGL-'):
-            statuses = ['W trakcie analizy', 'Przekazano do realizacji', 'W toku', 'Częściowo zrealizowane']
-            status = random.choice(statuses)
-            progress = random.randint(20, 80)
-            
+        """Sprawdzanie statusu zgłoszenia w rejestrze zgłoszeń"""
+        ticket_id = normalize_ticket_id(ticket_number)
+        if ticket_id is not None:
+            ticket = self.tickets.get(ticket_id)
+            if ticket is None:
+                return {
+                    'text_message': f"""🔍 **Nie znaleziono zgłoszenia {ticket_id}**
+
+Sprawdź numer w emailu potwierdzającym zgłoszenie lub zadzwoń: 📞 +48 123 456 799""",
+                    'buttons': [
+                        {'text': '🔍 Spróbuj ponownie', 'action': 'status_zgloszenia'},
+                        {'text': '↩️ Menu główne', 'action': 'main_menu'}
+                    ]
+                }
+
+            history = '\n'.join(
+                f"• {datetime.fromtimestamp(event['created_at']).strftime('%Y-%m-%d %H:%M')} - {event['status']}"
+                for event in ticket['events']
+            )
+            updated_at = ticket['events'][-1]['created_at'] if ticket['events'] else ticket['created_at']
             return {
-                'text_message': f"""📊 **Status zgłoszenia {ticket_number.upper()}**
+                'text_message': f"""📊 **Status zgłoszenia {ticket_id}**
 
-🔄 **Status:** {status}
-📈 **Postęp:** {progress}%
-👷 **Przydzielony do:** Zespół Infrastruktury
-📅 **Ostatnia aktualizacja:** {datetime.now().strftime('%Y-%m-%d %H:%M')}
+🔄 **Status:** {ticket['status']}
+🏷️ **Kategoria:** {ticket['category']}
+📅 **Data zgłoszenia:** {datetime.fromtimestamp(ticket['created_at']).strftime('%Y-%m-%d %H:%M')}
+📅 **Ostatnia aktualizacja:** {datetime.fromtimestamp(updated_at).strftime('%Y-%m-%d %H:%M')}
 
 📝 **Historia:**
-• {(datetime.now()).strftime('%Y-%m-%d')} - Zgłoszenie przyjęte
-• {(datetime.now()).strftime('%Y-%m-%d')} - Przekazano do wydziału
-• {(datetime.now()).strftime('%Y-%m-%d')} - Inspekcja terenowa
-
-⏳ **Przewidywane zakończenie:** 2-3 dni robocze""",
+{history}""",
                 'buttons': [
                     {'text': '🔄 Odśwież status', 'action': 'status_zgloszenia'},
                     {'text': '➕ Nowe zgłoszenie', 'action': 'zglos_problem'},
@@ -995,24 +1264,32 @@ Sprawdź numer w emailu potwierdzającym zgłoszenie.""",
 
     def _process_smart_intent(self, message):
         """Inteligentne rozpoznawanie intencji"""
-        message_lower = message.lower()
+        scores = self.keyword_classifier.scores(message)
+        handlers = {
+            'kontakt': self._handle_znajdz_kontakt_enterprise,
+            'formularz': self._handle_pobierz_formularz_enterprise,
+            'problem': self._handle_zglos_problem_enterprise,
+            'gmina': self._handle_sprawdz_gmine
+        }
+        
+        # Rozpoznawanie intencji - pierwsza dopasowana w kolejności priorytetu
+        for intent, _ in self.keyword_classifier.classify(message, 'intents', scores):
+            if intent in handlers:
+                return handlers[intent]()
         
-        # Rozpoznawanie intencji
-        if any(word in message_lower for word in ['kontakt', 'telefon', 'email', 'numer']):
-            return self._handle_znajdz_kontakt_enterprise()
-        elif any(word in message_lower for word in ['formularz', 'wniosek', 'dokument', 'pobierz']):
-            return self._handle_pobierz_formularz_enterprise()
-        elif any(word in message_lower for word in ['problem', 'zgłoś', 'zgłoszenie', 'awaria']):
-            return self._handle_zglos_problem_enterprise()
-        elif any(word in message_lower for word in ['gmina', 'sprawdź', 'weryfikuj']):
-            return self._handle_sprawdz_gmine()
+        # Temat rozpoznany z category_map - podpowiedź skrótu na górze przycisków
+        buttons = []
+        for topic, _ in self.keyword_classifier.classify(message, 'topics', scores)[:1]:
+            action = self.keyword_classifier.metadata[('topics', topic)].get('action')
+            if action:
+                buttons.append({'text': f'💡 {topic.capitalize()}', 'action': action})
         
         # Domyślna odpowiedź z sugestią
         return {
             'text_message': f"""🤔 Otrzymałem: "{message}"
 
 Nie jestem pewien, czego szukasz. Wybierz jedną z opcji poniżej lub sprecyzuj swoje pytanie.""",
-            'buttons': [
+            'buttons': buttons + [
                 {'text': '🔍 Znajdź Kontakt', 'action': 'znajdz_kontakt'},
                 {'text': '📋 Pobierz Formularz', 'action': 'pobierz_formularz'},
                 {'text': '⚠️ Zgłoś Problem', 'action': 'zglos_problem'},
@@ -1021,101 +1298,105 @@ Nie jestem pewien, czego szukasz. Wybierz jedną z opcji poniżej lub sprecyzuj
         }
 
 
+    def track_no_results(self, query, search_type='general'):
+        """
+        Rejestruje zapytanie bez wyników: dziennik eksportów, lokalny agregator
+        top fraz (gmina z sesji) i - dla wylosowanej próbki - event GA4.
+
+        Returns:
+            tuple: (zliczone lokalnie, event GA4 w kolejce)
+        """
+        if not query or not isinstance(query, str):
+            logger.warning("[GA4] ❌ Invalid query parameter")
+            return False, False
+        if search_type not in NO_RESULTS_SEARCH_TYPES:
+            logger.warning("[GA4] ⚠️ Invalid search_type: %s, using 'general'", search_type)
+            search_type = 'general'
+
+        # Dziennik dla eksportów operatorów i agregacja - bez wywołań sieciowych
+        self.no_results.record(query, search_type)
+        gmina_name = session.get('gmina_context', {}).get('gmina') if has_session() else None
+        aggregated = self.no_results_top.add(gmina_name, search_type, query)
+
+        ga4_sent = False
+        # Bez danych dostępowych GA4 (sprawdzone raz przy starcie) nic nie jest kolejkowane
+        if self.ga4_dispatcher.enabled and (self.ga4_sample_rate >= 1.0 or random.random() < self.ga4_sample_rate):
+            ga4_sent = self.send_ga4_no_results_event(query, search_type)
+        return aggregated, ga4_sent
+
     def send_ga4_no_results_event(self, query, search_type='general'):
         """
-        Wysyła event 'search_no_results' do Google Analytics 4 via Measurement Protocol
+        Kolejkuje event 'search_no_results' do Google Analytics 4 via Measurement Protocol
         RODO-COMPLIANT: Śledzi tylko anonimowe frazy, bez danych osobowych
+
+        Wysyłka odbywa się w tle (GA4Dispatcher) - metoda nie czeka na odpowiedź GA4.
+        Parametry waliduje track_no_results, a dane dostępowe GA4 sprawdzane są przy starcie.
         
         Args:
             query (str): Fraza wyszukiwania która nie zwróciła wyników
             search_type (str): Typ wyszukiwania ('contacts', 'forms', 'problems', 'general')
         
         Returns:
-            bool: True jeśli wysłano pomyślnie, False w przeciwnym razie
+            bool: True jeśli event trafił do kolejki wysyłki, False w przeciwnym razie
         """
         try:
-            # Input validation
-            if not query or not isinstance(query, str):
-                print("[GA4] ❌ Invalid query parameter")
-                return False
-                
-            if not hasattr(self, 'GA4_MEASUREMENT_ID') or not hasattr(self, 'GA4_API_SECRET'):
-                print("[GA4] ❌ Missing GA4 credentials. Initialize them in __init__")
-                return False
-                
-            if search_type not in ['contacts', 'forms', 'problems', 'general']:
-                print(f"[GA4] ⚠️ Invalid search_type: {search_type}, using 'general'")
-                search_type = 'general'
-                
-            import requests
-            import hashlib
-            import time
-            
             # RODO Compliance: Generowanie anonimowego client_id
             # Używamy tylko timestampu bez żadnych danych osobowych
             session_data = f"gmina_bot_{int(time.time() // 3600)}"  # Sesje godzinne
             client_id = hashlib.md5(session_data.encode()).hexdigest()
             
-            # GA4 Measurement Protocol endpoint
-            url = "https://www.google-analytics.com/mp/collect"
-            
-            # Request parameters
-            params = {
-                'measurement_id': GA4_MEASUREMENT_ID,
-                'api_secret': GA4_API_SECRET
-            }
-            
-            # Event payload - RODO compliant
-            payload = {
-                "client_id": client_id,  # Anonimowy identyfikator
-                "events": [{
-                    "name": "search_no_results",
-                    "params": {
-                        "search_term": query[:100],  # Ograniczenie długości dla GA4
-                        "search_type": search_type,
-                        "source": "gmina_ai_bot",
-                        "query_length": len(query),
-                        "timestamp": int(time.time()),
-                        "session_id": client_id[:16],
-                        # Dodatkowe parametry kontekstowe (bez PII)
-                        "gmina_context": "public_sector",
-                        "bot_version": "3.0"
-                    }
-                }]
+            # Event - RODO compliant
+            event = {
+                "name": "search_no_results",
+                "params": {
+                    "search_term": query[:100],  # Ograniczenie długości dla GA4
+                    "search_type": search_type,
+                    "source": "gmina_ai_bot",
+                    "query_length": len(query),
+                    "timestamp": int(time.time()),
+                    "session_id": client_id[:16],
+                    # Dodatkowe parametry kontekstowe (bez PII)
+                    "gmina_context": "public_sector",
+                    "bot_version": "3.0"
+                }
             }
+            if self.ga4_sample_rate < 1.0:
+                # Próbkowanie - w raportach GA4 liczby trzeba przeskalować przez 1/sample_rate
+                event["params"]["sample_rate"] = self.ga4_sample_rate
             
-            # Wysłanie żądania POST
-            response = requests.post(
-                url, 
-                params=params, 
-                json=payload, 
-                timeout=5  # 5 sekund timeout
-            )
-            
-            # Logowanie sukcesu/porażki
-            if response.status_code == 204:  # GA4 zwraca 204 przy sukcesie
-                print(f"[GA4] ✅ No results event sent: '{query}' ({search_type})")
+            # Kolejkowanie - paczki do 25 eventów wysyła wątek w tle
+            if self.ga4_dispatcher.submit(client_id, event):
                 return True
-            else:
-                print(f"[GA4] ❌ Failed to send event. Status: {response.status_code}")
-                if response.text:
-                    print(f"[GA4] Response: {response.text}")
-                return False
-                
-        except requests.exceptions.Timeout:
-            print(f"[GA4] ⏱️ Timeout sending no results event for: '{query}'")
-            return False
-        except requests.exceptions.RequestException as e:
-            print(f"[GA4] 🚫 Network error sending event: {e}")
-            return False
-        except ImportError:
-            print("[GA4] ⚠️ requests library not installed. Install with: pip install requests")
+
+            logger.warning("[GA4] ⚠️ Queue full, event dropped (%s)", search_type)
             return False
+                
         except Exception as e:
-            print(f"[GA4] 💥 Unexpected error sending event: {e}")
-            import traceback
-            traceback.print_exc()
-            return False  
+            logger.exception("[GA4] 💥 Unexpected error queueing event: %s", e)
+            return False
+
 
-     
-      
\ No newline at end of file
+class ShardSearcher(MatchRanking):
+    """
+    Scoring jednego shardu katalogu w procesie roboczym ShardPool.
+
+    Ta sama ścieżka top_matches (MatchRanking) co w GminaBot, ale bez
+    sesji, katalogów i GA4 - tylko indeks shardu i scorer.
+    """
+
+    def __init__(self, search_database):
+        self.batch_scorer = BatchScorer()
+        self.search_index = SearchIndex(search_database)
+        # Pozycja wpisu w sekcji shardu (ShardPool przelicza ją na pozycję w pełnym katalogu)
+        self.positions = {
+            id(entry): position
+            for section in self.search_index.sections.values()
+            for position, entry in enumerate(section['entries'])
+        }
+
+    def search(self, query, sections, limit, folded):
+        """Top-k shardu jako krotki (score, kolejność sekcji, pozycja w shardzie)"""
+        return [
+            (score, sections.index(section), self.positions[id(entry)])
+            for section, entry, score in self.top_matches(query, sections, limit, folded=folded)
+        ]
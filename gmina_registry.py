@@ -0,0 +1,125 @@
+"""gmina_registry.py - Ograniczony rejestr gmin aktywnych w sesjach Gmina-AI"""
+import sys
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+from catalog import approx_size
+
+# Dłuższe nazwy nie są nazwami gmin - chroni rejestr i sesję przed wrogim wejściem
+MAX_GMINA_NAME_LENGTH = 100
+
+
+def generated_basic_info(gmina_name):
+    """Dane podstawowe urzędu dla gminy bez własnego katalogu"""
+    slug = gmina_name.lower().replace(' ', '')
+    return MappingProxyType({
+        'name': f'Urząd Gminy {gmina_name}',
+        'address': f'ul. Główna 1, {gmina_name}',
+        'phone': '+48 123 456 789',
+        'email': f'kontakt@{slug}.pl',
+        'nip': '1234567890',
+        'regon': '123456789',
+        'bip': f'https://bip.{slug}.pl',
+        'epuap': f'/ug{slug}/skrytka'
+    })
+
+
+class GminaEntry:
+    """Wpis rejestru - dane urzędu oraz współdzielone (niemutowalne) tabele wydziałów i formularzy"""
+    __slots__ = ('name', 'version', 'basic_info', 'departments', 'forms', 'approx_bytes')
+
+    def __init__(self, name, version, basic_info, departments, forms):
+        self.name = name
+        self.version = version
+        self.basic_info = basic_info
+        self.departments = departments
+        self.forms = forms
+        # Własna pamięć wpisu liczona raz - tabele współdzielone wlicza katalog
+        self.approx_bytes = sys.getsizeof(self) + approx_size(name) + approx_size(basic_info)
+
+    def __getitem__(self, key):
+        # Zgodność z dotychczasowym dostępem gmina_data[nazwa]['forms']
+        return getattr(self, key)
+
+
+class GminaRegistry:
+    """
+    Rejestr gmin z limitem wpisów i wypieraniem LRU.
+
+    Zastępuje nieograniczony słownik gmina_data: każda nazwa gminy wysłana
+    do /gmina-bot/start dodawała wpis, który nigdy nie był usuwany. Tabele
+    wydziałów i formularzy nie są kopiowane per gmina - wpisy wskazują na
+    krotki współdzielone przez katalog.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.evictions = 0
+
+    def get_or_create(self, gmina_name, catalog):
+        """Zwraca wpis gminy, tworząc go (lub odświeżając po przeładowaniu katalogu)"""
+        with self._lock:
+            entry = self._entries.get(gmina_name)
+            if entry is not None and entry.version == catalog.version:
+                self._entries.move_to_end(gmina_name)
+                return entry
+
+            departments, forms = catalog.shared_tables
+            entry = GminaEntry(
+                gmina_name,
+                catalog.version,
+                catalog.shared_basic_info or generated_basic_info(gmina_name),
+                departments,
+                forms
+            )
+            previous = self._entries.pop(gmina_name, None)
+            if previous is not None:
+                self._bytes -= previous.approx_bytes
+            self._entries[gmina_name] = entry
+            self._bytes += entry.approx_bytes
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.approx_bytes
+                self.evictions += 1
+            return entry
+
+    def get(self, gmina_name, default=None):
+        with self._lock:
+            return self._entries.get(gmina_name, default)
+
+    def __contains__(self, gmina_name):
+        return gmina_name in self._entries
+
+    def __getitem__(self, gmina_name):
+        return self._entries[gmina_name]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def approx_bytes(self):
+        """
+        Przybliżony rozmiar rejestru - sumowany przy dodawaniu/usuwaniu wpisów.
+
+        Tabele wydziałów i formularzy należą do katalogów (CatalogStore.stats);
+        przechodzenie po nich przy każdym /health trwało sekundy dla dużych katalogów.
+        """
+        with self._lock:
+            return sys.getsizeof(self._entries) + self._bytes
+
+    def stats(self):
+        """Liczba wpisów i przybliżone zużycie pamięci"""
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'approx_bytes': self.approx_bytes(),
+            'evictions': self.evictions
+        }
@@ -0,0 +1,147 @@
+"""keyword_classifier.py - Skompilowany klasyfikator słów kluczowych Gmina-AI"""
+import json
+import os
+import re
+from bisect import bisect_right
+
+DEFAULT_KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'keywords.json')
+
+# Klucz końca słowa w drzewie trie (żaden znak nie jest pustym napisem)
+_END = ''
+# Granica tekstów w scores_many - znak nieobecny w słowach kluczowych
+_SEPARATOR = '\x00'
+
+
+def _trie_pattern(node):
+    """
+    Wyrażenie regularne z drzewa trie słów kluczowych.
+
+    Gałęzie zaczynają się różnymi znakami, a opcjonalne przedłużenia są
+    zachłanne - w danej pozycji dopasowuje się najdłuższe słowo kluczowe.
+    """
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char != _END]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if _END in node:
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+class KeywordClassifier:
+    """
+    Klasyfikator wielu tabel słów kluczowych w jednym przebiegu po tekście.
+
+    Wszystkie słowa kluczowe (ze wszystkich tabel) kompilowane są do jednego
+    wyrażenia w kształcie trie, sprawdzanego w lookahead na każdej pozycji -
+    koszt zależy od długości wiadomości, a nie od liczby słów. Najdłuższe
+    słowo dopasowane w danej pozycji rozwijane jest o słowa będące jego
+    prefiksami, więc wynik jest taki sam jak sprawdzanie `słowo in tekst`
+    dla każdego słowa (także dla nakładających się fraz, np. "zgłoszenie"
+    i "zgłoszenie budowlane").
+
+    Tabela: {nazwa_tabeli: [{"category": ..., "keywords": [...], ...}, ...]}.
+    Kolejność kategorii w tabeli to ich priorytet.
+    """
+
+    def __init__(self, tables, version=None):
+        self.version = version
+        self.tables = tables
+        # kategoria -> pozostałe pola wpisu (np. akcja przycisku)
+        self.metadata = {}
+        # słowo kluczowe -> [(tabela, kategoria)]
+        targets = {}
+        self._priority = {}
+
+        for table, categories in tables.items():
+            for priority, item in enumerate(categories):
+                category = item['category']
+                self._priority[(table, category)] = priority
+                self.metadata[(table, category)] = {
+                    key: value for key, value in item.items() if key not in ('category', 'keywords')
+                }
+                for keyword in item['keywords']:
+                    keyword = keyword.lower()
+                    if keyword:
+                        targets.setdefault(keyword, []).append((table, category))
+
+        # Dla najdłuższego dopasowania: wszystkie słowa kluczowe będące jego prefiksami
+        self._expansions = {
+            keyword: [target for prefix in targets if keyword.startswith(prefix) for target in targets[prefix]]
+            for keyword in targets
+        }
+
+        trie = {}
+        for keyword in targets:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[_END] = True
+        self._pattern = re.compile('(?=(' + _trie_pattern(trie) + '))') if targets else None
+
+    @classmethod
+    def from_file(cls, path=None):
+        """Ładuje tabele słów kluczowych z pliku JSON (domyślnie data/keywords.json)"""
+        path = path or os.getenv('GMINA_KEYWORDS_PATH', DEFAULT_KEYWORDS_PATH)
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['tables'], version=data.get('version'))
+
+    def scores(self, text):
+        """
+        Jeden przebieg po tekście - wyniki wszystkich tabel.
+
+        Returns:
+            dict: tabela -> {kategoria: liczba trafień słów kluczowych}
+        """
+        result = {}
+        if not text or self._pattern is None:
+            return result
+        for match in self._pattern.finditer(text.lower()):
+            for table, category in self._expansions[match.group(1)]:
+                categories = result.setdefault(table, {})
+                categories[category] = categories.get(category, 0) + 1
+        return result
+
+    def scores_many(self, texts):
+        """
+        Wyniki wielu tekstów jednym przebiegiem wyrażenia (np. paczka zgłoszeń).
+
+        Teksty łączone są separatorem, który nie występuje w słowach
+        kluczowych, więc dopasowanie nie przechodzi przez granicę tekstów;
+        trafienie przypisywane jest tekstowi po pozycji (bisect).
+
+        Returns:
+            list: dla każdego tekstu słownik jak w scores()
+        """
+        results = [{} for _ in texts]
+        if not texts or self._pattern is None:
+            return results
+        # lower() może zmienić długość tekstu - pozycje liczone po zamianie
+        lowered = [(text or '').lower() for text in texts]
+        starts = []
+        position = 0
+        for text in lowered:
+            starts.append(position)
+            position += len(text) + 1
+        joined = _SEPARATOR.join(lowered)
+        for match in self._pattern.finditer(joined):
+            result = results[bisect_right(starts, match.start()) - 1]
+            for table, category in self._expansions[match.group(1)]:
+                categories = result.setdefault(table, {})
+                categories[category] = categories.get(category, 0) + 1
+        return results
+
+    def classify(self, text, table, scores=None):
+        """
+        Wszystkie dopasowane kategorie tabeli z wynikami, w kolejności priorytetu.
+
+        Returns:
+            list: krotki (kategoria, liczba trafień); pusta lista gdy brak trafień
+        """
+        matched = (scores if scores is not None else self.scores(text)).get(table, {})
+        return sorted(matched.items(), key=lambda item: self._priority[(table, item[0])])
+
+    def category_keywords(self, table):
+        """Słownik kategoria -> słowa kluczowe (np. dawne GminaBot.category_map)"""
+        return {item['category']: list(item['keywords']) for item in self.tables.get(table, ())}
@@ -0,0 +1,179 @@
+"""metrics.py - Lekkie histogramy opóźnień gorących ścieżek w formacie Prometheus (/metrics)"""
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Granice kubełków [s]: od ułamków ms (cache, sesja) po sekundy (scoring dużych katalogów)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Metody HTTP z własną serią - pozostałe jako 'other'
+HTTP_METHODS = frozenset(('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'))
+
+
+class _Timer:
+    """Mierzy czas bloku with i zapisuje go w histogramie"""
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram:
+    """Jedna seria histogramu (konkretne wartości etykiet); observe to bisect i dwie inkrementacje"""
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # Ostatni kubełek to +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        position = bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += seconds
+
+    def time(self):
+        """Context manager: with histogram.time(): ..."""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class HistogramFamily:
+    """Histogram z nazwanymi etykietami - serie tworzone przy pierwszym użyciu wartości"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values):
+        """Seria dla wartości etykiet (w kolejności labelnames)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name}: oczekiwano etykiet {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def observe(self, seconds):
+        self.labels().observe(seconds)
+
+    def time(self):
+        return self.labels().time()
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.documentation}')
+        lines.append(f'# TYPE {self.name} histogram')
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values))
+            prefix = labels + ',' if labels else ''
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {total!r}')
+            lines.append(f'{self.name}_count{suffix} {cumulative}')
+
+
+def http_method(method):
+    """Etykieta metody HTTP (ograniczony zbiór wartości)"""
+    return method if method in HTTP_METHODS else 'other'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    Rejestr histogramów renderowany w formacie tekstowym Prometheus.
+
+    Metryki są per proces - przy kilku workerach gunicorna każdy scrape
+    trafia do jednego z nich (w trybie ASGI jest jeden proces).
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Rejestruje histogram (ponowne wywołanie z tą samą nazwą zwraca istniejący)"""
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = HistogramFamily(name, documentation, labelnames, buckets)
+            return family
+
+    def render(self):
+        """Wszystkie metryki jako tekst /metrics"""
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            family.render(lines)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Opóźnienie endpointów HTTP (app.py i asgi.py) - od odebrania żądania po gotową odpowiedź
+REQUEST_SECONDS = REGISTRY.histogram(
+    'gmina_http_request_seconds', 'Czas obsługi żądania HTTP per endpoint', ('endpoint', 'method', 'status')
+)
+
+
+class WSGIMetrics:
+    """
+    Middleware WSGI mierzące czas żądań do REQUEST_SECONDS (łącznie z zapisem sesji).
+
+    Endpoint to nazwa reguły Flaska dla ścieżek bez parametrów, dla innych
+    ścieżek 'other' - liczba serii nie rośnie z dowolnymi URL-ami.
+    """
+
+    def __init__(self, wsgi_app, endpoints):
+        self.wsgi_app = wsgi_app
+        self.endpoints = endpoints
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        status = []
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status.append(status_line.split(' ', 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, recording_start_response)
+        finally:
+            REQUEST_SECONDS.labels(
+                self.endpoints.get(environ.get('PATH_INFO'), 'other'),
+                http_method(environ.get('REQUEST_METHOD')),
+                status[0] if status else '500'
+            ).observe(time.perf_counter() - started)
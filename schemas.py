@@ -0,0 +1,171 @@
+"""schemas.py - Typowane struktury zapytań i odpowiedzi API Gmina-AI (msgspec)"""
+from typing import Any, Optional, Union
+
+import msgspec
+from flask import Response
+
+# Enkoder współdzielony przez wszystkie endpointy (encode jest bezpieczne wątkowo)
+_encoder = msgspec.json.Encoder()
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Wierszy NDJSON w jednym kawałku strumienia odpowiedzi
+NDJSON_CHUNK = 256
+
+
+class Suggestion(msgspec.Struct):
+    """
+    Sugestia wyszukiwania predykcyjnego (budowana tylko dla zwycięzców top-k).
+
+    Niesie tylko pola wyświetlane i identyfikator rekordu - pełny rekord
+    serwer odczytuje z indeksu katalogu przy wyborze sugestii.
+    """
+    id: str
+    type: str
+    icon: str
+    title: str
+    subtitle: str
+    details: str
+    score: int
+
+
+class Selection(msgspec.Struct):
+    """Wybór sugestii odsyłany przez klienta - tylko identyfikator rekordu"""
+    id: str = ''
+
+
+class SearchResponse(msgspec.Struct):
+    """Odpowiedź /gmina-bot/search"""
+    suggestions: list[Suggestion]
+
+
+class BotResponse(msgspec.Struct):
+    """
+    Odpowiedź bota: {'reply': ...}.
+
+    Treść odpowiedzi to dict budowany przez GminaBot (pola zależą od akcji:
+    text_message, buttons, enable_search, suggestions, ...) - może zawierać
+    struktury Suggestion, enkoder obsługuje je bezpośrednio.
+    """
+    reply: dict
+
+
+class StartRequest(msgspec.Struct):
+    """Ciało /gmina-bot/start - nazwa gminy walidowana przez set_gmina_context"""
+    gmina: Any = None
+
+
+class SendRequest(msgspec.Struct):
+    """Ciało /gmina-bot/send - wiadomość, akcja przycisku albo wybór sugestii"""
+    message: str = ''
+    button_action: str = ''
+    selection_data: Optional[Selection] = None
+
+
+class SearchRequest(msgspec.Struct):
+    """Ciało /gmina-bot/search (frontend wysyła context null poza trybem wyszukiwania)"""
+    query: str = ''
+    context: Optional[str] = ''
+
+
+class CustomInputRequest(msgspec.Struct):
+    """Ciało /gmina-bot/process-custom"""
+    custom_input: str = ''
+    type: str = 'problem'
+
+
+class NoResultsRequest(msgspec.Struct):
+    """Ciało /gmina-bot/track-no-results"""
+    query: str = ''
+    search_type: str = 'general'
+
+
+class BulkProblem(msgspec.Struct):
+    """Zgłoszenie w paczce /gmina-bot/process-custom-batch (ref - identyfikator nadawcy, odsyłany w wyniku)"""
+    description: str = ''
+    ref: Union[str, int, None] = None
+
+
+class BulkResult(msgspec.Struct, omit_defaults=True):
+    """Wynik jednego zgłoszenia paczki - numer i kategoria albo kod błędu"""
+    index: int
+    ref: Union[str, int, None] = None
+    id: Optional[str] = None
+    category: Optional[str] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+
+_bulk_array_decoder = msgspec.json.Decoder(list[Union[str, BulkProblem]])
+_bulk_line_decoder = msgspec.json.Decoder(Union[str, BulkProblem])
+
+
+def decode_bulk(data):
+    """
+    Dekoduje paczkę zgłoszeń: tablicę JSON albo NDJSON (obiekt lub napis w wierszu).
+
+    Returns:
+        list: BulkProblem dla każdego zgłoszenia, None dla niepoprawnego
+            wiersza NDJSON (puste wiersze są pomijane); None, gdy ciało jest
+            puste albo tablica jest niepoprawna
+    """
+    if not data or not data.strip():
+        return None
+    if data.lstrip()[:1] == b'[':
+        try:
+            items = _bulk_array_decoder.decode(data)
+        except msgspec.DecodeError:
+            return None
+        return [BulkProblem(item) if isinstance(item, str) else item for item in items]
+
+    problems = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = _bulk_line_decoder.decode(line)
+        except msgspec.DecodeError:
+            problems.append(None)
+            continue
+        problems.append(BulkProblem(item) if isinstance(item, str) else item)
+    return problems
+
+
+def decode_request(data, struct_type):
+    """
+    Dekoduje ciało zapytania JSON wprost do struktury.
+
+    Returns:
+        instancja struct_type lub None dla pustego/niepoprawnego ciała
+        (nie-JSON, nie-obiekt, pola złego typu)
+    """
+    if not data:
+        return None
+    try:
+        return msgspec.json.decode(data, type=struct_type)
+    except msgspec.DecodeError:  # ValidationError dziedziczy po DecodeError
+        return None
+
+
+def encode(obj):
+    """Koduje strukturę (lub dict/listę ze strukturami) do bajtów JSON"""
+    return _encoder.encode(obj)
+
+
+def encode_lines(items, chunk=NDJSON_CHUNK):
+    """Generator kawałków NDJSON (po `chunk` wierszy) - strumień odpowiedzi bez budowania całego ciała"""
+    for start in range(0, len(items), chunk):
+        yield b''.join(_encoder.encode(item) + b'\n' for item in items[start:start + chunk])
+
+
+def encode_reply(reply):
+    """Ciało odpowiedzi {'reply': ...} (także do cache odpowiedzi statycznych)"""
+    return _encoder.encode(BotResponse(reply))
+
+
+class JSONResponse(Response):
+    """Odpowiedź Flask z ciałem zakodowanym szybkim enkoderem msgspec (UTF-8, bez escapowania)"""
+    default_mimetype = 'application/json'
+
+    @classmethod
+    def of(cls, obj, status=200):
+        return cls(_encoder.encode(obj), status=status)
@@ -0,0 +1,113 @@
+"""scoring.py - Wsadowy silnik scoringu fuzzy (RapidFuzz + NumPy) dla Gmina-AI"""
+from fuzzywuzzy import fuzz, utils
+
+try:
+    import numpy as np
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:  # Brak RapidFuzz/NumPy - pozostaje scoring element po elemencie
+    np = None
+    rf_fuzz = rf_process = None
+
+# Wagi scorerów - identyczne jak w GminaBot.calculate_match_score
+WEIGHTS = {'ratio': 0.2, 'partial_ratio': 0.4, 'token_sort': 0.2, 'token_set': 0.2}
+
+# Tolerancja, poniżej której wynik uznajemy za "x.5" i liczymy go przez fuzzywuzzy
+_HALF_TOLERANCE = 1e-7
+
+
+def sorted_tokens(text):
+    """Napis porównywany przez token_sort_ratio (full_process + posortowane tokeny)"""
+    return ' '.join(sorted(utils.full_process(text, force_ascii=True).split()))
+
+
+class BatchScorer:
+    """
+    Liczy wyniki calculate_match_score dla całego korpusu jednym wywołaniem.
+
+    ratio, token_sort_ratio i token_set_ratio liczone są przez
+    rapidfuzz.process.cdist, a średnia ważona i próg - w NumPy.
+    Wyniki są identyczne z fuzzywuzzy:
+    - wartości leżące na granicy zaokrąglenia (x.5) są przeliczane przez fuzzywuzzy,
+    - partial_ratio w RapidFuzz jest optymalnym dopasowaniem, więc stanowi
+      górną granicę heurystyki fuzzywuzzy; dokładny partial_ratio liczony jest
+      tylko dla rekordów, które z tą granicą mogą przekroczyć próg.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers
+
+    @property
+    def available(self):
+        """Czy RapidFuzz i NumPy są zainstalowane"""
+        return rf_process is not None
+
+    def _cdist(self, queries, texts, scorer, exact):
+        """Macierz wyników scorera RapidFuzz z korektą zaokrągleń do fuzzywuzzy"""
+        raw = rf_process.cdist(queries, texts, scorer=scorer, dtype=np.float64, workers=self.workers)
+        scores = np.rint(raw)
+
+        ambiguous = np.abs(raw - np.floor(raw) - 0.5) < _HALF_TOLERANCE
+        for row, col in zip(*np.nonzero(ambiguous)):
+            scores[row, col] = exact(queries[row], texts[col])
+        return scores
+
+    def score_matrix(self, queries, texts, sorted_texts=None, threshold=None):
+        """
+        Zwraca macierz wyników (len(queries) x len(texts)) jako int.
+
+        Jeśli podano threshold, rekordy które na pewno nie przekroczą progu
+        dostają 0 zamiast dokładnego wyniku (bez liczenia partial_ratio).
+        """
+        queries = [query.lower().strip() for query in queries]
+        texts = [text.lower() for text in texts]
+        if sorted_texts is None:
+            sorted_texts = [sorted_tokens(text) for text in texts]
+        sorted_queries = [sorted_tokens(query) for query in queries]
+        return self.score_keys(queries, sorted_queries, texts, sorted_texts, threshold)
+
+    def score_keys(self, queries, sorted_queries, texts, sorted_texts, threshold=None):
+        """
+        Jak score_matrix, ale na gotowych kluczach (bez lowercase i tokenizacji).
+
+        queries i texts muszą być już po lowercase (zapytania także po strip),
+        a sorted_* to wynik sorted_tokens() - tak jak w kluczach SearchIndex.
+        """
+        if not queries or not texts:
+            return np.zeros((len(queries), len(texts)), dtype=np.int64)
+
+        ratio = self._cdist(queries, texts, rf_fuzz.ratio, fuzz.ratio)
+        token_sort = self._cdist(sorted_queries, sorted_texts, rf_fuzz.ratio, fuzz.ratio)
+        token_set = self._cdist(sorted_queries, sorted_texts, rf_fuzz.token_set_ratio, fuzz.token_set_ratio)
+        partial_bound = np.rint(rf_process.cdist(
+            queries, texts, scorer=rf_fuzz.partial_ratio, dtype=np.float64, workers=self.workers
+        ))
+
+        partial = np.zeros_like(partial_bound)
+        if threshold is None:
+            exact_mask = np.ones(partial.shape, dtype=bool)
+        else:
+            upper = (
+                ratio * WEIGHTS['ratio'] +
+                partial_bound * WEIGHTS['partial_ratio'] +
+                token_sort * WEIGHTS['token_sort'] +
+                token_set * WEIGHTS['token_set']
+            )
+            exact_mask = upper >= threshold + 1
+
+        for row, col in zip(*np.nonzero(exact_mask)):
+            partial[row, col] = fuzz.partial_ratio(queries[row], texts[col])
+
+        weighted = (
+            ratio * WEIGHTS['ratio'] +
+            partial * WEIGHTS['partial_ratio'] +
+            token_sort * WEIGHTS['token_sort'] +
+            token_set * WEIGHTS['token_set']
+        )
+        scores = weighted.astype(np.int64)
+        if threshold is not None:
+            scores[~exact_mask] = 0
+        return scores
+
+    def score(self, query, texts, sorted_texts=None, threshold=None):
+        """Wyniki jednego zapytania dla listy tekstów"""
+        return self.score_matrix([query], texts, sorted_texts, threshold)[0]
@@ -0,0 +1,425 @@
+"""search_analytics.py - Zapytania bez wyników: dziennik (SQLite WAL) i lokalny agregator top fraz (Count-Min)"""
+import heapq
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+
+from ticket_store import connect_wal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANALYTICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'analytics.sqlite3')
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'no_results_top')
+
+# Jak w evencie GA4 - dłuższe frazy są przycinane
+MAX_QUERY_LENGTH = 100
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS no_results ('
+    'id INTEGER PRIMARY KEY, query TEXT NOT NULL, search_type TEXT NOT NULL, created_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS ix_no_results_created ON no_results (created_at)',
+)
+
+
+class NoResultsLog:
+    """
+    Zapytania bez wyników do eksportu dla operatorów (RODO: tylko fraza, typ i czas).
+
+    record() nie czeka na dysk: wpis trafia do ograniczonej kolejki, a wątek
+    w tle zapisuje wszystko, co się w niej zebrało, jedną transakcją co
+    flush_interval. Gdy kolejka jest pełna, wpis jest odrzucany i liczony
+    w `dropped` - analityka nie może spowolnić wyszukiwania.
+    """
+
+    def __init__(self, path=None, max_queue=10000, batch_size=500, flush_interval=1.0):
+        self.path = path or os.getenv('GMINA_ANALYTICS_PATH') or DEFAULT_ANALYTICS_PATH
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.recorded = 0
+        self.dropped = 0
+        self.failed = 0
+
+        connection = connect_wal(self.path)
+        try:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+        finally:
+            connection.close()
+
+    def _ensure_process(self):
+        # Kolejka i wątek zapisujący per proces (workery gunicorna po forku)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name='no-results-writer',
+                                            daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def record(self, query, search_type):
+        """Kolejkuje zapytanie bez wyników - False, gdy kolejka jest pełna"""
+        self._ensure_process()
+        try:
+            self._queue.put_nowait((query[:MAX_QUERY_LENGTH], search_type, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self, pending):
+        connection = connect_wal(self.path)
+        while True:
+            try:
+                rows = [pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break
+                continue
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    connection.executemany(
+                        'INSERT INTO no_results (query, search_type, created_at) VALUES (?, ?, ?)', rows
+                    )
+                    connection.execute('COMMIT')
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+                self.recorded += len(rows)
+            except Exception as e:
+                logger.error("[ANALYTICS] Błąd zapisu %d zapytań bez wyników: %s", len(rows), e)
+                self.failed += len(rows)
+        connection.close()
+
+    def close(self, timeout=5):
+        """Zapisuje zakolejkowane wpisy i zatrzymuje wątek (zamknięcie serwera)"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Liczniki do monitoringu"""
+        return {
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'pending': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+        }
+
+
+def normalize_phrase(query):
+    """Fraza do zliczania: małe litery, pojedyncze spacje, maks. MAX_QUERY_LENGTH znaków"""
+    return ' '.join(query.lower().split())[:MAX_QUERY_LENGTH]
+
+
+class CountMinSketch:
+    """
+    Szkic Count-Min: przybliżone liczniki w stałej pamięci (depth x width).
+
+    Oszacowanie nigdy nie jest zaniżone; zawyżenie ograniczają kolizje
+    w najmniej obciążonym wierszu. Aktualizacja konserwatywna (zwiększane
+    są tylko liczniki równe minimum) dodatkowo zmniejsza zawyżenie fraz
+    rzadkich. Indeksy z podwójnego haszowania jednego hash() - szkic żyje
+    tylko w procesie, więc losowy seed hash() nie przeszkadza.
+    """
+
+    def __init__(self, width=4096, depth=4):
+        self.width = width
+        self.depth = depth
+        self._counters = [0] * (width * depth)
+
+    def _cells(self, key):
+        value = hash(key)
+        first, step = value & 0xFFFFFFFF, ((value >> 32) & 0xFFFFFFFF) | 1
+        return [row * self.width + (first + row * step) % self.width for row in range(self.depth)]
+
+    def add(self, key):
+        """Zlicza wystąpienie i zwraca nowe oszacowanie"""
+        cells = self._cells(key)
+        counters = self._counters
+        estimate = min(counters[cell] for cell in cells) + 1
+        for cell in cells:
+            if counters[cell] < estimate:
+                counters[cell] = estimate
+        return estimate
+
+    def estimate(self, key):
+        return min(self._counters[cell] for cell in self._cells(key))
+
+
+class _TopPhrases:
+    """
+    Top-N fraz jednej grupy: słownik fraza -> oszacowanie i kopiec minimum.
+
+    Wpisy kopca unieważniane są leniwie (wzrost licznika dopisuje nowy wpis),
+    kopiec jest przebudowywany, gdy urośnie ponad 4 x limit.
+    """
+    __slots__ = ('limit', 'counts', 'heap')
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.counts = {}
+        self.heap = []
+
+    def offer(self, phrase, estimate):
+        counts = self.counts
+        if phrase in counts or len(counts) < self.limit:
+            counts[phrase] = estimate
+            heapq.heappush(self.heap, (estimate, phrase))
+            if len(self.heap) > 4 * self.limit:
+                self.heap = [(count, item) for item, count in counts.items()]
+                heapq.heapify(self.heap)
+            return
+        heap = self.heap
+        while counts.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        lowest, evicted = heap[0]
+        if estimate > lowest:
+            heapq.heapreplace(heap, (estimate, phrase))
+            del counts[evicted]
+            counts[phrase] = estimate
+
+    def items(self):
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+class NoResultsAggregator:
+    """
+    Najczęstsze frazy bez wyników per (gmina, typ wyszukiwania) w ograniczonej pamięci.
+
+    Jeden szkic Count-Min dla wszystkich grup (klucz to gmina, typ i fraza)
+    i top_n fraz na grupę; liczba grup jest ograniczona (max_groups), więc
+    pamięć nie rośnie z liczbą różnych fraz ani nazw gmin. Po wyczerpaniu
+    limitu nowa grupa wypiera najmniejszą - nazwy gmin przychodzą od
+    klienta, a śmieciowe grupy (po kilka fraz) wypierają wtedy siebie
+    nawzajem, nie aktywne gminy. Dodanie frazy to kilka operacji na
+    liczbach pod blokadą - bez I/O na ścieżce żądania.
+
+    Co snapshot_interval wątek w tle zapisuje stan procesu do pliku JSON
+    w snapshot_dir (zapis atomowy, plik per proces) i usuwa pliki starsze
+    niż retention. report() scala bieżący stan z plikami pozostałych
+    procesów (workery gunicorna, poprzednie uruchomienia z okresu
+    retention) - to źródło dla /admin/no-results.
+    """
+
+    def __init__(self, snapshot_dir=None, top_n=20, max_groups=4096, width=4096, depth=4,
+                 snapshot_interval=60.0, retention=30 * 86400):
+        self.snapshot_dir = snapshot_dir or os.getenv('GMINA_NO_RESULTS_SNAPSHOT_DIR') or DEFAULT_SNAPSHOT_DIR
+        self.top_n = top_n
+        self.max_groups = max_groups
+        self.width = width
+        self.depth = depth
+        self.snapshot_interval = snapshot_interval
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        # Stan per proces - po forku worker liczy od zera i ma własny plik
+        self.instance_id = f'{socket.gethostname()}-{os.getpid()}-{int(time.time())}'
+        self.started_at = time.time()
+        self._sketch = CountMinSketch(self.width, self.depth)
+        self._groups = {}
+        # Liczności grup: grupa -> liczba fraz oraz kopiec (liczność, grupa) z leniwym unieważnianiem
+        self._group_totals = {}
+        self._group_heap = []
+        self._dirty = False
+        self.total = 0
+        self.evicted_groups = 0
+
+    def _ensure_process(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self._reset()
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='no-results-snapshots', daemon=True).start()
+
+    def add(self, gmina, search_type, query):
+        """
+        Zlicza frazę bez wyników w grupie (gmina, typ).
+
+        Returns:
+            bool: False, gdy fraza jest pusta
+        """
+        phrase = normalize_phrase(query)
+        if not phrase:
+            return False
+        self._ensure_process()
+        group_key = (gmina or '', search_type)
+        with self._lock:
+            group = self._groups.get(group_key)
+            if group is None:
+                if len(self._groups) >= self.max_groups:
+                    self._evict_smallest_group()
+                group = self._groups[group_key] = _TopPhrases(self.top_n)
+            group.offer(phrase, self._sketch.add((group_key, phrase)))
+            total = self._group_totals[group_key] = self._group_totals.get(group_key, 0) + 1
+            heapq.heappush(self._group_heap, (total, group_key))
+            if len(self._group_heap) > 4 * self.max_groups:
+                self._group_heap = [(count, key) for key, count in self._group_totals.items()]
+                heapq.heapify(self._group_heap)
+            self.total += 1
+            self._dirty = True
+        return True
+
+    def _evict_smallest_group(self):
+        # Wpisy kopca nieaktualne (grupa urosła albo wypadła) są pomijane.
+        # Oszacowania fraz wypartej grupy zostają w szkicu - mogą tylko zawyżać, nie zaniżać
+        heap = self._group_heap
+        while heap:
+            count, key = heapq.heappop(heap)
+            if self._group_totals.get(key) == count:
+                del self._groups[key]
+                del self._group_totals[key]
+                self.evicted_groups += 1
+                return
+
+    def snapshot(self):
+        """Stan procesu do zapisu/raportu"""
+        with self._lock:
+            groups = [
+                {'gmina': gmina, 'search_type': search_type, 'phrases': group.items()}
+                for (gmina, search_type), group in self._groups.items()
+            ]
+            return {
+                'id': self.instance_id,
+                'started_at': self.started_at,
+                'updated_at': time.time(),
+                'total': self.total,
+                'groups': groups
+            }
+
+    def flush(self):
+        """Zapisuje snapshot procesu (plik tymczasowy + os.replace - czytelnik nie widzi połowy pliku)"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._dirty = False
+        data = self.snapshot()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = os.path.join(self.snapshot_dir, f"{data['id']}.json")
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temporary, path)
+        self.prune()
+        return True
+
+    def prune(self):
+        """Usuwa snapshoty (i porzucone pliki tymczasowe) starsze niż retention - nie tylko pomija je w raporcie"""
+        cutoff = time.time() - self.retention
+        removed = 0
+        for path in self._snapshot_paths(('.json', '.tmp')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def _snapshot_paths(self, extensions=('.json',)):
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        return [
+            os.path.join(self.snapshot_dir, name)
+            for name in os.listdir(self.snapshot_dir) if name.endswith(extensions)
+        ]
+
+    def _run(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("[ANALYTICS] Błąd zapisu snapshotu fraz bez wyników: %s", e)
+
+    def report(self, gmina=None, search_type=None, limit=None):
+        """
+        Top fraz bez wyników scalone ze wszystkich procesów.
+
+        Liczby to sumy oszacowań Count-Min z procesów (nigdy niezaniżone
+        w obrębie procesu); fraza spoza top-N danego procesu nie wnosi
+        do sumy jego wystąpień.
+
+        Returns:
+            dict: generated_at, processes, total, groups [{gmina, search_type, phrases: [[fraza, liczba]]}]
+        """
+        limit = limit or self.top_n
+        snapshots = [self.snapshot()]
+        cutoff = time.time() - self.retention
+        own = os.path.join(self.snapshot_dir, f'{self.instance_id}.json')
+        for path in self._snapshot_paths():
+            if path == own:
+                continue
+            try:
+                # Stare pliki odrzucane po mtime, bez parsowania
+                if os.path.getmtime(path) < cutoff:
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('updated_at', 0) < cutoff:
+                continue
+            snapshots.append(data)
+
+        merged = {}
+        for data in snapshots:
+            for group in data['groups']:
+                if gmina is not None and group['gmina'] != gmina:
+                    continue
+                if search_type is not None and group['search_type'] != search_type:
+                    continue
+                phrases = merged.setdefault((group['gmina'], group['search_type']), {})
+                for phrase, count in group['phrases']:
+                    phrases[phrase] = phrases.get(phrase, 0) + count
+        return {
+            'generated_at': time.time(),
+            'processes': len(snapshots),
+            'total': sum(data['total'] for data in snapshots),
+            'groups': [
+                {
+                    'gmina': group_gmina,
+                    'search_type': group_type,
+                    'phrases': heapq.nsmallest(limit, phrases.items(), key=lambda item: (-item[1], item[0]))
+                }
+                for (group_gmina, group_type), phrases in sorted(merged.items())
+            ]
+        }
+
+    def stats(self):
+        """Liczniki do monitoringu"""
+        with self._lock:
+            return {
+                'total': self.total,
+                'groups': len(self._groups),
+                'evicted_groups': self.evicted_groups,
+                'sketch_counters': self.width * self.depth
+            }
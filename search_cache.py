@@ -0,0 +1,110 @@
+"""search_cache.py - Cache LRU/TTL wyników wyszukiwania predykcyjnego Gmina-AI"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _CachedSearch:
+    """Wpis cache: sugestie oraz stany zapytania (QueryState) dla sekcji"""
+    __slots__ = ('version', 'suggestions', 'states', 'expires_at')
+
+    def __init__(self, version, suggestions, states, expires_at):
+        self.version = version
+        self.suggestions = suggestions
+        self.states = states
+        self.expires_at = expires_at
+
+
+class SearchCache:
+    """
+    Cache LRU z TTL przed GminaBot.search_suggestions.
+
+    Klucz to (gmina, context, znormalizowane zapytanie). Oprócz gotowych
+    sugestii przechowuje stany zapytania z indeksu, dzięki czemu zapytanie
+    rozszerzające zbuforowany prefiks ("pod" -> "pode") liczy tylko różnicę.
+    Wpisy z inną wersją katalogu niż podana przy odczycie są traktowane jak nieważne.
+    """
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prefix_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(query):
+        """Normalizacja zapytania - identyczna z search_suggestions"""
+        return query.lower().strip()
+
+    def _live_entry(self, key, version, now):
+        """Zwraca ważny wpis lub None (usuwa wpisy przeterminowane i nieaktualne)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version or entry.expires_at <= now:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, gmina, context, query, version=None):
+        """Zwraca zbuforowane sugestie albo None"""
+        key = (gmina, context, self.normalize(query))
+        with self._lock:
+            entry = self._live_entry(key, version, time.monotonic())
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.suggestions
+
+    def prefix_states(self, gmina, context, query, version=None):
+        """Zwraca stany zapytania najdłuższego zbuforowanego prefiksu (lub None)"""
+        query = self.normalize(query)
+        now = time.monotonic()
+        with self._lock:
+            for length in range(len(query) - 1, 1, -1):
+                key = (gmina, context, query[:length])
+                entry = self._live_entry(key, version, now)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.prefix_hits += 1
+                    return entry.states
+        return None
+
+    def put(self, gmina, context, query, suggestions, states=None, version=None):
+        """Zapisuje wynik wyszukiwania, usuwając najdawniej używane wpisy ponad limit"""
+        key = (gmina, context, self.normalize(query))
+        with self._lock:
+            self._entries[key] = _CachedSearch(version, suggestions, states or {}, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Unieważnia cały cache"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        """Liczniki cache do monitoringu"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'prefix_hits': self.prefix_hits,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
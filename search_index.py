@@ -0,0 +1,359 @@
+"""search_index.py - Indeks odwrócony dla wyszukiwania predykcyjnego Gmina-AI"""
+import hashlib
+import itertools
+import json
+from array import array
+from collections import Counter
+
+from fuzzywuzzy import utils
+from unidecode import unidecode
+
+# Próg minimalnego dopasowania używany w search_suggestions
+MATCH_THRESHOLD = 40
+
+# Globalny licznik wersji indeksu - każda przebudowa dostaje nowy numer
+_versions = itertools.count(1)
+
+# Prefiks identyfikatora rekordu wg sekcji bazy
+SECTION_PREFIXES = {'persons': 'p', 'departments': 'd', 'forms': 'f', 'problems': 'z'}
+
+
+def searchable_text(section, record):
+    """Zwraca tekst przeszukiwany dla rekordu z danej sekcji bazy"""
+    if section == 'persons':
+        return f"{record['name']} {record['position']} {record['department']}"
+    if section == 'forms':
+        return f"{record['name']} {record['category']} {record['code']}"
+    if section == 'departments':
+        return record['name']
+    return record
+
+
+def record_uid(section, record):
+    """
+    Stabilny identyfikator rekordu: prefiks sekcji + skrót treści rekordu.
+
+    Nie zależy od pozycji w bazie, więc sugestia sprzed przeładowania
+    katalogu wskazuje ten sam rekord, dopóki jego treść się nie zmieniła.
+    """
+    content = json.dumps(record, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return SECTION_PREFIXES[section] + hashlib.blake2b(content, digest_size=6).hexdigest()
+
+
+def fold(text):
+    """Klucz bez polskich znaków: 'Źródło Łąka' -> 'zrodlo laka'"""
+    return unidecode(text).lower()
+
+
+def _token_string(text):
+    """Przetwarza tekst tak jak token_sort_ratio/token_set_ratio z fuzzywuzzy"""
+    tokens = utils.full_process(text, force_ascii=True).split()
+    return tokens, ' '.join(sorted(tokens)), ' '.join(sorted(set(tokens)))
+
+
+class _Keys:
+    """Klucze tekstowe rekordu w jednym trybie (dokładnym albo złożonym do ASCII)"""
+    __slots__ = ('text', 'sorted_string', 'length', 'sorted_length', 'set_length', 'tokens')
+
+    def __init__(self, text):
+        tokens, self.sorted_string, set_string = _token_string(text)
+        self.text = text
+        self.length = len(text)
+        self.sorted_length = len(self.sorted_string)
+        self.set_length = len(set_string)
+        self.tokens = frozenset(tokens)
+
+
+class _Entry:
+    """
+    Skompilowany rekord indeksu - klucze tekstowe liczone raz na wersję danych.
+
+    exact.text i exact.sorted_string to dokładnie te napisy, które porównuje
+    calculate_match_score (po lowercase i po full_process + sortowaniu
+    tokenów), więc scoring nie przetwarza już tekstów rekordów.
+    folded to te same klucze po złożeniu polskich znaków do ASCII.
+    """
+    __slots__ = ('record', 'uid', 'exact', 'folded')
+
+    def __init__(self, record, text, uid=None):
+        self.record = record
+        self.uid = uid
+        self.exact = _Keys(text)
+        folded = fold(text)
+        # Tekst bez polskich znaków ma identyczne klucze w obu trybach
+        self.folded = self.exact if folded == text else _Keys(folded)
+
+    def keys(self, folded=False):
+        return self.folded if folded else self.exact
+
+    @property
+    def text(self):
+        return self.exact.text
+
+    @property
+    def sorted_string(self):
+        return self.exact.sorted_string
+
+
+class QueryState:
+    """
+    Stan zapytania w jednej sekcji indeksu (liczniki znaków i sumy wspólnych znaków).
+
+    Pozwala policzyć zapytanie "pode" na bazie stanu dla "pod" - aktualizowane
+    są tylko listy wystąpień znaków, których liczba w zapytaniu się zmieniła.
+    W trybie folded zapytanie jest składane do ASCII i porównywane z kluczami folded.
+    """
+    __slots__ = ('version', 'section', 'folded', 'query', 'tokens', 'sorted_string', 'set_string',
+                 'raw_counts', 'token_counts', 'raw_overlap', 'token_overlap')
+
+    def __init__(self, version, section, query, folded=False):
+        self.version = version
+        self.section = section
+        self.folded = folded
+        self.query = query
+        self.tokens, self.sorted_string, self.set_string = _token_string(query)
+        self.raw_counts = Counter(query)
+        self.token_counts = Counter(self.sorted_string)
+        self.raw_overlap = {}
+        self.token_overlap = {}
+
+
+class SearchIndex:
+    """
+    Indeks odwrócony znaków i tokenów budowany raz z search_database.
+
+    Dla każdej sekcji (persons, departments, forms, problems) trzyma listy
+    wystąpień: znak -> (ids, liczby) dla tekstu po lowercase oraz dla tekstu
+    przetworzonego przez fuzzywuzzy (tokeny ASCII), a także token -> {id}.
+    Z tych list wyliczana jest górna granica wyniku calculate_match_score,
+    więc rekordy, które nie mogą przekroczyć progu, odpadają bez fuzzy scoringu.
+    Granica jest dokładna - wyniki i kolejność top-8 nie zmieniają się.
+
+    Filtr n-gramowy (np. trigramy) nie gwarantowałby tego samego wyniku:
+    fuzzy scoring przepuszcza dopasowania bez wspólnych trigramów
+    (np. "akt" -> "Sekretariat" = 44).
+
+    Listy wystąpień istnieją w dwóch wariantach: 'exact' (klucze jak
+    w calculate_match_score) i 'folded' (klucze bez polskich znaków) -
+    dla wyszukiwania niewrażliwego na diakrytyki ("smieci" -> "Śmieci").
+    """
+
+    def __init__(self, search_database, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.sections = {}
+        # Identyfikator rekordu -> (sekcja, rekord) - wybór sugestii bez odsyłania rekordu przez klienta
+        self.records = {}
+        self.version = 0
+        self.build(search_database)
+
+    def build(self, search_database):
+        """Buduje indeks dla wszystkich sekcji bazy wyszukiwania"""
+        records = {
+            'persons': search_database['contacts']['persons'],
+            'departments': search_database['contacts']['departments'],
+            'forms': search_database['forms'],
+            'problems': search_database['problems'],
+        }
+        self.records = {}
+        self.sections = {
+            section: self._build_section(section, items)
+            for section, items in records.items()
+        }
+        self.version = next(_versions)
+
+    def _build_section(self, section, items):
+        entries = []
+        for entry_id, record in enumerate(items):
+            uid = record_uid(section, record)
+            known = self.records.get(uid)
+            if known is not None and known != (section, record):
+                # Kolizja skrótu dla różnych rekordów - rozróżnienie pozycją
+                uid = f"{uid}-{entry_id}"
+            self.records.setdefault(uid, (section, record))
+            entries.append(_Entry(record, searchable_text(section, record).lower(), uid))
+        return {
+            'entries': entries,
+            'exact': self._build_postings(entries, folded=False),
+            'folded': self._build_postings(entries, folded=True),
+        }
+
+    @staticmethod
+    def _build_postings(entries, folded):
+        """
+        Listy wystąpień dla jednego trybu kluczy.
+
+        Wystąpienia znaków to pary kolumn array (id rekordu, liczba) zamiast
+        list krotek - kilka bajtów na wystąpienie zamiast kilkudziesięciu.
+        """
+        char_postings = {}
+        token_char_postings = {}
+        token_postings = {}
+
+        for entry_id, entry in enumerate(entries):
+            keys = entry.keys(folded)
+            for postings, text in ((char_postings, keys.text), (token_char_postings, keys.sorted_string)):
+                for char, count in Counter(text).items():
+                    column = postings.get(char)
+                    if column is None:
+                        column = postings[char] = (array('I'), array('I'))
+                    column[0].append(entry_id)
+                    column[1].append(count)
+            for token in keys.tokens:
+                token_postings.setdefault(token, set()).add(entry_id)
+
+        return {
+            'chars': char_postings,
+            'token_chars': token_char_postings,
+            'tokens': token_postings,
+        }
+
+    @staticmethod
+    def _overlap(query_counts, postings, base_counts=None, base_overlap=None):
+        """
+        Sumuje wspólne znaki (multizbiór) zapytania z każdym rekordem.
+
+        Przy podanym stanie bazowym (prefiks zapytania) przelicza tylko znaki,
+        których liczba w zapytaniu się zmieniła.
+        """
+        if base_overlap is None:
+            overlap = {}
+            changed = ((char, 0, count) for char, count in query_counts.items())
+        else:
+            overlap = dict(base_overlap)
+            changed = (
+                (char, base_counts.get(char, 0), query_counts.get(char, 0))
+                for char in query_counts.keys() | base_counts.keys()
+                if base_counts.get(char, 0) != query_counts.get(char, 0)
+            )
+
+        for char, old_count, new_count in changed:
+            column = postings.get(char)
+            if column is None:
+                continue
+            for entry_id, count in zip(*column):
+                delta = min(new_count, count) - min(old_count, count)
+                if delta:
+                    overlap[entry_id] = overlap.get(entry_id, 0) + delta
+        return overlap
+
+    def query_state(self, query, section, base=None, folded=False):
+        """
+        Buduje QueryState dla zapytania w sekcji.
+
+        Jeśli base to stan prefiksu tego zapytania z tej samej wersji indeksu
+        (i tego samego trybu), sumy wspólnych znaków są aktualizowane
+        przyrostowo zamiast od zera.
+        """
+        query = query.lower().strip()
+        if folded:
+            query = fold(query)
+        state = QueryState(self.version, section, query, folded)
+        index = self.sections.get(section)
+        if not index:
+            return state
+        postings = index['folded' if folded else 'exact']
+
+        if base is not None and (base.version != self.version or base.section != section
+                                 or base.folded != folded or not query.startswith(base.query)):
+            base = None
+
+        state.raw_overlap = self._overlap(
+            state.raw_counts, postings['chars'],
+            base.raw_counts if base else None, base.raw_overlap if base else None
+        )
+        state.token_overlap = self._overlap(
+            state.token_counts, postings['token_chars'],
+            base.token_counts if base else None, base.token_overlap if base else None
+        )
+        return state
+
+    def resolve(self, uid):
+        """Zwraca (sekcja, rekord) dla identyfikatora z sugestii albo None"""
+        return self.records.get(uid) if isinstance(uid, str) else None
+
+    def upper_bound(self, keys, query_length, raw_overlap, token_overlap,
+                    query_sorted_length, query_set_length, token_hit):
+        """
+        Górna granica ważonego wyniku calculate_match_score.
+
+        Każdy scorer fuzzywuzzy to 2*LCS/(len1+len2) na odpowiednich napisach,
+        a LCS nie przekracza liczby wspólnych znaków.
+        """
+        ratio = 200.0 * raw_overlap / (query_length + keys.length)
+
+        shorter = min(query_length, keys.length)
+        partial = 200.0 * raw_overlap / (raw_overlap + shorter) if raw_overlap else 0.0
+
+        token_sort = 0.0
+        if query_sorted_length and keys.sorted_length:
+            token_sort = 200.0 * token_overlap / (query_sorted_length + keys.sorted_length)
+
+        if token_hit:
+            token_set = 100.0
+        elif query_set_length and keys.set_length:
+            token_set = min(100.0, 200.0 * token_overlap / (query_set_length + keys.set_length))
+        else:
+            token_set = 0.0
+
+        return ratio * 0.2 + partial * 0.4 + token_sort * 0.2 + token_set * 0.2
+
+    def candidates(self, query, section, folded=False):
+        """
+        Zwraca rekordy sekcji, które mogą przekroczyć próg dopasowania.
+
+        Kolejność rekordów jest zachowana (jak w search_database), dzięki
+        czemu sortowanie stabilne daje identyczny ranking jak pełny skan.
+        """
+        return [entry.record for entry in self.lookup(query, section, folded=folded)]
+
+    def lookup(self, query, section, state=None, folded=False):
+        """Jak candidates, ale zwraca skompilowane wpisy (rekord + klucze tekstowe)"""
+        return [entry for _, entry, _ in self._bounded(query, section, state, folded)]
+
+    def ranked_lookup(self, query, section, state=None, folded=False):
+        """
+        Kandydaci posortowani malejąco według górnej granicy wyniku.
+
+        Zwraca listę (bound, entry_id, entry) - pozwala przerwać scoring,
+        gdy granica kolejnych kandydatów spada poniżej bieżącego top-k.
+        """
+        ranked = [
+            (bound, entry_id, entry)
+            for entry_id, entry, bound in self._bounded(query, section, state, folded)
+        ]
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        return ranked
+
+    def _bounded(self, query, section, state=None, folded=False):
+        """Zwraca (entry_id, entry, bound) dla kandydatów powyżej progu, w kolejności bazy"""
+        index = self.sections.get(section)
+        if not index:
+            return []
+
+        if state is None or state.version != self.version or state.section != section:
+            state = self.query_state(query, section, folded=folded)
+        if not state.query:
+            return []
+        folded = state.folded
+        postings = index['folded' if folded else 'exact']
+
+        token_hits = set()
+        for token in set(state.tokens):
+            token_hits.update(postings['tokens'].get(token, ()))
+
+        # Każdy scorer zaokrągla wynik (max +0.5), a int() wymaga >= threshold + 1
+        cutoff = self.threshold + 0.5 - 1e-9
+        entries = index['entries']
+        raw_overlap = state.raw_overlap
+        token_overlap = state.token_overlap
+        result = []
+        for entry_id in sorted(raw_overlap.keys() | token_overlap.keys()):
+            entry = entries[entry_id]
+            bound = self.upper_bound(
+                entry.keys(folded), len(state.query),
+                raw_overlap.get(entry_id, 0), token_overlap.get(entry_id, 0),
+                len(state.sorted_string), len(state.set_string), entry_id in token_hits
+            )
+            if bound >= cutoff:
+                result.append((entry_id, entry, bound))
+        return result
@@ -0,0 +1,298 @@
+"""session_store.py - Sesje po stronie serwera dla Gmina-AI (cookie trzyma tylko ID)"""
+import contextlib
+import contextvars
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context, session as flask_session
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+from werkzeug.local import LocalProxy
+
+from metrics import REGISTRY
+
+# Odczyt (deserializacja) i zapis (serializacja) sesji w magazynie
+SESSION_SECONDS = REGISTRY.histogram(
+    'gmina_session_seconds', 'Czas odczytu/zapisu sesji w magazynie (z (de)serializacją)', ('operation',)
+)
+
+# Sesja przypięta poza kontekstem żądania Flaska (tryb ASGI)
+_bound_session = contextvars.ContextVar('gmina_bound_session', default=None)
+
+
+def current_session():
+    """Sesja bieżącego żądania - przypięta przez bound_session albo sesja Flaska"""
+    bound = _bound_session.get()
+    if bound is not None:
+        return bound
+    return flask_session._get_current_object()
+
+
+def has_session():
+    """Odpowiednik has_request_context() dla obu trybów serwowania"""
+    return _bound_session.get() is not None or has_request_context()
+
+
+@contextlib.contextmanager
+def bound_session(session):
+    """Przypina sesję do bieżącego kontekstu (wątku/zadania) na czas obsługi żądania"""
+    token = _bound_session.set(session)
+    try:
+        yield session
+    finally:
+        _bound_session.reset(token)
+
+
+# Używane przez GminaBot zamiast flask.session - działa we Flasku i w trybie ASGI
+session = LocalProxy(current_session)
+
+
+class MemorySessionStore:
+    """
+    Magazyn sesji w pamięci procesu z wygasaniem TTL.
+
+    Wpisy są trzymane w kolejności ostatniego zapisu, więc przeterminowane
+    sesje usuwane są z początku słownika bez przeglądania całości.
+    Stan nie jest współdzielony między workerami gunicorna.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _purge(self, now):
+        while self._entries:
+            sid, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[sid]
+            self.evictions += 1
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[sid]
+                self.evictions += 1
+                return None
+            return entry[0]
+
+    def set(self, sid, data, ttl):
+        now = time.time()
+        with self._lock:
+            self._entries[sid] = (data, now + ttl)
+            self._entries.move_to_end(sid)
+            self._purge(now)
+
+    def touch(self, sid, ttl):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None:
+                self._entries[sid] = (entry[0], time.time() + ttl)
+                self._entries.move_to_end(sid)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteSessionStore:
+    """
+    Magazyn sesji w pliku SQLite (tryb WAL) współdzielony przez workery.
+
+    Każdy wątek ma własne połączenie; przeterminowane sesje są czyszczone
+    co `purge_every` zapisów.
+    """
+
+    def __init__(self, path, purge_every=500):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)')
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, sid):
+        row = self._connection().execute(
+            'SELECT data FROM sessions WHERE id = ? AND expires_at > ?', (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, data, ttl):
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)',
+            (sid, data, now + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            connection.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+    def touch(self, sid, ttl):
+        self._connection().execute(
+            'UPDATE sessions SET expires_at = ? WHERE id = ?', (time.time() + ttl, sid)
+        )
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Sesja trzymana w magazynie serwera; w cookie ląduje tylko `sid`"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    SessionInterface Flaska z pluggable magazynem (MemorySessionStore, SQLiteSessionStore).
+
+    Cookie przenosi tylko losowy identyfikator sesji, więc odpada podpisywanie
+    HMAC i serializacja całej historii czatu przy każdym żądaniu. Dane są
+    serializowane (TaggedJSON jak w Flasku) tylko gdy sesja została zmieniona.
+    """
+
+    serializer = session_json_serializer
+    sid_length = 32
+
+    def __init__(self, store):
+        self.store = store
+
+    def _new_sid(self):
+        return secrets.token_urlsafe(self.sid_length)
+
+    def open_session(self, app, request):
+        return self.load(request.cookies.get(self.get_cookie_name(app)))
+
+    def load(self, sid):
+        """Sesja dla identyfikatora z cookie (nowa, gdy brak/wygasła)"""
+        with SESSION_SECONDS.labels('load').time():
+            return self._load(sid)
+
+    def _load(self, sid):
+        # Stare cookie z podpisanym payloadem (lub śmieci) nie są identyfikatorem sesji
+        if sid and len(sid) <= 64:
+            data = self.store.get(sid)
+            if data is not None:
+                try:
+                    return ServerSideSession(self.serializer.loads(data), sid=sid)
+                except ValueError:
+                    pass
+        return ServerSideSession(sid=self._new_sid(), new=True)
+
+    def persist(self, session, ttl, refresh_each_request=True):
+        """
+        Zapisuje sesję w magazynie.
+
+        Returns:
+            'delete' - sesję wyczyszczono (cookie do usunięcia),
+            None - pusta nowa sesja (bez cookie), 'keep' - sesja zapisana
+        """
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                return 'delete'
+            return None
+
+        if session.modified or session.new:
+            with SESSION_SECONDS.labels('save').time():
+                self.store.set(session.sid, self.serializer.dumps(dict(session)), ttl)
+        elif session.permanent and refresh_each_request:
+            self.store.touch(session.sid, ttl)
+        return 'keep'
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        ttl = app.permanent_session_lifetime.total_seconds()
+        outcome = self.persist(session, ttl, app.config['SESSION_REFRESH_EACH_REQUEST'])
+        if outcome == 'delete':
+            response.delete_cookie(
+                name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly
+            )
+        if outcome != 'keep':
+            return
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+
+
+def make_session_interface(app, backend):
+    """
+    Tworzy interfejs sesji dla backendu 'memory' lub 'sqlite'.
+
+    Dla 'cookie' zwraca None - zostaje domyślna sesja Flaska w podpisanym cookie.
+    """
+    if backend == 'memory':
+        return ServerSideSessionInterface(MemorySessionStore())
+    if backend == 'sqlite':
+        path = app.config.get('SESSION_SQLITE_PATH') or os.path.join(app.instance_path, 'sessions.sqlite3')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return ServerSideSessionInterface(SQLiteSessionStore(path))
+    if backend == 'cookie':
+        return None
+    raise ValueError(f'Nieznany backend sesji: {backend}')
@@ -0,0 +1,323 @@
+"""shard_pool.py - Scoring wyszukiwania predykcyjnego w procesach roboczych (shardy dużych katalogów)"""
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Katalogi mniejsze od progu scorowane są w procesie żądania - narzut IPC
+# przewyższa tam zysk z równoległości (patrz benchmarks/shard_scoring.py)
+DEFAULT_MIN_ENTRIES = 50000
+
+
+def catalog_entries(index):
+    """Łączna liczba wpisów we wszystkich sekcjach indeksu"""
+    return sum(len(section['entries']) for section in index.sections.values())
+
+
+def shard_database(index, shard, shards):
+    """
+    Baza wyszukiwania jednego shardu: co `shards`-ty rekord każdej sekcji od pozycji `shard`.
+
+    Pozycja w pełnym katalogu to pozycja_w_shardzie * shards + shard - przy
+    scalaniu wyników remisy rozstrzygane są więc tak jak w jednym procesie.
+    """
+    records = {
+        section: [entry.record for entry in data['entries'][shard::shards]]
+        for section, data in index.sections.items()
+    }
+    return {
+        'contacts': {'persons': records['persons'], 'departments': records['departments']},
+        'forms': records['forms'],
+        'problems': records['problems'],
+    }
+
+
+def _serve(requests, replies, searcher):
+    """Pętla procesu roboczego: instalacja/usunięcie shardów i scoring zapytań"""
+    # Ctrl+C obsługuje proces nadrzędny - worker kończy się po zamknięciu potoku
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shards = {}
+    while True:
+        try:
+            message = requests.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        request_id, command, version, *args = message
+        try:
+            if command == 'install':
+                shards[version] = searcher(*args)
+                value = True
+            elif command == 'drop':
+                shards.pop(version, None)
+                value = True
+            else:
+                value = shards[version].search(*args)
+            replies.send((request_id, True, value))
+        except Exception as e:
+            replies.send((request_id, False, repr(e)))
+
+
+class _ShardWorker:
+    """Proces roboczy z jednym shardem na katalog; odpowiedzi dopasowywane do żądań po id"""
+
+    def __init__(self, context, searcher, number):
+        requests_reader, self._requests = context.Pipe(duplex=False)
+        self._replies, replies_writer = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_serve, args=(requests_reader, replies_writer, searcher),
+            name=f'gmina-shard-{number}', daemon=True
+        )
+        self.process.start()
+        requests_reader.close()
+        replies_writer.close()
+        self.alive = True
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name=f'gmina-shard-{number}-reader', daemon=True)
+        self._reader.start()
+
+    def submit(self, command, version, *args):
+        """Wysyła polecenie do workera; wynik przychodzi przez Future"""
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                future.set_exception(ConnectionError('worker shardu nie działa'))
+                return future
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                self._requests.send((request_id, command, version) + args)
+            except OSError as e:
+                self._pending.pop(request_id)
+                future.set_exception(e)
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                request_id, ok, value = self._replies.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+        # Worker zakończył się - oczekujące żądania dostają błąd
+        with self._lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ConnectionError('worker shardu zakończył działanie'))
+
+    def close(self, timeout=2):
+        with self._lock:
+            try:
+                self._requests.send(None)
+            except OSError:
+                pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._requests.close()
+
+
+class ShardPool:
+    """
+    Pula procesów roboczych scorujących duże katalogi równolegle.
+
+    Katalog (wersja indeksu) dzielony jest na `shards` części rozłożonych
+    co `shards`-ty rekord; każdy worker dostaje swój shard raz - przy
+    pierwszym wyszukiwaniu w katalogu, w tle - i buduje z niego własny
+    indeks. Zapytanie wysyłane jest do wszystkich shardów, każdy zwraca
+    swoje top-k (wynik, sekcja, pozycja), a wyniki scalane są z tymi samymi
+    regułami remisów co GminaBot.top_matches - ranking jest identyczny
+    z jednoprocesowym. Przez potoki płyną tylko zapytanie i krotki liczb;
+    rekordy sugestii odczytywane są z indeksu w procesie żądania.
+
+    top_matches zwraca None (scoring w procesie żądania), gdy katalog jest
+    mniejszy niż min_entries, jego shardy jeszcze się instalują albo worker
+    nie odpowiedział.
+    """
+
+    def __init__(self, searcher, shards=2, min_entries=DEFAULT_MIN_ENTRIES, max_catalogs=4, timeout=5.0):
+        """
+        Args:
+            searcher: klasa shardu - searcher(search_database) w procesie workera,
+                z metodą search(query, sections, limit, folded)
+            shards (int): liczba procesów roboczych (= liczba shardów katalogu)
+            min_entries (int): minimalny rozmiar katalogu scorowanego w shardach
+            max_catalogs (int): ile wersji katalogów trzymają workery (LRU)
+            timeout (float): maksymalny czas oczekiwania na odpowiedź shardu [s]
+        """
+        if shards < 2:
+            raise ValueError('ShardPool wymaga co najmniej 2 shardów')
+        self.searcher = searcher
+        self.shards = shards
+        self.min_entries = min_entries
+        self.max_catalogs = max_catalogs
+        self.timeout = timeout
+        self._workers = []
+        self._pid = None
+        # wersja indeksu -> True (shardy gotowe) / False (instalacja w toku)
+        self._catalogs = OrderedDict()
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.fallbacks = 0
+        self.installs = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls, searcher, **kwargs):
+        """
+        Pula z GMINA_SCORING_SHARDS (liczba shardów) i GMINA_SHARD_MIN_ENTRIES.
+
+        Returns:
+            ShardPool albo None, gdy GMINA_SCORING_SHARDS < 2 (domyślnie wyłączone)
+        """
+        shards = int(os.getenv('GMINA_SCORING_SHARDS', '0') or 0)
+        if shards < 2:
+            return None
+        min_entries = int(os.getenv('GMINA_SHARD_MIN_ENTRIES', DEFAULT_MIN_ENTRIES))
+        return cls(searcher, shards=shards, min_entries=min_entries, **kwargs)
+
+    def _ensure_workers(self):
+        # Workery startują leniwie w procesie, który wyszukuje (np. po forku workera
+        # gunicorna z --preload) i są odtwarzane, gdy któryś zakończył działanie
+        if self._pid == os.getpid() and all(worker.alive for worker in self._workers):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and all(worker.alive for worker in self._workers):
+                return
+            if self._pid == os.getpid():
+                for worker in self._workers:
+                    worker.close()
+            # spawn: worker nie dziedziczy wątków ani blokad procesu serwera
+            context = multiprocessing.get_context('spawn')
+            self._workers = [_ShardWorker(context, self.searcher, number) for number in range(self.shards)]
+            self._catalogs.clear()
+            self._pid = os.getpid()
+            logger.info("[SHARDS] Uruchomiono %d workerów scoringu", self.shards)
+
+    def _ready(self, index):
+        """Czy shardy wersji indeksu są gotowe; przy pierwszym użyciu startuje instalację w tle"""
+        with self._lock:
+            state = self._catalogs.get(index.version)
+            if state is not None:
+                self._catalogs.move_to_end(index.version)
+                return state
+            self._catalogs[index.version] = False
+            workers = self._workers
+        threading.Thread(target=self._install, args=(index, workers), name='gmina-shard-install', daemon=True).start()
+        return False
+
+    def _install(self, index, workers):
+        version = index.version
+        futures = [
+            worker.submit('install', version, shard_database(index, shard, self.shards))
+            for shard, worker in enumerate(workers)
+        ]
+        try:
+            for future in futures:
+                future.result()
+        except Exception as e:
+            logger.error("[SHARDS] Błąd instalacji shardów katalogu: %s", e)
+            with self._lock:
+                self.failures += 1
+                self._catalogs.pop(version, None)
+            return
+
+        with self._lock:
+            # Workery odtworzone w trakcie instalacji - te shardy już nie istnieją
+            if self._catalogs.get(version) is not False or workers is not self._workers:
+                return
+            self._catalogs[version] = True
+            self.installs += 1
+            dropped = []
+            while len(self._catalogs) > self.max_catalogs:
+                dropped.append(self._catalogs.popitem(last=False)[0])
+        for old_version in dropped:
+            for worker in workers:
+                worker.submit('drop', old_version)
+        logger.info("[SHARDS] Katalog %d wpisów w %d shardach", catalog_entries(index), self.shards)
+
+    def top_matches(self, index, query, sections, limit, folded=False):
+        """
+        Top-k dopasowań z shardów katalogu - jak GminaBot.top_matches.
+
+        Returns:
+            list: krotki (section, entry, score) z wpisami indeksu `index`
+                albo None, gdy zapytanie trzeba policzyć w procesie żądania
+        """
+        if catalog_entries(index) < self.min_entries:
+            return None
+        self._ensure_workers()
+        if not self._ready(index):
+            self.fallbacks += 1
+            return None
+
+        sections = tuple(sections)
+        futures = [worker.submit('search', index.version, query, sections, limit, folded) for worker in self._workers]
+        try:
+            results = [future.result(self.timeout) for future in futures]
+        except Exception as e:
+            logger.error("[SHARDS] Błąd scoringu w shardach: %s", e)
+            with self._lock:
+                self.failures += 1
+                # Np. worker zrestartowany bez tej wersji - zainstaluj ponownie
+                self._catalogs.pop(index.version, None)
+            self.fallbacks += 1
+            return None
+
+        self.queries += 1
+        # Scalanie: wynik malejąco, potem kolejność sekcji i pozycja w pełnym katalogu
+        merged = sorted(
+            ((score, order, position * self.shards + shard)
+             for shard, matches in enumerate(results)
+             for score, order, position in matches),
+            key=lambda item: (-item[0], item[1], item[2])
+        )[:limit]
+        return [
+            (sections[order], index.sections[sections[order]]['entries'][entry_id], score)
+            for score, order, entry_id in merged
+        ]
+
+    def close(self, timeout=2):
+        """Zatrzymuje procesy robocze"""
+        with self._lock:
+            owned = self._pid == os.getpid()
+            workers, self._workers = self._workers, []
+            self._catalogs.clear()
+            self._pid = None
+        # Workery odziedziczone po forku należą do procesu nadrzędnego
+        if owned:
+            for worker in workers:
+                worker.close(timeout)
+
+    def stats(self):
+        """Liczniki do monitoringu"""
+        with self._lock:
+            return {
+                'shards': self.shards,
+                'min_entries': self.min_entries,
+                'workers_alive': sum(worker.alive for worker in self._workers) if self._pid == os.getpid() else 0,
+                'catalogs_ready': sum(self._catalogs.values()),
+                'catalogs_installing': sum(not ready for ready in self._catalogs.values()),
+                'queries': self.queries,
+                'fallbacks': self.fallbacks,
+                'installs': self.installs,
+                'failures': self.failures
+            }
@@ -329,7 +329,7 @@ class GminaBotUI {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    selection_data: suggestion
+                    selection_data: { id: suggestion.id }
                 })
             });
 
@@ -0,0 +1,293 @@
+"""teryt_registry.py - Rejestr gmin TERYT (TERC GUS) z wyszukiwaniem dokładnym, prefiksowym i przybliżonym"""
+import csv
+import logging
+import os
+import re
+
+from search_index import fold
+
+try:
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.distance import Levenshtein
+except ImportError:  # Brak RapidFuzz - literówki liczone w Pythonie po trie
+    rf_process = Levenshtein = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TERYT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'teryt_terc.csv')
+
+# Rodzaje jednostek TERC będące gminami (4, 5, 8, 9 to części gmin - miasta, obszary wiejskie, dzielnice);
+# pusty RODZ w dołączonym wykazie to gmina o nieustalonym rodzaju
+GMINA_KINDS = {'1': 'gmina miejska', '2': 'gmina wiejska', '3': 'gmina miejsko-wiejska', '': 'gmina'}
+
+# Liczba gmin w Polsce (TERC, stan na 2024-01-01) - mniej w pliku oznacza wykaz niepełny
+NATIONAL_GMINAS = 2477
+
+# Prefiks identyfikatora sugestii gminy (po nim kod TERC - 7 cyfr, 6 bez rodzaju gminy)
+TERYT_PREFIX = 'g'
+
+# Klasy dopasowania - kolejność w rankingu i wynik sugestii
+EXACT, PREFIX, WORD_PREFIX, FUZZY = range(4)
+CLASS_SCORES = {EXACT: 100, PREFIX: 90, WORD_PREFIX: 80, FUZZY: 70}
+
+_SEPARATORS = re.compile(r'[\s\-.,]+')
+
+
+def teryt_key(text):
+    """Klucz wyszukiwania: 'Bielsko-Biała ' -> 'bielsko biala'"""
+    return _SEPARATORS.sub(' ', fold(text)).strip()
+
+
+def max_distance(key):
+    """Dopuszczalna liczba literówek (odległość Levenshteina) dla długości zapytania"""
+    if len(key) < 4:
+        return 0
+    return 1 if len(key) < 8 else 2
+
+
+class Municipality:
+    """Gmina z rejestru TERC"""
+    __slots__ = ('teryt', 'name', 'kind', 'voivodeship', 'powiat', 'updated', 'key', 'rank')
+
+    def __init__(self, teryt, name, kind, voivodeship, powiat, updated):
+        self.teryt = teryt
+        self.name = name
+        self.kind = kind
+        self.voivodeship = voivodeship
+        self.powiat = powiat
+        self.updated = updated
+        self.key = teryt_key(name)
+        # Kolejność przy remisie klasy dopasowania: krótsza nazwa, alfabet, kod
+        self.rank = (len(self.key), self.key, teryt)
+
+    @property
+    def uid(self):
+        return TERYT_PREFIX + self.teryt
+
+
+class _Node:
+    """Węzeł drzewa trie - gminy z kluczem o tym prefiksie (posortowane wg rangi) i kończące się tutaj"""
+    __slots__ = ('children', 'ids', 'ends')
+
+    def __init__(self):
+        self.children = {}
+        self.ids = []
+        self.ends = []
+
+
+def _insert(root, key, index):
+    node = root
+    node.ids.append(index)
+    for char in key:
+        node = node.children.setdefault(char, _Node())
+        node.ids.append(index)
+    node.ends.append(index)
+
+
+def _freeze(root, entries):
+    """Sortuje listy węzłów wg rangi i usuwa powtórzenia - top-k prefiksu to początek listy"""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node.ids = tuple(sorted(set(node.ids), key=lambda index: entries[index].rank))
+        node.ends = tuple(sorted(set(node.ends), key=lambda index: entries[index].rank))
+        stack.extend(node.children.values())
+
+
+def _walk(root, key):
+    node = root
+    for char in key:
+        node = node.children.get(char)
+        if node is None:
+            return None
+    return node
+
+
+class TerytRegistry:
+    """
+    Wszystkie gminy z rejestru TERC (TERYT GUS), ładowane raz przy starcie.
+
+    Klucze nazw są złożone do ASCII (teryt_key), więc 'Łódź', 'lodz' i
+    'LODZ' trafiają w ten sam wpis. Indeksy:
+    • słownik klucz -> gminy - dopasowanie dokładne (nazwy gmin się powtarzają),
+    • trie pełnych nazw - prefiks; węzeł trzyma gminy posortowane wg rangi,
+      więc top-k to początek listy bez przeglądania całego poddrzewa,
+    • trie kolejnych słów nazwy - prefiks słowa ('wielk' -> Gorzów Wielkopolski),
+    • literówki (gdy nic nie pasuje prefiksem) - odległość Levenshteina
+      liczona wierszami DP podczas schodzenia po trie pełnych nazw,
+      z odcinaniem gałęzi ponad limit.
+
+    Ranking: klasa dopasowania (dokładne, prefiks, prefiks słowa, literówka),
+    liczba literówek, potem długość nazwy i alfabet.
+    """
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: entry.rank)
+        self.by_teryt = {entry.teryt: entry for entry in self.entries}
+        self._exact = {}
+        self._names = _Node()
+        self._words = _Node()
+        for index, entry in enumerate(self.entries):
+            self._exact.setdefault(entry.key, []).append(index)
+            _insert(self._names, entry.key, index)
+            for position in range(1, len(entry.key)):
+                if entry.key[position - 1] == ' ':
+                    _insert(self._words, entry.key[position:], index)
+        _freeze(self._names, self.entries)
+        _freeze(self._words, self.entries)
+        # Klucze nazw wg pierwszej litery - kandydaci literówek dla RapidFuzz
+        self._buckets = {
+            char: (node.ids, [self.entries[index].key for index in node.ids])
+            for char, node in self._names.children.items()
+        }
+        self.updated = max((entry.updated for entry in self.entries if entry.updated), default=None)
+        # Niepełny wykaz potwierdza tylko gminy, które zawiera - brak trafienia nie znaczy, że gmina nie istnieje
+        self.complete = len(self.entries) >= NATIONAL_GMINAS
+        self.lookups = 0
+
+    @classmethod
+    def from_file(cls, path=None):
+        """
+        Ładuje plik TERC w formacie GUS (CSV, ';', kolumny WOJ;POW;GMI;RODZ;NAZWA;NAZWA_DOD;STAN_NA).
+
+        Domyślnie data/teryt_terc.csv - wszystkie 2477 gminy (kody WOJ/POW/GMI
+        i nazwy z TERYT według wykazu LAU 2018 Eurostatu, bez zlikwidowanej
+        w 2019 r. gminy Ostrowice). Wykaz LAU nie podaje rodzaju gminy ani
+        nazw powiatów: RODZ jest wypełniony dla miast na prawach powiatu
+        i par gmina miejska/wiejska o tej samej nazwie, dla pozostałych
+        gmin jest pusty (kod 6-cyfrowy), a powiaty są tylko grodzkie.
+        Wykaz urzędowy (TERC_Urzedowy z eteryt.stat.gov.pl) w tym samym
+        formacie można wskazać przez GMINA_TERYT_PATH albo podmienić plik.
+        """
+        path = path or os.getenv('GMINA_TERYT_PATH', DEFAULT_TERYT_PATH)
+        voivodeships = {}
+        powiats = {}
+        gminas = []
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                woj, pow_, gmi, rodz = row['WOJ'], row['POW'], row['GMI'], row['RODZ']
+                if not pow_:
+                    voivodeships[woj] = row['NAZWA'].lower()
+                elif not gmi:
+                    powiats[woj + pow_] = row['NAZWA']
+                elif rodz in GMINA_KINDS:
+                    gminas.append(row)
+
+        registry = cls(
+            Municipality(
+                teryt=row['WOJ'] + row['POW'] + row['GMI'] + row['RODZ'],
+                name=row['NAZWA'],
+                kind=row['NAZWA_DOD'] or GMINA_KINDS[row['RODZ']],
+                voivodeship=voivodeships.get(row['WOJ'], ''),
+                powiat=powiats.get(row['WOJ'] + row['POW'], ''),
+                updated=row.get('STAN_NA') or None
+            )
+            for row in gminas
+        )
+        logger.info("[TERYT] Załadowano %d gmin (stan na %s) z %s", len(registry.entries), registry.updated, path)
+        if not registry.complete:
+            logger.warning("[TERYT] Wykaz niepełny: %d z %d gmin - wskaż pełny plik TERC przez GMINA_TERYT_PATH",
+                           len(registry.entries), NATIONAL_GMINAS)
+        return registry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def resolve(self, uid):
+        """Gmina dla identyfikatora sugestii ('g' + kod TERC) albo None"""
+        if not isinstance(uid, str) or not uid.startswith(TERYT_PREFIX):
+            return None
+        return self.by_teryt.get(uid[len(TERYT_PREFIX):])
+
+    def exact(self, name):
+        """Gminy o dokładnie tej nazwie (po złożeniu do ASCII) - może być kilka"""
+        return [self.entries[index] for index in self._exact.get(teryt_key(name), ())]
+
+    def _fuzzy(self, key, limit):
+        """
+        Indeks gminy -> liczba literówek dla pełnych nazw w odległości <= limit.
+
+        Pierwsza litera musi się zgadzać (literówki na początku nazwy są
+        rzadkie) - sprawdzane są tylko nazwy na tę literę: jednym wywołaniem
+        RapidFuzz (C), a bez niego wierszami DP po poddrzewie trie.
+        """
+        found = {}
+        if rf_process is not None:
+            ids, keys = self._buckets.get(key[0], ((), ()))
+            for _, distance, position in rf_process.extract(
+                    key, keys, scorer=Levenshtein.distance, score_cutoff=limit, limit=None):
+                found[ids[position]] = distance
+            return found
+
+        first = self._names.children.get(key[0])
+        if first is None:
+            return found
+        columns = len(key)
+        key = key[1:]
+        stack = [(char, child, range(columns)) for char, child in first.children.items()]
+        while stack:
+            char, node, previous = stack.pop()
+            row = [previous[0] + 1]
+            for column in range(1, columns):
+                row.append(min(
+                    row[column - 1] + 1,
+                    previous[column] + 1,
+                    previous[column - 1] + (key[column - 1] != char)
+                ))
+            if row[-1] <= limit:
+                for index in node.ends:
+                    if row[-1] < found.get(index, limit + 1):
+                        found[index] = row[-1]
+            if min(row) <= limit:
+                stack.extend((next_char, child, row) for next_char, child in node.children.items())
+        return found
+
+    def search(self, query, limit=8, fuzzy=True):
+        """
+        Ranking gmin dla zapytania.
+
+        Returns:
+            list: (Municipality, klasa dopasowania, liczba literówek), najlepsze pierwsze
+        """
+        self.lookups += 1
+        key = teryt_key(query)
+        if not key or limit <= 0:
+            return []
+
+        results = []
+        seen = set()
+
+        def take(indexes, match_class, distances=None):
+            for index in indexes:
+                if len(results) >= limit:
+                    return
+                if index not in seen:
+                    seen.add(index)
+                    results.append((self.entries[index], match_class, distances[index] if distances else 0))
+
+        take(self._exact.get(key, ()), EXACT)
+        for root, match_class in ((self._names, PREFIX), (self._words, WORD_PREFIX)):
+            node = _walk(root, key)
+            if node is not None:
+                take(node.ids, match_class)
+
+        # Literówki tylko, gdy nazwa nie pasuje dokładnie ani prefiksem
+        if fuzzy and not results and max_distance(key):
+            found = self._fuzzy(key, max_distance(key))
+            # Wpisy są posortowane wg rangi - indeks rozstrzyga remis liczby literówek
+            take(sorted(found, key=lambda index: (found[index], index)), FUZZY, found)
+        return results
+
+    @staticmethod
+    def score(match_class, distance=0):
+        """Wynik sugestii (0-100) zgodny z kolejnością rankingu"""
+        return CLASS_SCORES[match_class] - 10 * max(0, distance - 1)
+
+    def stats(self):
+        """Liczniki do monitoringu"""
+        return {
+            'gminas': len(self.entries),
+            'complete': self.complete,
+            'updated': self.updated,
+            'lookups': self.lookups
+        }
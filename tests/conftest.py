@@ -0,0 +1,26 @@
+"""conftest.py - Wspólne fixtures testów Gmina-AI (pliki SQLite i katalogi w katalogu tymczasowym)"""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+@pytest.fixture
+def isolated_env(tmp_path, monkeypatch):
+    """Zgłoszenia, analityka i snapshoty w tmp_path; bez GA4 i shardów"""
+    monkeypatch.setenv('GMINA_TICKETS_PATH', str(tmp_path / 'tickets.sqlite3'))
+    monkeypatch.setenv('GMINA_ANALYTICS_PATH', str(tmp_path / 'analytics.sqlite3'))
+    monkeypatch.setenv('GMINA_NO_RESULTS_SNAPSHOT_DIR', str(tmp_path / 'no-results'))
+    for name in ('GA4_MEASUREMENT_ID', 'GA4_API_SECRET', 'GMINA_SCORING_SHARDS', 'GMINA_CATALOG_DIR'):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def bot(isolated_env):
+    from gmina_bot import GminaBot
+    return GminaBot()
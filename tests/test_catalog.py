@@ -0,0 +1,130 @@
+"""test_catalog.py - Przeładowanie katalogów gmin: błędne pliki, katalogi z install() i budowa poza blokadą"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from catalog import CatalogStore, catalog_slug
+
+
+def catalog_data(version, problems):
+    return {
+        'version': version,
+        'contacts': {'persons': [], 'departments': []},
+        'forms': [],
+        'problems': problems
+    }
+
+
+def write(path, data, mtime_step=1):
+    """Zapis pliku z przesunięciem mtime - zmiana widoczna niezależnie od rozdzielczości zegara"""
+    previous = os.path.getmtime(path) if os.path.exists(path) else time.time()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(data if isinstance(data, str) else json.dumps(data))
+    os.utime(path, (previous + mtime_step, previous + mtime_step))
+
+
+@pytest.fixture
+def directory(tmp_path):
+    write(tmp_path / 'default.json', catalog_data(1, ['Dziura w drodze']))
+    write(tmp_path / 'demo-gmina.json', {'version': 1, 'problems': ['Awaria oświetlenia']})
+    return tmp_path
+
+
+@pytest.fixture
+def store(directory):
+    return CatalogStore(directory=str(directory), check_interval=0)
+
+
+def test_gmina_names_do_not_alias_default_catalog(store, directory):
+    assert catalog_slug('Przykładowa Gmina') == 'przykladowa-gmina'
+    assert catalog_slug('Default') is None
+    assert catalog_slug(' DEFAULT! ') is None
+    assert catalog_slug('???') is None
+
+    default = store.default()
+    assert store.get('Default') is default
+    assert store.get('???') is default
+    assert store.stats()['loaded'] == 0
+    with pytest.raises(ValueError):
+        store.install('Default', catalog_data(2, ['Podmiana katalogu wspólnego']))
+    assert store.default() is default
+
+
+def test_broken_file_keeps_previous_version(store, directory):
+    loaded = store.get('Demo Gmina')
+    assert loaded.data_version == 1
+
+    write(directory / 'demo-gmina.json', '{"version": 2, "problems": [')
+    assert store.get('Demo Gmina') is loaded
+    assert store.stats()['errors'] == 1
+
+    write(directory / 'demo-gmina.json', {'version': 3, 'problems': ['Zalana piwnica']})
+    reloaded = store.get('Demo Gmina')
+    assert reloaded.data_version == 3
+    assert reloaded.search_database['problems'] == ['Zalana piwnica']
+    assert store.stats()['reloads'] == 1
+
+
+def test_broken_default_keeps_previous_version(store, directory):
+    default = store.default()
+    write(directory / 'default.json', 'nie json')
+    assert store.default() is default
+    assert store.get('Gmina bez pliku') is default
+    assert store.stats()['errors'] >= 1
+
+
+def test_missing_default_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        CatalogStore(directory=str(tmp_path)).default()
+
+
+def test_installed_catalogs_are_not_reloaded(store, directory):
+    installed = store.install('Gmina Testowa', catalog_data(5, ['Brak wody']))
+    default = store.install(None, catalog_data(6, ['Głośna impreza']))
+
+    # Katalogi z pamięci nie mają pliku - żadnych błędów ani przeładowań
+    assert store.default() is default
+    assert store.get('Gmina Testowa') is installed
+    write(directory / 'default.json', catalog_data(7, ['Inny problem']))
+    assert store.default() is default
+    assert store.stats()['errors'] == 0
+    assert store.stats()['reloads'] == 0
+
+
+def test_reload_does_not_block_other_gminas(store, directory, monkeypatch):
+    loaded = store.get('Demo Gmina')
+    write(directory / 'przykladowa-gmina.json', {'version': 1, 'problems': ['Pies bez smyczy']})
+    other = store.get('Przykładowa Gmina')
+
+    building = threading.Event()
+    release = threading.Event()
+    load = store._load
+
+    def slow_load(name, path, base):
+        if name == 'Demo Gmina':
+            building.set()
+            release.wait(5)
+        return load(name, path, base)
+    monkeypatch.setattr(store, '_load', slow_load)
+
+    write(directory / 'demo-gmina.json', {'version': 2, 'problems': ['Awaria oświetlenia']})
+    reloading = threading.Thread(target=store.get, args=('Demo Gmina',))
+    reloading.start()
+    try:
+        assert building.wait(2)
+        started = time.monotonic()
+        # Inna gmina i katalog domyślny obsługiwane bez czekania na budowę
+        assert store.get('Przykładowa Gmina') is other
+        assert store.default() is not None
+        # Ta sama gmina dostaje poprzednią wersję do czasu podmiany
+        assert store.get('Demo Gmina') is loaded
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        reloading.join(5)
+
+    assert store.get('Demo Gmina').data_version == 2
+    assert store.stats()['reloads'] == 1
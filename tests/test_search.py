@@ -0,0 +1,156 @@
+"""test_search.py - Wyszukiwanie predykcyjne: indeks, scoring wsadowy, top-k i cache kontra pełny skan"""
+import random
+
+import pytest
+
+import scoring
+from benchmarks.synthetic import keystroke_stream, search_phrases, synthetic_catalog
+from gmina_bot import SEARCH_SECTIONS
+from search_index import MATCH_THRESHOLD, SearchIndex, fold, searchable_text
+
+CATALOG_SIZE = 600
+# Więcej kandydatów niż SCORING_CHUNK - przerywanie scoringu po granicy jest sprawdzane
+assert CATALOG_SIZE * 35 // 100 > 64
+
+
+def section_records(database, section):
+    if section in ('persons', 'departments'):
+        return database['contacts'][section]
+    return database[section]
+
+
+def brute_force(bot, query, context, limit=8, folded=False):
+    """Ranking pełnym skanem: calculate_match_score dla każdego rekordu, sortowanie stabilne"""
+    query = query.lower().strip()
+    if folded:
+        query = fold(query)
+    scored = []
+    for section in SEARCH_SECTIONS[context]:
+        for record in section_records(bot.search_database, section):
+            text = searchable_text(section, record).lower()
+            score = bot.calculate_match_score(query, fold(text) if folded else text)
+            if score > MATCH_THRESHOLD:
+                title = record if section == 'problems' else record['name']
+                scored.append((title, score))
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit]
+
+
+def ranking(suggestions):
+    return [(suggestion.title, suggestion.score) for suggestion in suggestions]
+
+
+def random_queries(catalog, count, seed):
+    """Frazy z katalogu (z polskimi znakami i bez), ich prefiksy oraz frazy bez wyników"""
+    rng = random.Random(seed)
+    queries = []
+    for context, phrase in search_phrases(catalog, count, seed=seed):
+        queries.append((context, phrase))
+        if len(phrase) > 3:
+            queries.append((context, phrase[:rng.randint(2, len(phrase) - 1)]))
+    return queries
+
+
+@pytest.fixture
+def catalog_bot(bot):
+    catalog = synthetic_catalog(CATALOG_SIZE, seed=3)
+    bot.search_database = catalog
+    bot.catalog = catalog
+    return bot
+
+
+@pytest.mark.parametrize('folding', ['off', 'on'])
+def test_indexed_search_matches_brute_force(catalog_bot, folding):
+    catalog_bot.search_folding = folding
+    for context, query in random_queries(catalog_bot.catalog, 40, seed=11):
+        expected = brute_force(catalog_bot, query, context, folded=folding == 'on')
+        assert ranking(catalog_bot.search_suggestions(query, context)) == expected, (context, query)
+
+
+def test_pairwise_scoring_matches_brute_force(catalog_bot, monkeypatch):
+    # Bez RapidFuzz top_matches scoruje kandydatów parami przez fuzzywuzzy
+    monkeypatch.setattr(scoring, 'rf_process', None)
+    assert not catalog_bot.batch_scorer.available
+    catalog_bot.search_folding = 'off'
+    for context, query in random_queries(catalog_bot.catalog, 15, seed=12):
+        expected = brute_force(catalog_bot, query, context)
+        assert ranking(catalog_bot.search_suggestions(query, context)) == expected, (context, query)
+
+
+@pytest.mark.parametrize('limit', [1, 3, 20])
+def test_top_k_matches_brute_force(catalog_bot, limit):
+    catalog_bot.search_folding = 'off'
+    for context, query in random_queries(catalog_bot.catalog, 15, seed=13):
+        expected = brute_force(catalog_bot, query, context, limit=limit)
+        assert ranking(catalog_bot.search_suggestions(query, context, limit=limit)) == expected, (context, query)
+
+
+def test_batch_scorer_matches_calculate_match_score(bot):
+    rng = random.Random(7)
+    catalog = synthetic_catalog(200, seed=5)
+    words = ' '.join(form['name'] for form in catalog['forms']).lower().split()
+    texts = [' '.join(rng.choice(words) for _ in range(rng.randint(1, 6))) for _ in range(200)]
+    queries = [rng.choice(words)[:rng.randint(2, 6)] for _ in range(30)]
+    queries += [' '.join(rng.choice(words)[:4] for _ in range(2)) for _ in range(10)]
+
+    matrix = bot.batch_scorer.score_matrix(queries, texts)
+    for row, query in enumerate(queries):
+        for column, text in enumerate(texts):
+            assert matrix[row][column] == bot.calculate_match_score(query, text), (query, text)
+
+
+def test_cached_search_matches_brute_force(catalog_bot):
+    catalog_bot.search_folding = 'off'
+    for context, phrase in search_phrases(catalog_bot.catalog, 20, seed=14):
+        for query in keystroke_stream(phrase):
+            expected = brute_force(catalog_bot, query, context)
+            assert ranking(catalog_bot.cached_search_suggestions(query, context)) == expected, (context, query)
+            # Drugi odczyt z cache - ten sam wynik
+            assert ranking(catalog_bot.cached_search_suggestions(query, context)) == expected
+
+
+def test_prefix_cache_reuses_states(catalog_bot):
+    cache = catalog_bot.search_cache
+    stream = keystroke_stream('deklaracja')
+    for query in stream:
+        catalog_bot.cached_search_suggestions(query, 'forms')
+    # Każde zapytanie po pierwszym startuje od stanu poprzedniego prefiksu
+    assert cache.stats()['misses'] == len(stream)
+    assert cache.stats()['prefix_hits'] == len(stream) - 1
+
+    # Spacja na końcu nie zmienia zapytania - odczyt z cache
+    catalog_bot.cached_search_suggestions('deklaracja ', 'forms')
+    assert cache.stats()['hits'] == 1
+    # Inna gmina ma własne wpisy
+    catalog_bot.cached_search_suggestions('deklaracja', 'forms', gmina='Demo Gmina')
+    assert cache.stats()['hits'] == 1
+
+
+def nonzero(overlap):
+    return {entry_id: count for entry_id, count in overlap.items() if count}
+
+
+@pytest.mark.parametrize('folded', [False, True])
+def test_incremental_query_state_equals_fresh(folded):
+    index = SearchIndex(synthetic_catalog(300, seed=4))
+    for section in ('persons', 'forms', 'problems'):
+        base = None
+        for query in keystroke_stream('zgłoszenie budowy'):
+            state = index.query_state(query, section, base=base, folded=folded)
+            fresh = index.query_state(query, section, folded=folded)
+            assert nonzero(state.raw_overlap) == nonzero(fresh.raw_overlap)
+            assert nonzero(state.token_overlap) == nonzero(fresh.token_overlap)
+            assert index.lookup(query, section, state, folded) == index.lookup(query, section, fresh, folded)
+            base = state
+
+
+def test_cache_invalidated_by_catalog_change(catalog_bot):
+    catalog_bot.search_folding = 'off'
+    before = catalog_bot.cached_search_suggestions('wniosek', 'forms')
+    assert before
+
+    catalog = synthetic_catalog(CATALOG_SIZE, seed=3)
+    catalog['forms'] = [{'name': 'Wniosek o dowód', 'category': 'usc', 'code': 'X-1', 'online': True}]
+    catalog_bot.search_database = catalog
+    assert ranking(catalog_bot.cached_search_suggestions('wniosek', 'forms')) == \
+        brute_force(catalog_bot, 'wniosek', 'forms')
@@ -0,0 +1,59 @@
+"""test_shard_pool.py - Scoring w shardach: ten sam ranking co w procesie żądania"""
+import time
+
+import pytest
+
+from benchmarks.synthetic import search_phrases, synthetic_catalog
+from gmina_bot import SEARCH_SECTIONS, GminaBot, MatchRanking, ShardSearcher
+from shard_pool import ShardPool, shard_database
+
+
+@pytest.fixture
+def catalog_bot(bot):
+    catalog = synthetic_catalog(400, seed=8)
+    bot.search_database = catalog
+    bot.catalog = catalog
+    return bot
+
+
+def queries(catalog):
+    return [(SEARCH_SECTIONS[context], phrase) for context, phrase in search_phrases(catalog, 30, seed=9)]
+
+
+def test_shard_searcher_does_not_need_bot_state():
+    searcher = ShardSearcher(synthetic_catalog(50, seed=1))
+    assert isinstance(searcher, MatchRanking)
+    assert not isinstance(searcher, GminaBot)
+    assert searcher.search('wniosek', ('forms',), 3, False)
+
+
+def test_shard_searcher_matches_top_matches(catalog_bot):
+    index = catalog_bot.search_index
+    for shards in (1, 3):
+        for shard in range(shards):
+            searcher = ShardSearcher(shard_database(index, shard, shards))
+            for sections, query in queries(catalog_bot.catalog):
+                expected = [
+                    (score, sections.index(section), entry)
+                    for section, entry, score in catalog_bot.top_matches(
+                        query, sections, 8, index=searcher.search_index)
+                ]
+                got = searcher.search(query, sections, 8, False)
+                assert [(score, order) for score, order, _ in got] == [(score, order) for score, order, _ in expected]
+
+
+def test_shard_pool_matches_local_ranking(catalog_bot):
+    index = catalog_bot.search_index
+    pool = ShardPool(ShardSearcher, shards=2, min_entries=0, timeout=10)
+    try:
+        deadline = time.monotonic() + 60
+        while pool.top_matches(index, 'start', ('forms',), 1) is None:
+            assert time.monotonic() < deadline, 'shardy nie zostały zainstalowane'
+            time.sleep(0.05)
+        for sections, query in queries(catalog_bot.catalog):
+            local = catalog_bot.top_matches(query, sections, 8, index=index)
+            sharded = pool.top_matches(index, query, sections, 8)
+            assert [(section, entry.uid, score) for section, entry, score in sharded] == \
+                [(section, entry.uid, score) for section, entry, score in local], query
+    finally:
+        pool.close()
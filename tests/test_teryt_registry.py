@@ -0,0 +1,59 @@
+"""test_teryt_registry.py - Dołączony wykaz gmin TERYT: kompletność i wyszukiwanie gmin wiejskich"""
+import pytest
+
+from teryt_registry import EXACT, FUZZY, NATIONAL_GMINAS, PREFIX, WORD_PREFIX, TerytRegistry
+
+
+@pytest.fixture(scope='module')
+def registry():
+    return TerytRegistry.from_file()
+
+
+def names(matches):
+    return [(municipality.name, match_class) for municipality, match_class, _ in matches]
+
+
+def test_bundled_file_covers_all_gminas(registry):
+    assert len(registry) == NATIONAL_GMINAS
+    assert registry.complete
+    assert len(registry.by_teryt) == NATIONAL_GMINAS
+    # Gmina Ostrowice zlikwidowana 2019-01-01
+    assert not registry.exact('Ostrowice')
+    assert {entry.voivodeship for entry in registry.entries} >= {'małopolskie', 'zachodniopomorskie'}
+
+
+@pytest.mark.parametrize('query, name', [
+    ('Żegocina', 'Żegocina'),
+    ('Trzebownisko', 'Trzebownisko'),
+    ('Lesznowola', 'Lesznowola'),
+    ('Igołomia-Wawrzeńczyce', 'Igołomia-Wawrzeńczyce'),
+])
+def test_rural_gmina_exact(registry, query, name):
+    assert names(registry.search(query, 3))[0] == (name, EXACT)
+
+
+@pytest.mark.parametrize('query, name, match_class', [
+    ('trzebown', 'Trzebownisko', PREFIX),
+    ('Żegoc', 'Żegocina', PREFIX),
+    ('wawrzeń', 'Igołomia-Wawrzeńczyce', WORD_PREFIX),
+])
+def test_rural_gmina_prefix(registry, query, name, match_class):
+    assert (name, match_class) in names(registry.search(query, 8))
+
+
+@pytest.mark.parametrize('query, name', [
+    ('zegocina', 'Żegocina'),
+    ('IGOLOMIA WAWRZENCZYCE', 'Igołomia-Wawrzeńczyce'),
+    ('lapanow', 'Łapanów'),
+])
+def test_rural_gmina_without_diacritics(registry, query, name):
+    assert names(registry.search(query, 3))[0] == (name, EXACT)
+
+
+def test_typo_and_shared_names(registry):
+    assert names(registry.search('Lesznowla', 3))[0] == ('Lesznowola', FUZZY)
+    # Miasto i gmina wiejska o tej samej nazwie - dwa kody TERC
+    bochnia = registry.exact('Bochnia')
+    assert sorted((entry.teryt, entry.kind) for entry in bochnia) == [
+        ('1201011', 'gmina miejska'), ('1201022', 'gmina wiejska')
+    ]
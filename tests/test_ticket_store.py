@@ -0,0 +1,115 @@
+"""test_ticket_store.py - Numeracja zgłoszeń pod współbieżnością i odporność wątku zapisującego"""
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ticket_store import TicketStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TicketStore(path=str(tmp_path / 'tickets.sqlite3'), block_size=7)
+
+
+def writer_hook(monkeypatch, store, hook):
+    """Wywołuje hook() przy każdym połączeniu otwieranym przez wątek zapisujący"""
+    connection = store._connection
+
+    def hooked():
+        if threading.current_thread().name == 'ticket-writer':
+            hook()
+        return connection()
+    monkeypatch.setattr(store, '_connection', hooked)
+
+
+def test_concurrent_create_gives_unique_ids(store):
+    with ThreadPoolExecutor(16) as executor:
+        tickets = list(executor.map(lambda i: store.create(f'Zgłoszenie {i}', 'drogi'), range(400)))
+
+    ids = [ticket['id'] for ticket in tickets]
+    assert len(set(ids)) == len(ids)
+    assert all(store.get(ticket_id) is not None for ticket_id in ids)
+    assert store.stats()['created'] == 400
+    assert store.stats()['failed'] == 0
+
+
+def test_workers_on_one_database_give_unique_ids(tmp_path):
+    # Osobne instancje na jednym pliku - jak workery gunicorna rezerwujące bloki numerów
+    path = str(tmp_path / 'tickets.sqlite3')
+    stores = [TicketStore(path=path, block_size=5) for _ in range(3)]
+    with ThreadPoolExecutor(12) as executor:
+        tickets = list(executor.map(
+            lambda i: stores[i % len(stores)].create(f'Zgłoszenie {i}', 'inne'), range(150)
+        ))
+    bulk = stores[0].create_many([(f'Paczka {i}', 'inne') for i in range(20)])
+
+    ids = [ticket['id'] for ticket in tickets + bulk]
+    assert len(set(ids)) == len(ids)
+    assert len(stores[1].find(limit=1000)) == len(ids)
+
+
+def test_connection_error_rejects_batch_and_writer_survives(store, monkeypatch):
+    failures = [sqlite3.OperationalError('disk I/O error')]
+
+    def fail_once():
+        if failures:
+            raise failures.pop()
+    writer_hook(monkeypatch, store, fail_once)
+
+    with pytest.raises(sqlite3.OperationalError):
+        store.create('Pierwsze', 'drogi')
+    ticket = store.create('Drugie', 'drogi')
+
+    assert store.get(ticket['id'])['description'] == 'Drugie'
+    assert store.stats()['failed'] == 1
+    assert store.stats()['created'] == 1
+
+
+# Wątek zapisujący kończy się wyjątkiem celowo
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_dead_writer_is_restarted(store, monkeypatch):
+    commit = store._commit
+    failures = [RuntimeError('nieoczekiwany błąd')]
+
+    def crash_once(batch):
+        if failures:
+            raise failures.pop()
+        return commit(batch)
+    monkeypatch.setattr(store, '_commit', crash_once)
+
+    with pytest.raises(RuntimeError):
+        store.create('Pierwsze', 'drogi')
+    store._thread.join(2)
+    assert not store._thread.is_alive()
+
+    ticket = store.create('Drugie', 'drogi')
+    assert store._thread.is_alive()
+    assert store.get(ticket['id']) is not None
+
+
+def test_timeout_cancels_queued_ticket(store, monkeypatch):
+    store.commit_timeout = 0.3
+    committing = threading.Event()
+
+    def slow_first_commit():
+        if not committing.is_set():
+            committing.set()
+            time.sleep(1.0)
+    writer_hook(monkeypatch, store, slow_first_commit)
+
+    with ThreadPoolExecutor(1) as executor:
+        in_flight = executor.submit(store.create, 'W trakcie zapisu', 'drogi')
+        assert committing.wait(2)
+        # Druga paczka czeka w kolejce dłużej niż commit_timeout - zostaje anulowana
+        with pytest.raises(TimeoutError):
+            store.create('W kolejce', 'drogi')
+        # Paczka, którą wątek już zatwierdzał, kończy się zapisem mimo timeoutu
+        ticket = in_flight.result()
+
+    assert store.get(ticket['id']) is not None
+    descriptions = [row['description'] for row in store.find(limit=10)]
+    assert descriptions == ['W trakcie zapisu']
+    assert store.create('Po awarii', 'drogi')['id'] != ticket['id']
@@ -0,0 +1,338 @@
+"""ticket_store.py - Trwały rejestr zgłoszeń mieszkańców (SQLite WAL, group commit)"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICKETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'tickets.sqlite3')
+
+TICKET_PREFIX = 'ZGL-'
+# Pierwszy numer - zachowuje dotychczasowy format ZGL-XXXXX
+FIRST_TICKET_NUMBER = 10000
+
+STATUS_ACCEPTED = 'Przyjęte'
+
+COMMIT_SECONDS = REGISTRY.histogram(
+    'gmina_ticket_commit_seconds', 'Czas zatwierdzenia jednej paczki zgłoszeń (group commit)'
+)
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS tickets ('
+    'id TEXT PRIMARY KEY, number INTEGER NOT NULL, gmina TEXT, category TEXT NOT NULL, '
+    'description TEXT NOT NULL, source TEXT NOT NULL, created_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS ix_tickets_category_created ON tickets (category, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_tickets_created ON tickets (created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_tickets_gmina_created ON tickets (gmina, created_at)',
+    # Historia statusów - tylko dopisywanie; bieżący status to ostatni wpis
+    'CREATE TABLE IF NOT EXISTS ticket_events ('
+    'id INTEGER PRIMARY KEY, ticket_id TEXT NOT NULL, status TEXT NOT NULL, note TEXT, created_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS ix_ticket_events_ticket ON ticket_events (ticket_id, id)',
+    'CREATE TABLE IF NOT EXISTS ticket_sequence (name TEXT PRIMARY KEY, next INTEGER NOT NULL)',
+)
+
+
+def connect_wal(path, synchronous='NORMAL', **kwargs):
+    """Połączenie SQLite w trybie WAL (autocommit - transakcje jawnie przez BEGIN)"""
+    connection = sqlite3.connect(path, timeout=10, isolation_level=None, **kwargs)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(f'PRAGMA synchronous={synchronous}')
+    return connection
+
+
+def normalize_ticket_id(text):
+    """'zgl-12345 ' -> 'ZGL-12345' (None, gdy to nie numer zgłoszenia)"""
+    text = (text or '').strip().upper()
+    if not text.startswith(TICKET_PREFIX) or not text[len(TICKET_PREFIX):].isdigit():
+        return None
+    return text
+
+
+class TicketStore:
+    """
+    Zgłoszenia w pliku SQLite (tryb WAL) współdzielonym przez workery.
+
+    Numery: każdy proces rezerwuje w bazie blok `block_size` kolejnych
+    numerów (jedna krótka transakcja na blok) i wydaje je z pamięci - bez
+    kolizji między workerami i bez zapytania do bazy przy każdym zgłoszeniu.
+
+    Zapis: create() dopisuje zgłoszenie do kolejki i czeka na zatwierdzenie;
+    jeden wątek zapisujący na proces zbiera wszystko, co przyszło w czasie
+    poprzedniego commitu (do max_batch), i zapisuje to jedną transakcją -
+    przy nawale zgłoszeń (np. po burzy) blokada zapisu SQLite i fsync
+    przypadają na paczkę, nie na zgłoszenie. create_many() (zgłoszenia
+    przekazywane hurtowo przez call center / bramkę SMS) trafia do kolejki
+    jako jedna pozycja - cała paczka zapisuje się albo nie zapisuje wcale,
+    a jej numery rezerwowane są jednym blokiem. Tabele są tylko dopisywane:
+    zmiana statusu to nowy wiersz w ticket_events.
+
+    Odczyty (numer, kategoria, data, gmina) idą po indeksach, na
+    połączeniach per wątek.
+    """
+
+    def __init__(self, path=None, block_size=100, max_batch=500, commit_timeout=10.0):
+        self.path = path or os.getenv('GMINA_TICKETS_PATH') or DEFAULT_TICKETS_PATH
+        self.block_size = block_size
+        self.max_batch = max_batch
+        self.commit_timeout = commit_timeout
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._next_number = 0
+        self._block_end = 0
+        self.created = 0
+        self.batches = 0
+        self.failed = 0
+
+        connection = self._connection()
+        for statement in _SCHEMA:
+            connection.execute(statement)
+        connection.execute(
+            'INSERT OR IGNORE INTO ticket_sequence (name, next) VALUES (?, ?)', ('tickets', FIRST_TICKET_NUMBER)
+        )
+
+    def _connection(self):
+        # Połączenia nie przechodzą przez fork (gunicorn --preload) - klucz to wątek i pid
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            # Zgłoszenie ma przetrwać awarię zasilania - fsync rozkłada się na paczkę
+            connection = connect_wal(self.path, synchronous='FULL')
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # --- Numeracja ---
+
+    def _ensure_process(self):
+        """Po forku: własna kolejka, wątek zapisujący i nowy blok numerów; martwy wątek uruchamiany ponownie"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._next_number = self._block_end = 0
+            elif self._thread.is_alive():
+                return
+            else:
+                logger.error("[TICKETS] Wątek zapisujący zakończył się - uruchamiam ponownie")
+            # Nowy wątek przejmuje kolejkę - zgłoszenia czekające w niej nie przepadają
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name='ticket-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _reserve_block(self, size):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            start = connection.execute('SELECT next FROM ticket_sequence WHERE name = ?', ('tickets',)).fetchone()[0]
+            connection.execute(
+                'UPDATE ticket_sequence SET next = ? WHERE name = ?', (start + size, 'tickets')
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return start
+
+    def next_id(self):
+        """Kolejny numer zgłoszenia (unikalny między procesami)"""
+        return self._take_ids(1)[0]
+
+    def _take_ids(self, count):
+        """`count` kolejnych numerów - (id, numer); paczka większa od bloku rezerwuje własny blok"""
+        self._ensure_process()
+        with self._lock:
+            ids = []
+            while len(ids) < count:
+                if self._next_number >= self._block_end:
+                    size = max(self.block_size, count - len(ids))
+                    self._next_number = self._reserve_block(size)
+                    self._block_end = self._next_number + size
+                take = min(count - len(ids), self._block_end - self._next_number)
+                ids.extend(range(self._next_number, self._next_number + take))
+                self._next_number += take
+        return [(f'{TICKET_PREFIX}{number:05d}', number) for number in ids]
+
+    # --- Zapis ---
+
+    def create(self, description, category, gmina=None, source='custom'):
+        """
+        Rejestruje zgłoszenie i czeka na jego zatwierdzenie w bazie.
+
+        Returns:
+            dict: id, category, gmina, description, source, created_at, status
+
+        Raises:
+            Exception z wątku zapisującego (np. sqlite3.OperationalError) albo TimeoutError -
+            zgłoszenie, które nie zdążyło trafić do commitu, jest anulowane i nie zostanie zapisane
+        """
+        return self.create_many([(description, category)], gmina=gmina, source=source)[0]
+
+    def create_many(self, problems, gmina=None, source='custom'):
+        """
+        Rejestruje paczkę zgłoszeń (opis, kategoria) - wszystkie w jednej transakcji.
+
+        Returns:
+            list: zgłoszenia jak z create(), w kolejności `problems`
+
+        Raises:
+            jak create() - przy błędzie nie zapisuje się żadne zgłoszenie paczki
+        """
+        if not problems:
+            return []
+        created_at = time.time()
+        tickets = [
+            {
+                'id': ticket_id,
+                'number': number,
+                'gmina': gmina,
+                'category': category,
+                'description': description,
+                'source': source,
+                'created_at': created_at,
+                'status': STATUS_ACCEPTED
+            }
+            for (ticket_id, number), (description, category) in zip(self._take_ids(len(problems)), problems)
+        ]
+        future = Future()
+        self._queue.put((tickets, future))
+        try:
+            future.result(self.commit_timeout)
+        except TimeoutError:
+            # Paczka jeszcze w kolejce - anulowana nie zostanie zapisana, więc błąd mówi prawdę.
+            # Jeśli wątek zapisujący już ją zatwierdza, czekamy na wynik (ograniczony timeoutem SQLite)
+            if future.cancel():
+                raise
+            future.result()
+        return tickets
+
+    def _run(self, pending):
+        while True:
+            batch = [pending.get()]
+            size = len(batch[0][0])
+            # Wszystko, co czekało w czasie poprzedniego commitu, trafia do jednej transakcji
+            # (paczka z create_many nigdy nie jest dzielona)
+            while size < self.max_batch:
+                try:
+                    entry = pending.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(entry)
+                size += len(entry[0])
+            try:
+                self._commit(batch)
+            except BaseException as e:
+                # Nieoczekiwany błąd: paczka nie może czekać bez końca; wątek wznowi _ensure_process
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                raise
+
+    def _commit(self, batch):
+        # Paczki anulowane po timeoucie w create_many nie są zapisywane
+        batch = [(entry, future) for entry, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        tickets = [ticket for entry, _ in batch for ticket in entry]
+        try:
+            # Błąd otwarcia połączenia też tylko odrzuca paczkę - wątek zapisujący działa dalej
+            connection = self._connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.executemany(
+                    'INSERT INTO tickets (id, number, gmina, category, description, source, created_at) '
+                    'VALUES (:id, :number, :gmina, :category, :description, :source, :created_at)',
+                    tickets
+                )
+                connection.executemany(
+                    'INSERT INTO ticket_events (ticket_id, status, note, created_at) '
+                    'VALUES (:id, :status, NULL, :created_at)',
+                    tickets
+                )
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            logger.error("[TICKETS] Błąd zapisu paczki %d zgłoszeń: %s", len(tickets), e)
+            self.failed += len(tickets)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        COMMIT_SECONDS.observe(time.perf_counter() - started)
+        self.created += len(tickets)
+        self.batches += 1
+        for _, future in batch:
+            future.set_result(True)
+
+    def add_event(self, ticket_id, status, note=None):
+        """Dopisuje zmianę statusu zgłoszenia (np. z panelu urzędnika)"""
+        self._connection().execute(
+            'INSERT INTO ticket_events (ticket_id, status, note, created_at) VALUES (?, ?, ?, ?)',
+            (ticket_id, status, note, time.time())
+        )
+
+    # --- Odczyt ---
+
+    def get(self, ticket_id):
+        """
+        Zgłoszenie z historią statusów.
+
+        Returns:
+            dict z polami zgłoszenia, 'status' (ostatni) i 'events' (chronologicznie)
+            albo None, gdy numer nie istnieje
+        """
+        connection = self._connection()
+        row = connection.execute('SELECT * FROM tickets WHERE id = ?', (ticket_id,)).fetchone()
+        if row is None:
+            return None
+        ticket = dict(row)
+        ticket['events'] = [
+            dict(event) for event in connection.execute(
+                'SELECT status, note, created_at FROM ticket_events WHERE ticket_id = ? ORDER BY id', (ticket_id,)
+            )
+        ]
+        ticket['status'] = ticket['events'][-1]['status'] if ticket['events'] else STATUS_ACCEPTED
+        return ticket
+
+    def find(self, category=None, gmina=None, since=None, until=None, limit=100):
+        """Zgłoszenia wg kategorii/gminy i zakresu dat (created_at, timestamp), najnowsze pierwsze"""
+        conditions = []
+        params = []
+        for column, value in (('category', category), ('gmina', gmina)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('created_at < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self._connection().execute(
+            f'SELECT * FROM tickets {where} ORDER BY created_at DESC LIMIT ?', params + [limit]
+        )
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        """Liczniki do monitoringu"""
+        return {
+            'created': self.created,
+            'batches': self.batches,
+            'avg_batch': round(self.created / self.batches, 2) if self.batches else 0,
+            'failed': self.failed,
+            'pending': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+        }